@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Benchmark of the NetMeter result parsers.
+
+Compares the parsers of NM_parsers with the original line-by-line
+implementations (kept here as the reference), both for speed and for equal
+results. Usage:
+
+    python3 NM_bench.py iperf [FILE_iperf.dat ...]
+    python3 NM_bench.py mpstat [FILE_mpstat.dat ...]
+    python3 NM_bench.py latency [FILE_iperf.dat ...]
+
+Without files, a synthetic output of a long run is generated (multi-stream
+UDP for iperf, 1 s samples of 16 cores for mpstat), and for latency (the
+enhanced "-e" output) the archived field_latency_simultaneous_5users runs
+are parsed.
+'''
+
+import sys
+import numpy as np
+from time import perf_counter
+from datetime import datetime, timedelta
+from tempfile import NamedTemporaryFile
+from glob import glob
+from os import devnull
+from os.path import join, dirname, abspath
+from contextlib import redirect_stdout
+
+import NM_parsers
+
+# The archived field runs used by "latency" without files.
+latency_archive = 'field_latency_simultaneous_5users'
+
+
+def reference_iperf_data_single(iperf_out, protocol, streams, repetitions):
+    '''
+    The original line-by-line parser (NetMeter.py before NM_parsers).
+    Notice: all entries are counted from the end, as sometimes the beginning of an
+    output row can be unreadable. This is also the reason for "errors='ignore'".
+    '''
+    iperf_data = []
+    additional_fields = 0
+    if protocol == 'UDP':
+        additional_fields = 5
+
+    with open(iperf_out, encoding='utf-8', errors='ignore') as inputfile:
+        for line in inputfile:
+            tmp_lst = line.strip().split(',')
+            if (
+                not tmp_lst[0].isdigit()
+                or len(tmp_lst) != (9 + additional_fields)
+                or (additional_fields and float(tmp_lst[-3]) <= 0)
+                or float(tmp_lst[-3 - additional_fields].split('-')[-1]) > repetitions * 10.0
+               ):
+                continue
+
+            if (int(tmp_lst[-4 - additional_fields]) > 0):
+                # If the link number is positive (i.e if it is not a summary, where it's -1)...
+                date = datetime.strptime(tmp_lst[0], '%Y%m%d%H%M%S')
+                if not iperf_data:
+                    first_date = date
+
+                time_from_start = float((date - first_date).total_seconds())
+                rate = float(tmp_lst[-1 - additional_fields])
+                if additional_fields:
+                    # For UDP: rate = rate * (total_datagrams - lost_datagrams) / total_datagrams
+                    rate = rate * (float(tmp_lst[-3]) - float(tmp_lst[-4])) / float(tmp_lst[-3])
+                if (int(tmp_lst[-2 - additional_fields]) < 0) or (rate < 0.0):
+                    rate = np.nan
+                iperf_data.append([ time_from_start, int(tmp_lst[-4 - additional_fields]), rate ])
+
+    if not iperf_data:
+        raise ValueError('Nothing reached the server.')
+
+    iperf_data = np.array(iperf_data)
+    conns = np.unique(iperf_data[:,1])
+    num_conn = conns.shape[0]
+    if num_conn < streams:
+        raise ValueError(str(num_conn) + ' out of ' + str(streams) + ' streams reached the server.')
+    elif num_conn > streams:
+        raise ValueError(str(num_conn) + ' connections reached the server (' + str(streams) + ' expected).')
+
+    # Sort by connection number, then by date. Get indices of the result.
+    bi_sorted_indices = np.lexsort((iperf_data[:,0], iperf_data[:,1]))
+    iperf_data = iperf_data[bi_sorted_indices]
+    ### Mechanism to check if too few or too many connections received
+    # Get the index of the line after the last of each connection
+    conn_ranges = np.searchsorted(iperf_data[:,1], conns, side='right')
+    # Get sizes of connection blocks
+    conn_count = np.diff(np.insert(conn_ranges, 0, 0))
+    server_fault = False
+    conn_reached = conn_count.min()
+    if conn_reached < repetitions:
+        # If there was at least one occasion when there were fewer connections than expected
+        server_fault = 'too_few'
+        repetitions = conn_reached
+
+    # Get indices of connection block sizes that are bigger than expected (if any)
+    where_extra_conn = (conn_count > repetitions).nonzero()[0]
+    if where_extra_conn.size:
+        ## If there were connection blocks bigger than expected
+        # Get indices of lines after the last (n+1) for removal
+        remove_before_lines = conn_ranges[where_extra_conn]
+        # Get the amount of extra lines
+        amount_lines_to_remove = [remove_before_lines[0] - repetitions * (where_extra_conn[0] + 1)]
+        for i in where_extra_conn[1:]:
+            amount_lines_to_remove.append(conn_ranges[i] - repetitions * (i + 1) - sum(amount_lines_to_remove))
+
+        # Get the first lines to remove
+        first_for_removal = remove_before_lines - amount_lines_to_remove
+        # Get the ranges of lines to remove
+        lines_to_remove = np.array([
+                                    np.arange(first_for_removal[i],remove_before_lines[i])
+                                    for i in np.arange(first_for_removal.size)
+                                   ]).flatten()
+        # Remove the extra lines
+        iperf_data = np.delete(iperf_data, lines_to_remove, axis=0)
+        if not server_fault:
+            server_fault = 'too_many'
+
+    ### End connection ammount check
+    iperf_data = iperf_data[:,[0,2]].reshape((num_conn, iperf_data.shape[0]//num_conn, 2))
+    iperf_data = np.ma.masked_array(iperf_data, np.isnan(iperf_data))
+    mean_times = np.mean(iperf_data[:,:,0], axis=0)
+    iperf_stdev = np.std(iperf_data[:,:,1], axis=0) * np.sqrt(num_conn)
+    out_arr = np.vstack((mean_times, iperf_data[:,:,1].sum(axis=0), iperf_stdev)).filled(np.nan).T
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std(), server_fault
+
+
+def reference_mpstat_data_single(mpstat_out):
+    '''
+    The original line-by-line mpstat parser (NetMeter.py before NM_parsers).
+    '''
+    mpstat_data = []
+    tmp_row = []
+    time_interval = 0.0
+    with open(mpstat_out) as inputfile:
+        for line in inputfile:
+            tmp_lst = line.split()
+            if (not any('CPU' in s for s in tmp_lst)) and tmp_lst and ('Average' not in tmp_lst[0]):
+                if any('all' in s for s in tmp_lst):
+                    if tmp_row:
+                        mpstat_data.append(tmp_row)
+
+                    tmp_row = []
+                else:
+                    tmp_row.append(float(tmp_lst[-1]))
+
+                if not time_interval:
+                    try:
+                        time = datetime.strptime(tmp_lst[0] + tmp_lst[1], '%I:%M:%S%p')
+                    except ValueError:
+                        time = datetime.strptime(tmp_lst[0], '%H:%M:%S')
+
+                    if not mpstat_data:
+                        first_time = time
+
+                    time_interval = float((time - first_time).total_seconds())
+
+    mpstat_data.append(tmp_row)
+    mpstat_data = np.array(mpstat_data)
+    num_measurements, num_cpu = mpstat_data.shape
+    times = np.arange(0, num_measurements * time_interval, time_interval)
+    mpstat_data = (1 - mpstat_data / 100) / num_cpu
+    tot_cpu_usage = mpstat_data.sum(axis=1)
+    core_stdev = np.std(mpstat_data, axis=1) * np.sqrt(num_cpu)
+    out_arr = np.vstack((times, tot_cpu_usage, core_stdev)).T
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std()
+
+
+def reference_latency_data_single(iperf_out, protocol, streams, repetitions):
+    '''
+    The original line-by-line parser of the enhanced (-e) latency output
+    (NetMeter_latency*.py before NM_parsers), with its debugging prints
+    (which go to os.devnull in the benchmark).
+    '''
+    iperf_data = []
+    with open(iperf_out, encoding='utf-8', errors='ignore') as inputfile:
+        for line in inputfile:
+            tmp_lst = line.strip().split('/')
+            if (len(tmp_lst)>5):
+                print('entro no loop deseado...')
+                lat_average = float(tmp_lst[-4].strip().split(' ')[-1])
+                lat_stand = float(tmp_lst[-1].strip().split(' ')[0])
+                id_stream_i = tmp_lst[0]
+                id_stream = int(id_stream_i.strip().split(']')[0].strip().split('[')[1])
+                time_start_iii = id_stream_i.strip().split(' ')[3].strip().split('-')
+                time_from_start = float(time_start_iii[0])
+                time_from_end = float(time_start_iii[1])
+                if ((time_from_end-time_from_start) == 10): #Interval greater than 10 sec.
+                    iperf_data.append([ time_from_start, lat_average, lat_stand, id_stream ])
+
+    if not iperf_data:
+        raise ValueError('Nothing reached the server.')
+
+    iperf_data = np.array(iperf_data)
+    conns = np.unique(iperf_data[:,3])
+    num_conn = conns.shape[0]
+    if num_conn < streams:
+        raise ValueError(str(num_conn) + ' out of ' + str(streams) + ' streams reached the server.')
+    elif num_conn > streams:
+        raise ValueError(str(num_conn) + ' connections reached the server (' + str(streams) + ' expected).')
+    print( 'paso bien por la funcion' )
+    print('iperf_data initial antes del pre processamiento')
+    print(iperf_data)
+
+    bi_sorted_indices = np.lexsort((iperf_data[:,0], iperf_data[:,3]))
+    iperf_data = iperf_data[bi_sorted_indices]
+    print('Sorted by connection number and then by date')
+    print(iperf_data)
+    conn_ranges = np.searchsorted(iperf_data[:,3], conns, side='right')
+    print('print of conn_ranges')
+    print(conn_ranges)
+    conn_count = np.diff(np.insert(conn_ranges, 0, 0))
+    server_fault = False
+    conn_reached = conn_count.min()
+    print('print of conn_count')
+    print(conn_count)
+    print('print of conn_reached')
+    print(conn_reached)
+    if conn_reached < repetitions:
+        server_fault = 'too_few'
+        repetitions = conn_reached
+
+    where_extra_conn = (conn_count > repetitions).nonzero()[0]
+    print(repetitions)
+    print(conn_count)
+    print(where_extra_conn)
+    if where_extra_conn.size:
+        print('Entro al loop donde modifica el iperf_data')
+        remove_before_lines = conn_ranges[where_extra_conn]
+        amount_lines_to_remove = [remove_before_lines[0] - repetitions * (where_extra_conn[0] + 1)]
+        for i in where_extra_conn[1:]:
+            amount_lines_to_remove.append(conn_ranges[i] - repetitions * (i + 1) - sum(amount_lines_to_remove))
+
+        first_for_removal = remove_before_lines - amount_lines_to_remove
+        lines_to_remove = np.array([
+                                    np.arange(first_for_removal[i],remove_before_lines[i])
+                                    for i in np.arange(first_for_removal.size)
+                                   ]).flatten()
+        iperf_data = np.delete(iperf_data, lines_to_remove, axis=0)
+        if not server_fault:
+            server_fault = 'too_many'
+
+    print('final modifications iperf_data...')
+    print(iperf_data)
+    iperf_data = iperf_data[:,[0,1,2]].reshape((num_conn, iperf_data.shape[0]//num_conn, 3))
+    print('Number of Connections (num_conn')
+    print(num_conn)
+    print('ammount checking...')
+    print(iperf_data)
+    iperf_data = np.ma.masked_array(iperf_data, np.isnan(iperf_data))
+    print('ammount after masked array...')
+    print(iperf_data)
+    mean_times = np.mean(iperf_data[:,:,0], axis=0)
+    iperf_stdev = np.mean(iperf_data[:,:,2], axis=0)
+    out_arr = np.vstack((mean_times, iperf_data[:,:,1].mean(axis=0), iperf_stdev)).filled(np.nan).T
+    print(mean_times)
+    print(iperf_stdev)
+    print(out_arr)
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std(), server_fault
+
+
+def synthetic_iperf(path, protocol = 'UDP', streams = 8, hours = 2.0, interval = 1.0):
+    '''
+    Write a server output of a run of "hours" with "streams" connections and
+    reports every "interval" seconds, with a few unreadable lines in between.
+    '''
+    rng = np.random.default_rng(0)
+    start = datetime(2020, 10, 18, 23, 30, 0)
+    reports = int(hours * 3600 / interval)
+    with open(path, 'w') as f:
+        for i in range(reports):
+            date = (start + timedelta(seconds = int((i + 1) * interval))).strftime('%Y%m%d%H%M%S')
+            for conn in range(3, 3 + streams):
+                bytes_ = int(rng.integers(100000, 1000000))
+                line = (date + ',10.0.0.1,5001,10.0.0.2,' + str(40000 + conn) + ',' + str(conn) + ',' +
+                        format(i * interval, '.1f') + '-' + format((i + 1) * interval, '.1f') + ',' +
+                        str(bytes_) + ',' + str(int(bytes_ * 8 / interval)))
+                if protocol == 'UDP':
+                    total = int(rng.integers(500, 1000))
+                    lost = int(rng.integers(0, 20))
+                    line += ',0.012,' + str(lost) + ',' + str(total) + ',' + format(100.0 * lost / total, '.3f') + ',0'
+
+                f.write(line + '\n')
+
+            if i % 1000 == 999:
+                f.write('\x00\x00 unreadable line\n')
+
+    return reports
+
+
+def synthetic_mpstat(path, cores = 16, hours = 2.0, interval = 1, ampm = True):
+    '''
+    Write an "mpstat -P ALL" output of "hours" with samples every "interval"
+    seconds of "cores" CPUs, with the final averages.
+    '''
+    rng = np.random.default_rng(0)
+    start = datetime(2020, 10, 18, 23, 30, 0)
+    samples = int(hours * 3600 / interval)
+    clock = '%I:%M:%S %p' if ampm else '%H:%M:%S'
+    header = '    CPU    %usr   %nice    %sys %iowait    %irq   %soft  %steal  %guest  %gnice   %idle\n'
+    row = '  {:>5}{:8.2f}    0.00{:8.2f}    0.00    0.00    0.00    0.00    0.00    0.00{:8.2f}\n'
+    with open(path, 'w') as f:
+        f.write('Linux 5.4.0 (host) \t10/18/2020 \t_x86_64_\t(' + str(cores) + ' CPU)\n\n')
+        for i in range(samples):
+            stamp = (start + timedelta(seconds = (i + 1) * interval)).strftime(clock)
+            f.write('\n' + stamp + header)
+            busy = rng.uniform(0, 40, cores + 1)
+            for c in range(-1, cores):
+                f.write(stamp + row.format('all' if c < 0 else c, busy[c + 1] / 2, busy[c + 1] / 2, 100 - busy[c + 1]))
+
+        f.write('\nAverage:' + header + 'Average:' + row.format('all', 1.0, 1.0, 98.0))
+
+    return samples
+
+
+def same_result(a, b):
+    out_a, mean_a, std_a, fault_a = a
+    out_b, mean_b, std_b, fault_b = b
+    return (
+            out_a.shape == out_b.shape
+            and np.allclose(out_a, out_b, equal_nan = True)
+            and np.allclose([mean_a, std_a], [mean_b, std_b], equal_nan = True)
+            and fault_a == fault_b
+           )
+
+
+def timed(fn, *args):
+    start = perf_counter()
+    try:
+        result = fn(*args)
+    except ValueError as err:
+        result = ('ValueError', str(err))
+
+    return result, perf_counter() - start
+
+
+def bench_iperf(files):
+    cases = []
+    for path in files:
+        protocol = 'UDP' if '_UDP_' in path or path.split('/')[-1].startswith('UDP') else 'TCP'
+        raw = NM_parsers.read_iperf_csv(path, protocol)
+        streams = np.unique(raw[raw[:,1] > 0, 1]).size if raw.shape[0] else 1
+        cases.append((path, protocol, max(streams, 1), 10**9))
+
+    if not cases:
+        tmp = NamedTemporaryFile(suffix = '_UDP_iperf.dat', delete = False)
+        tmp.close()
+        reports = synthetic_iperf(tmp.name)
+        print('Synthetic UDP run: 8 streams, ' + str(reports) + ' reports per stream.')
+        cases.append((tmp.name, 'UDP', 8, 10**9))
+
+    total_ref = total_new = 0.0
+    mismatches = 0
+    for path, protocol, streams, repetitions in cases:
+        ref, t_ref = timed(reference_iperf_data_single, path, protocol, streams, repetitions)
+        new, t_new = timed(NM_parsers.get_iperf_data_single, path, protocol, streams, repetitions)
+        total_ref += t_ref
+        total_new += t_new
+        if isinstance(ref[0], str) or isinstance(new[0], str):
+            equal = ref == new
+        else:
+            equal = same_result(ref, new)
+
+        if not equal:
+            mismatches += 1
+            print('\033[91mMISMATCH:\033[0m ' + path)
+
+        print(format(t_ref, '9.4f') + ' s  ' + format(t_new, '9.4f') + ' s  ' + path)
+
+    print('Reference: ' + format(total_ref, '.3f') + ' s, NM_parsers: ' + format(total_new, '.3f') +
+          ' s (' + format(total_ref / max(total_new, 1e-9), '.1f') + 'x), ' + str(mismatches) + ' mismatches.')
+    return mismatches
+
+
+def bench_mpstat(files):
+    cases = list(files)
+    if not cases:
+        for ampm in (True, False):
+            tmp = NamedTemporaryFile(suffix = '_mpstat.dat', delete = False)
+            tmp.close()
+            samples = synthetic_mpstat(tmp.name, ampm = ampm)
+            cases.append(tmp.name)
+
+        print('Synthetic mpstat runs: 16 cores, ' + str(samples) + ' samples (12 and 24 hour clock).')
+
+    total_ref = total_new = 0.0
+    mismatches = 0
+    for path in cases:
+        ref, t_ref = timed(reference_mpstat_data_single, path)
+        new, t_new = timed(NM_parsers.get_mpstat_data_single, path)
+        total_ref += t_ref
+        total_new += t_new
+        if isinstance(ref[0], str) or isinstance(new[0], str):
+            equal = ref == new
+        else:
+            equal = (ref[0].shape == new[0].shape and np.allclose(ref[0], new[0]) and
+                     np.allclose(ref[1:], new[1:]))
+
+        if not equal:
+            mismatches += 1
+            print('\033[91mMISMATCH:\033[0m ' + path)
+
+        print(format(t_ref, '9.4f') + ' s  ' + format(t_new, '9.4f') + ' s  ' + path)
+
+    print('Reference: ' + format(total_ref, '.3f') + ' s, NM_parsers: ' + format(total_new, '.3f') +
+          ' s (' + format(total_ref / max(total_new, 1e-9), '.1f') + 'x), ' + str(mismatches) + ' mismatches.')
+    return mismatches
+
+
+def bench_latency(files):
+    cases = list(files)
+    if not cases:
+        cases = sorted(glob(join(dirname(abspath(__file__)), latency_archive, '*', 'raw-data', '*_iperf.dat')))
+        print('Archived ' + latency_archive + ' runs: ' + str(len(cases)) + ' server outputs.')
+
+    total_ref = total_new = 0.0
+    mismatches = 0
+    for path in cases:
+        raw = NM_parsers.read_iperf_latency(path)
+        streams = max(np.unique(raw[:,0]).size, 1)
+        with open(devnull, 'w') as null, redirect_stdout(null):
+            ref, t_ref = timed(reference_latency_data_single, path, 'UDP', streams, 10**9)
+
+        new, t_new = timed(NM_parsers.get_latency_data_single, path, 'UDP', streams, 10**9)
+        total_ref += t_ref
+        total_new += t_new
+        if isinstance(ref[0], str) and not isinstance(new[0], str):
+            # The original parser fails on the "-" latencies of the intervals without any.
+            print('Only NM_parsers could read ' + path + ' (the reference: ' + ref[1] + ').')
+            equal = True
+        elif isinstance(ref[0], str) or isinstance(new[0], str):
+            equal = ref == new
+        else:
+            equal = same_result(ref, new)
+
+        if not equal:
+            mismatches += 1
+            print('\033[91mMISMATCH:\033[0m ' + path)
+
+        print(format(t_ref, '9.4f') + ' s  ' + format(t_new, '9.4f') + ' s  ' + path)
+
+    print('Reference: ' + format(total_ref, '.3f') + ' s, NM_parsers: ' + format(total_new, '.3f') +
+          ' s (' + format(total_ref / max(total_new, 1e-9), '.1f') + 'x), ' + str(mismatches) + ' mismatches.')
+    return mismatches
+
+
+if __name__ == '__main__':
+    benches = {'iperf': bench_iperf, 'mpstat': bench_mpstat, 'latency': bench_latency}
+    if len(sys.argv) < 2 or sys.argv[1] not in benches:
+        print('Usage: python3 NM_bench.py iperf|mpstat|latency [FILE ...]')
+        sys.exit(2)
+
+    sys.exit(1 if benches[sys.argv[1]](sys.argv[2:]) else 0)
@@ -12,12 +12,18 @@
 
 import numpy as np
 import sys
+import json
+import hashlib
 from re import sub
-from os.path import isdir, join
-from os import makedirs, listdir
+from os.path import isdir, isfile, join, basename
+from os import makedirs, listdir, cpu_count
 from datetime import datetime
-from subprocess import Popen
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+from NM_render import get_renderer
+from NM_store import load_table
+from NM_index import indexed_files
 
 ########### May requires changing  #############
 gnuplot_path = r'gnuplot'
@@ -31,15 +37,26 @@ logo_fg_location = 'screen 0.94, screen 0.995'
 logo_fg_color = '#1e6378'
 logo_name = '{/=10 Daynix Computing ltd.}'
 logo_name_location = 'screen 0.94, screen 0.945'
+# How the comparisons are drawn: 'gnuplot' or 'matplotlib' (see NM_render.py)
+plot_backend = 'gnuplot'
+# The number of comparisons rendered at the same time (None: one per CPU core)
+render_workers = None
+# Remembers which comparisons were already rendered to the output directory
+cache_name = '.NM_compare_cache.json'
 ################################################
 
 rundate = datetime.now().strftime('%Y_%m_%d_%H-%M-%S')
 
 def findfiles(d):
-    one2two_iperf = [f for f in listdir(d) if f.endswith('one2two_iperf_summary.dat')]
-    one2two_mpstat = [f for f in listdir(d) if f.endswith('one2two_mpstat_summary.dat')]
-    two2one_iperf = [f for f in listdir(d) if f.endswith('two2one_iperf_summary.dat')]
-    two2one_mpstat = [f for f in listdir(d) if f.endswith('two2one_mpstat_summary.dat')]
+    # Take the file names from the results catalog (NM_index.py), if there is one and it is up to date.
+    names = indexed_files(d)
+    if names is None:
+        names = listdir(d)
+
+    one2two_iperf = [f for f in names if f.endswith('one2two_iperf_summary.dat')]
+    one2two_mpstat = [f for f in names if f.endswith('one2two_mpstat_summary.dat')]
+    two2one_iperf = [f for f in names if f.endswith('two2one_iperf_summary.dat')]
+    two2one_mpstat = [f for f in names if f.endswith('two2one_mpstat_summary.dat')]
     filelist = [one2two_iperf, one2two_mpstat, two2one_iperf, two2one_mpstat]
     protocols = [False for i in range(4)]
     streams = [False for i in range(4)]
@@ -88,7 +105,8 @@ def get_rate_factor(n):
 
 
 def get_iperf_metadata(f):
-    data = np.loadtxt(f)
+    # Uses the binary copy of the summary, if there is one.
+    data = load_table(f)
     datamax = np.amax(data[:,iperf_datacolumn])
     test_status = data[:,0]
     non_failed_test_status = test_status[(test_status >= 0).nonzero()]
@@ -173,7 +191,11 @@ def mpstat_plot_block(data_unit, dir_title, old_datfile, new_datfile):
     return content
 
 
-def write_comp_gp(old_d, new_d, out_basename):
+def comp_gp_content(old_d, new_d, out_basename):
+    '''
+    Returns the gnuplot script comparing the two directories, and the data files
+    that it plots.
+    '''
     raw_data_subdir = "raw-data"
     old_files, old_proto, old_streams = findfiles(join(old_d, raw_data_subdir))
     new_files, new_proto, new_streams = findfiles(join(new_d, raw_data_subdir))
@@ -252,21 +274,113 @@ def write_comp_gp(old_d, new_d, out_basename):
         content += mpstat_plot_block(data_unit, dir_title, old_files[3], new_files[3])
 
     content += 'unset multiplot\n'
+    return content, [f for f in old_files + new_files if f]
+
+
+def comp_chart(old_d, new_d, out_basename):
+    '''
+    The same comparison page as comp_gp_content, as a chart for the renderers
+    that draw from the data files directly (see NM_render.py). Also returns the
+    data files that it plots.
+    '''
+    raw_data_subdir = "raw-data"
+    old_files, old_proto, old_streams = findfiles(join(old_d, raw_data_subdir))
+    new_files, new_proto, new_streams = findfiles(join(new_d, raw_data_subdir))
+    if old_proto == new_proto == 'TCP':
+        data_unit = 'Buffer'
+    elif old_proto == new_proto == 'UDP':
+        data_unit = 'Datagram'
+    else:
+        data_unit = 'Buffer/Datagram'
+
+    blocks = []
+    for dir_title, i, direction in (('Client 1 to Client 2', 0, 'Client 1 to Client 2'),
+                                    ('Client 2 to Client 1', 2, 'Client 2 to Client 1')):
+        missing = [('No ' + v + ' ' + direction + ' results found') for v, files in
+                   (('new', new_files), ('old', old_files)) if not files[i]]
+        if missing:
+            blocks.append({'missing': missing})
+            continue
+
+        old_max, _ = get_iperf_metadata(old_files[i])
+        new_max, _ = get_iperf_metadata(new_files[i])
+        BW_units, rate_factor = get_rate_factor(max(old_max, new_max))
+        blocks.append({
+                       'title': dir_title,
+                       'rate_factor': rate_factor,
+                       'rate_units': BW_units,
+                       'old_iperf': old_files[i],
+                       'new_iperf': new_files[i],
+                       'old_mpstat': old_files[i + 1],
+                       'new_mpstat': new_files[i + 1]
+                      })
+
+    chart = {
+             'type': 'comparison',
+             'output': out_basename + '.pdf',
+             'old_label': old_d + ' [' + old_proto + ', ' + old_streams + ' st.]',
+             'new_label': new_d + ' [' + new_proto + ', ' + new_streams + ' st.]',
+             'data_unit': data_unit,
+             'blocks': blocks
+            }
+    return chart, [f for f in old_files + new_files if f]
+
+
+def write_comp_gp(old_d, new_d, out_basename):
+    content, _ = comp_gp_content(old_d, new_d, out_basename)
     scriptfile = out_basename + '.plt'
     with open(scriptfile, 'w') as outfile:
         outfile.write(content)
 
 
+def comp_key(content, out_basename, datafiles):
+    '''
+    A hash of everything that a comparison page depends on: the script (apart
+    from the output name), the plot backend (or gnuplot command), and the
+    contents of the data files.
+    '''
+    h = hashlib.sha256()
+    h.update((gnuplot_path if plot_backend == 'gnuplot' else plot_backend).encode())
+    h.update(content.replace(out_basename, '').encode())
+    for f in datafiles:
+        with open(f, 'rb') as datafile:
+            h.update(datafile.read())
+
+    return h.hexdigest()
+
+
+def load_cache(outdir):
+    try:
+        with open(join(outdir, cache_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(outdir, cache):
+    with open(join(outdir, cache_name), 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+
+
 def main():
-    if len(sys.argv) != 4:
-        print('Usage: ' + sys.argv[0] + ' <OLD DIR1>,<OLD DIR2>,... <NEW DIR1>,<NEW DIR2>,... <OUTPUT DIR>')
+    global plot_backend
+    force = '--force' in sys.argv
+    args = [a for a in sys.argv[1:] if a != '--force']
+    if '--backend' in args:
+        i = args.index('--backend')
+        plot_backend = args[i + 1] if i + 1 < len(args) else ''
+        del args[i:i + 2]
+
+    if len(args) != 3:
+        print('Usage: ' + sys.argv[0] + ' [--force] [--backend gnuplot|matplotlib] '
+              '<OLD DIR1>,<OLD DIR2>,... <NEW DIR1>,<NEW DIR2>,... <OUTPUT DIR>')
         sys.exit(1)
 
-    olddirs = sys.argv[1].split(',')
+    olddirs = args[0].split(',')
     olddirs = [glob(d)[0] for d in olddirs]
-    newdirs = sys.argv[2].split(',')
+    newdirs = args[1].split(',')
     newdirs = [glob(d)[0] for d in newdirs]
-    outdir = sys.argv[3]
+    outdir = args[2]
 
     if len(olddirs) != len(newdirs):
         print('Error! The number of old directories must be equal to the number of new ones.')
@@ -288,14 +402,55 @@ def main():
             sys.exit(1)
 
     print('The output directory is: ' + outdir)
+    workers = render_workers or cpu_count() or 1
+    try:
+        renderer = get_renderer(plot_backend, gnuplot_bin = gnuplot_path, workers = workers)
+    except (ValueError, ImportError) as err:
+        print('\033[91mERROR:\033[0m Could not use the ' + plot_backend + ' plot backend (' + str(err) + ').')
+        sys.exit(1)
 
+    # Only the comparisons whose inputs changed since they were last rendered
+    # to this output directory are rendered again.
+    cache = {} if force else load_cache(outdir)
+    jobs = []
     count = 0
     for (o,n) in zip(olddirs,newdirs):
         count += 1
         out_basename = join(outdir, rundate + '_comp_' + format(count, '04d'))
-        write_comp_gp(o, n, out_basename)
-        p = Popen([gnuplot_path, out_basename + '.plt'])
-        p.wait()
+        if renderer.needs_script:
+            content, datafiles = comp_gp_content(o, n, out_basename)
+        else:
+            chart, datafiles = comp_chart(o, n, out_basename)
+            content = json.dumps(chart, sort_keys = True)
+
+        key = comp_key(content, out_basename, datafiles)
+        if key in cache and isfile(join(outdir, cache[key] + '.pdf')):
+            print('Unchanged: ' + o + ' vs. ' + n + ' (' + cache[key] + '.pdf)')
+            continue
+
+        if renderer.needs_script:
+            with open(out_basename + '.plt', 'w') as outfile:
+                outfile.write(content)
+
+            chart = {'type': 'comparison', 'script': out_basename + '.plt', 'output': out_basename + '.pdf'}
+
+        jobs.append((key, out_basename, chart))
+
+    print('Rendering ' + str(len(jobs)) + ' out of ' + str(count) + ' comparisons...')
+    if renderer.needs_script:
+        # The scripts are fed to a few persistent gnuplot processes (see NM_gnuplot.py).
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(renderer.render, [c for _, _, c in jobs]))
+    else:
+        results = renderer.render_many([c for _, _, c in jobs])
+
+    renderer.close()
+
+    for (key, out_basename, _), ok in zip(jobs, results):
+        if ok:
+            cache[key] = basename(out_basename)
+
+    save_cache(outdir, cache)
 
 
 if __name__ == "__main__":
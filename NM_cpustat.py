@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+CPU and interface telemetry of the clients (Linux), instead of an mpstat
+process.
+
+CpuSampler samples the local machine in-process, from a background thread at
+a fixed period (down to a tenth of a second): the per-core times of
+/proc/stat, the NET_RX/NET_TX soft interrupts of /proc/softirqs, the
+interrupts of /proc/interrupts, the interface counters of /proc/net/dev, and
+the CPU times of the local Iperf processes (/proc/<pid>/stat).
+
+RemoteSampler does the same for a remote client: a small shell loop
+(telemetry_script(), only shell builtins and sleep) runs on the client over
+its ssh connection, and prints the /proc/stat CPU lines and /proc/net/dev
+once per period. The lines are parsed as they arrive.
+
+The counters go into preallocated NumPy arrays, used as a ring buffer. The
+samples are summed up to the report intervals of the test, so the CPU load
+lines up with the network intervals:
+
+    result()  - as get_mpstat_data_single(): per interval, the total busy
+                fraction and the standard deviation of the cores
+    detail()  - per interval, the busy, softirq, irq and Iperf fractions, and
+                the rates of the network soft interrupts and of the interrupts
+    cores()   - the same, for every core
+    net()     - per interval and interface, the receive and transmit rates
+
+The raw samples can be saved with the results and loaded again (load()).
+
+Usage (sample the local machine by hand):
+    python3 NM_cpustat.py [--period S] [--interval S] DURATION [PID...]
+'''
+
+import sys
+import argparse
+import numpy as np
+from os.path import isfile
+from time import monotonic
+from threading import Thread, Event, Lock
+
+proc_stat = '/proc/stat'
+proc_softirqs = '/proc/softirqs'
+proc_interrupts = '/proc/interrupts'
+proc_net_dev = '/proc/net/dev'
+
+# The /proc/stat columns that are kept: user, nice, system, idle, iowait, irq,
+# softirq, steal (guest time is already counted as user time).
+stat_fields = 8
+idle_field, irq_field, softirq_field = 3, 5, 6
+# The soft interrupts of the network stack.
+net_softirqs = ('NET_RX:', 'NET_TX:')
+# The /proc/net/dev columns that are kept: received bytes and packets, and
+# transmitted bytes and packets.
+net_fields = (0, 1, 8, 9)
+
+
+def available():
+    return isfile(proc_stat)
+
+
+def _read(f):
+    f.seek(0)
+    return f.read()
+
+
+def _cpu_columns(header, cpus):
+    '''
+    Where the columns of the cores "cpus" (in the order of /proc/stat) are,
+    from the header line of /proc/softirqs or /proc/interrupts (the lines
+    below it start with their label).
+    '''
+    names = [n.lower() for n in header.split()]
+    return [names.index(c) + 1 if c in names else None for c in cpus]
+
+
+def _per_cpu(values, columns):
+    return [int(values[c]) if c is not None and c < len(values) else 0 for c in columns]
+
+
+def net_dev(text):
+    '''
+    The interfaces of /proc/net/dev (but the loopback), and their counters
+    (see net_fields).
+    '''
+    ifaces = []
+    for line in text.splitlines():
+        name, sep, values = line.partition(':')
+        name = name.strip()
+        if sep and name != 'lo' and '|' not in name:
+            values = values.split()
+            ifaces.append((name, [int(values[f]) for f in net_fields]))
+
+    return ifaces
+
+
+def telemetry_script(period):
+    '''
+    The shell loop that samples a remote client every "period" seconds: a
+    "@ <uptime>" line, the per-core lines of /proc/stat, /proc/net/dev, and
+    a "#" line at the end of the sample. It stops by itself once its output
+    is closed.
+    '''
+    return ('while :; do read t x < /proc/uptime; echo "@ $t"; '
+            'while read l; do case $l in cpu[0-9]*) echo "$l";; esac; done < ' + proc_stat + '; '
+            'while read l; do echo "$l"; done < ' + proc_net_dev + '; '
+            'echo "#"; sleep ' + format(period, 'g') + '; done')
+
+
+def pid_ticks(pid):
+    '''
+    The CPU time (user and system, in clock ticks) of the process "pid",
+    with all its threads, or None if it is gone.
+    '''
+    try:
+        with open('/proc/' + str(pid) + '/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+
+    # After the command name (in parentheses, which may contain anything).
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[11]) + int(fields[12])
+
+
+class CpuSamples(object):
+    '''
+    The samples of the counters of one machine, every "period" seconds: at
+    most "capacity" of them (the oldest ones are overwritten), and what
+    they sum up to over the report intervals.
+    '''
+    arrays = ('times', 'stat', 'softirqs', 'irqs', 'iperf', 'ifstat')
+
+    def __init__(self, period, capacity):
+        self.period = period
+        self.capacity = capacity
+        self.count = 0
+        self.ifaces = []
+
+    def allocate(self, num_cpu, ifaces):
+        # The ring buffer.
+        capacity = self.capacity
+        self.times = np.zeros(capacity)
+        self.stat = np.zeros((capacity, num_cpu, stat_fields), dtype = np.int64)
+        self.softirqs = np.zeros((capacity, num_cpu), dtype = np.int64)
+        self.irqs = np.zeros((capacity, num_cpu), dtype = np.int64)
+        self.iperf = np.zeros(capacity, dtype = np.int64)
+        self.ifstat = np.zeros((capacity, len(ifaces), len(net_fields)), dtype = np.int64)
+        self.ifaces = list(ifaces)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        The samples saved with save(), to be summed up again.
+        '''
+        with np.load(path) as data:
+            samples = CpuSamples(float(data['period']), data['times'].shape[0])
+            for name in cls.arrays:
+                setattr(samples, name, data[name] if name in data.files else np.zeros(samples.capacity))
+            samples.ifaces = [str(i) for i in data['ifaces']] if 'ifaces' in data.files else []
+
+        samples.count = samples.capacity
+        return samples
+
+    def save(self, path):
+        '''
+        Save the samples (oldest first). Returns False if there are too few
+        of them to be summed up.
+        '''
+        if self.count < 2:
+            return False
+
+        order = self._order()
+        np.savez(path, period = self.period, ifaces = np.array(self.ifaces, dtype = str),
+                 **dict((name, getattr(self, name)[order]) for name in self.arrays))
+        return True
+
+    def _net_row(self, i, ifaces):
+        # The counters of the known interfaces (the ones that appeared later are ignored).
+        counters = dict(ifaces)
+        for n, name in enumerate(self.ifaces):
+            self.ifstat[i, n] = counters.get(name, 0)
+
+    def _order(self):
+        # The slots of the buffer, oldest first.
+        if self.count <= self.capacity:
+            return np.arange(self.count)
+
+        return (np.arange(self.capacity) + self.count) % self.capacity
+
+    def _intervals(self, interval, repetitions = None):
+        '''
+        The samples closest to the bounds of the report intervals, from the
+        first sample. At most "repetitions" intervals (at least one, if there
+        are two samples).
+        '''
+        order = self._order()
+        times = self.times[order] - self.times[order[0]]
+        interval = max(interval, self.period)
+        bounds = np.arange(0.0, times[-1] + interval / 2.0, interval)
+        if repetitions is not None:
+            bounds = bounds[:repetitions + 1]
+
+        idx = np.unique(np.abs(times[:, None] - bounds[None, :]).argmin(axis = 0))
+        if idx.size < 2:
+            # Shorter than an interval: all of it as one.
+            idx = np.unique([0, times.size - 1])
+
+        return order[idx], times[idx]
+
+    def _deltas(self, interval, repetitions = None):
+        if self.count < 2:
+            raise ValueError('Too few CPU samples.')
+
+        slots, times = self._intervals(interval, repetitions)
+        stat = np.diff(self.stat[slots], axis = 0).astype(float)
+        total = stat.sum(axis = 2)
+        total[total == 0] = np.nan
+        return (times[:-1], stat, total, np.diff(self.softirqs[slots], axis = 0),
+                np.diff(self.irqs[slots], axis = 0), np.diff(self.iperf[slots]), np.diff(times))
+
+    def result(self, interval, repetitions = None):
+        '''
+        As get_mpstat_data_single(): the per-interval array (time, total CPU
+        busy fraction, standard deviation of the cores), and the mean and
+        standard deviation of the total.
+        '''
+        times, stat, total, _, _, _, _ = self._deltas(interval, repetitions)
+        num_cpu = stat.shape[1]
+        busy = (1 - stat[:,:,idle_field] / total) / num_cpu
+        out_arr = np.vstack((times, busy.sum(axis=1), np.std(busy, axis=1) * np.sqrt(num_cpu))).T
+        return out_arr, out_arr[:,1].mean(), out_arr[:,1].std()
+
+    def cores(self, interval, repetitions = None):
+        '''
+        Per interval and core: the busy, softirq and irq fractions of the
+        core, and its network soft interrupt and interrupt rates (1/s).
+        Returns an (intervals, cores, 5) array, and the interval times.
+        '''
+        times, stat, total, softirqs, irqs, _, lengths = self._deltas(interval, repetitions)
+        out = np.empty(stat.shape[:2] + (5,))
+        out[:,:,0] = 1 - stat[:,:,idle_field] / total
+        out[:,:,1] = stat[:,:,softirq_field] / total
+        out[:,:,2] = stat[:,:,irq_field] / total
+        out[:,:,3] = softirqs / lengths[:, None]
+        out[:,:,4] = irqs / lengths[:, None]
+        return out, times
+
+    def detail(self, interval, repetitions = None):
+        '''
+        Per interval: the time, the busy, softirq, irq and Iperf fractions of
+        all the CPU time, and the network soft interrupt and interrupt rates.
+        '''
+        times, stat, total, softirqs, irqs, iperf, lengths = self._deltas(interval, repetitions)
+        all_time = np.nansum(total, axis = 1)
+        all_time[all_time == 0] = np.nan
+        return np.vstack((times, 1 - stat[:,:,idle_field].sum(axis=1) / all_time,
+                          stat[:,:,softirq_field].sum(axis=1) / all_time,
+                          stat[:,:,irq_field].sum(axis=1) / all_time, iperf / all_time,
+                          softirqs.sum(axis=1) / lengths, irqs.sum(axis=1) / lengths)).T
+
+    def net(self, interval, repetitions = None):
+        '''
+        Per interval and interface (a row each, the interface numbered as in
+        "ifaces"): the time, the interface, the received and transmitted
+        rates (b/s) and packet rates (1/s).
+        '''
+        if self.count < 2:
+            raise ValueError('Too few interface samples.')
+
+        slots, times = self._intervals(interval, repetitions)
+        rates = np.diff(self.ifstat[slots], axis = 0) / np.diff(times)[:, None, None]
+        rates[:,:,[0, 2]] *= 8
+        num, num_if = rates.shape[:2]
+        return np.hstack((np.repeat(times[:-1], num_if)[:, None], np.tile(np.arange(num_if), num)[:, None],
+                          rates[:,:,[0, 2, 1, 3]].reshape((-1, 4))))
+
+
+class CpuSampler(CpuSamples):
+    '''
+    Sample the counters of the local machine every "period" seconds, keeping
+    at most "capacity" samples. The CPU time of the processes "pids" (more
+    can be added with add_pid()) is attributed to Iperf.
+    '''
+    def __init__(self, period = 0.1, capacity = 4096, pids = ()):
+        CpuSamples.__init__(self, period, capacity)
+        self.stat_file, self.softirq_file, self.irq_file, self.net_file = (
+            open(p) if isfile(p) else None for p in (proc_stat, proc_softirqs, proc_interrupts, proc_net_dev))
+        self.files = [f for f in (self.stat_file, self.softirq_file, self.irq_file, self.net_file) if f]
+        lines = _read(self.stat_file).splitlines()
+        self.cpus = [l.split()[0] for l in lines if l.startswith('cpu') and not l.startswith('cpu ')]
+        self.softirq_columns = (_cpu_columns(_read(self.softirq_file).split('\n', 1)[0], self.cpus)
+                                if self.softirq_file else None)
+        self.irq_columns = (_cpu_columns(_read(self.irq_file).split('\n', 1)[0], self.cpus)
+                            if self.irq_file else None)
+        self.allocate(len(self.cpus), [name for name, _ in net_dev(_read(self.net_file))] if self.net_file else [])
+        self.pids = {}
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+        for pid in pids:
+            self.add_pid(pid)
+
+    def add_pid(self, pid):
+        ticks = pid_ticks(pid)
+        if ticks is not None:
+            with self.lock:
+                self.pids[pid] = [ticks, 0]
+
+    def sample(self):
+        '''
+        Read all the counters once, into the next slot of the buffer.
+        '''
+        t = monotonic()
+        i = self.count % self.capacity
+        row = self.stat[i]
+        for core, line in enumerate(_read(self.stat_file).splitlines()[1:len(self.cpus) + 1]):
+            row[core] = line.split()[1:stat_fields + 1]
+
+        if self.softirq_file:
+            counts = self.softirqs[i]
+            counts[:] = 0
+            for line in _read(self.softirq_file).splitlines()[1:]:
+                values = line.split()
+                if values and values[0] in net_softirqs:
+                    counts += _per_cpu(values, self.softirq_columns)
+
+        if self.irq_file:
+            counts = self.irqs[i]
+            counts[:] = 0
+            for line in _read(self.irq_file).splitlines()[1:]:
+                values = line.split()
+                # Only the lines with a column for every core (not ERR, MIS...).
+                if len(values) > len(self.cpus) and values[1].isdigit():
+                    counts += _per_cpu(values, self.irq_columns)
+
+        if self.net_file:
+            self._net_row(i, net_dev(_read(self.net_file)))
+
+        with self.lock:
+            # The CPU time the Iperf processes used since the last sample
+            # (that of the ones that exited is kept).
+            for pid, ticks in self.pids.items():
+                now = pid_ticks(pid)
+                if now is not None:
+                    ticks[1] += now - ticks[0]
+                    ticks[0] = now
+
+            self.iperf[i] = sum(used for _, used in self.pids.values())
+
+        self.times[i] = t
+        self.count += 1
+
+    def _run(self):
+        start = monotonic()
+        n = 0
+        while True:
+            self.sample()
+            n += 1
+            # On a fixed schedule, without drifting by the time of the sampling.
+            if self.stopped.wait(max(start + n * self.period - monotonic(), 0.0)):
+                break
+
+    def start(self):
+        self.thread = Thread(target = self._run, name = 'cpustat', daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stop sampling, with a last sample for the time since the previous one.
+        '''
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            self.sample()
+
+        for f in self.files:
+            f.close()
+
+        self.files = []
+
+
+class RemoteSampler(CpuSamples):
+    '''
+    The samples of a remote client, from the output lines of
+    telemetry_script() (fed to line() as they arrive). The times are the
+    uptimes of the client.
+    '''
+    def __init__(self, period = 1.0, capacity = 4096):
+        CpuSamples.__init__(self, period, capacity)
+        self.stat = None
+        self.pending = None
+        self.stopped = False
+        self.lock = Lock()
+
+    def line(self, line):
+        line = line.strip()
+        with self.lock:
+            if self.stopped:
+                return
+            elif line.startswith('@ '):
+                try:
+                    self.pending = (float(line[2:]), [], [])
+                except ValueError:
+                    self.pending = None
+            elif self.pending is None:
+                return
+            elif line == '#':
+                self._commit()
+            elif line.startswith('cpu'):
+                self.pending[1].append(line.split()[1:stat_fields + 1])
+            else:
+                self.pending[2].extend(net_dev(line))
+
+    def _commit(self):
+        t, cores, ifaces = self.pending
+        self.pending = None
+        if not cores or any(len(c) < stat_fields for c in cores):
+            return
+
+        if self.stat is None:
+            self.allocate(len(cores), [name for name, _ in ifaces])
+        elif len(cores) != self.stat.shape[1]:
+            # A core went on- or offline.
+            return
+
+        i = self.count % self.capacity
+        self.times[i] = t
+        self.stat[i] = cores
+        self._net_row(i, ifaces)
+        self.count += 1
+
+    def stop(self):
+        '''
+        Ignore what still arrives (an incomplete sample is dropped).
+        '''
+        with self.lock:
+            self.stopped = True
+
+
+detail_header = 'TimeStamp(s) Busy Softirq Irq Iperf NetSoftirqs(1/s) Irqs(1/s)'
+cores_header = 'TimeStamp(s) Core Busy Softirq Irq NetSoftirqs(1/s) Irqs(1/s)'
+net_header = 'TimeStamp(s) Iface Rx(b/s) Tx(b/s) RxPackets(1/s) TxPackets(1/s)'
+
+
+def cores_table(cores, times):
+    '''
+    The per-core array of CpuSampler.cores() as a table: a row per interval
+    and core.
+    '''
+    num, num_cpu = cores.shape[:2]
+    return np.hstack((np.repeat(times, num_cpu)[:, None], np.tile(np.arange(num_cpu), num)[:, None],
+                      cores.reshape((-1, cores.shape[2]))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Sample the CPU load of the local machine.')
+    parser.add_argument('--period', type = float, default = 0.1, help = 'the sampling period (s)')
+    parser.add_argument('--interval', type = float, default = 1.0, help = 'the reported interval (s)')
+    parser.add_argument('duration', type = float)
+    parser.add_argument('pids', type = int, nargs = '*', help = 'the processes to attribute CPU time to')
+    args = parser.parse_args()
+    if not available():
+        print('\033[91mERROR:\033[0m ' + proc_stat + ' is not available.')
+        sys.exit(1)
+
+    sampler = CpuSampler(args.period, int(args.duration / args.period) + 2, args.pids).start()
+    try:
+        sampler.stopped.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+
+    sampler.stop()
+    print('# ' + detail_header)
+    for row in sampler.detail(args.interval):
+        print(' '.join(format(v, 'g') for v in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+A native traffic engine: the sender and the receiver of the throughput tests
+in Python, instead of the Iperf binary (traffic_engine = 'native').
+
+It runs on the clients as Iperf does, and takes the Iperf options that
+NetMeter uses (-s, -c, -t, -P, -p, -i, -u, -b, -w, -l, --txstart-time).
+The receiver prints the same "-y C" interval reports, so the server output
+files, the live ingestion, the shared servers and the parsers work the same
+way with both engines. The client and the server only need Python 3 (no
+NumPy).
+
+The data path:
+    - every stream has its own socket and thread (the socket calls release
+      the interpreter lock, so the streams send and receive in parallel);
+    - the buffers are allocated once, and the receiver reads into them with
+      recv_into() (no new bytes object per read);
+    - the TCP sender writes the buffer with os.sendfile() where it is
+      available (from a file in the page cache, no copy through user space),
+      or with send() of a memoryview;
+    - the UDP datagrams carry a sequence number and a send time (as those of
+      Iperf), so the receiver counts the lost and reordered datagrams and
+      the jitter.
+The counters of every stream are plain integers, updated by its thread, and
+a reporter thread turns them into interval rows. In-process (Receiver with
+"on_row"), the rows go straight into the result arrays, with no text at all
+(see bench()).
+
+Usage:
+    python3 NM_engine.py -s [-p PORT] [-i S] [-u] [-w WIN] [-l LEN]
+    python3 NM_engine.py -c HOST [-p PORT] [-t S] [-P N] [-u -b RATE] [-w WIN] [-l LEN]
+    python3 NM_engine.py --bench [-t S] [-P N] [-u -b RATE] [-l LEN] [--iperf IPERF]
+'''
+
+import os
+import sys
+import socket
+import struct
+import argparse
+import tempfile
+from time import time, monotonic, sleep
+from datetime import datetime
+from threading import Thread, Event, Lock
+
+default_port = 5001
+# The default buffer (TCP) and datagram (UDP) lengths, as those of Iperf 2.
+default_len = {'TCP': 131072, 'UDP': 1470}
+# The header of the UDP datagrams: sequence number (negative in the last
+# datagrams of a stream), and the send time (s, us).
+udp_header = struct.Struct('!iII')
+# How many times the last datagram of a UDP stream is sent (it may be lost).
+udp_fin_count = 10
+# How long an UDP stream can be silent before it is considered over (s).
+udp_idle_timeout = 5.0
+_suffix = {'k': 1e3, 'm': 1e6, 'g': 1e9, 'K': 1024, 'M': 1048576, 'G': 1073741824}
+
+
+def parse_amount(text, rate = False):
+    '''
+    An Iperf amount: "128K", "1M"... (1024 based for sizes), or "100M"
+    (1000 based for rates, in b/s).
+    '''
+    text = str(text)
+    if text[-1:] in _suffix:
+        factor = _suffix[text[-1].lower()] if rate else _suffix[text[-1].upper()]
+        return float(text[:-1]) * factor
+
+    return float(text)
+
+
+def csv_date(t):
+    # The date of a report, as Iperf writes it (YYYYMMDDHHMMSS.mmm).
+    return datetime.fromtimestamp(t).strftime('%Y%m%d%H%M%S.%f')[:-3]
+
+
+def csv_line(row):
+    '''
+    A report row as an Iperf "-y C" line: date, local address and port,
+    remote address and port, ID, interval, bytes, rate (b/s), and for UDP
+    also jitter (ms), lost and total datagrams, lost percentage and out of
+    order datagrams.
+    '''
+    fields = [row[0], row[1], str(row[2]), row[3], str(row[4]), str(row[5]),
+              format(row[6], '.2f') + '-' + format(row[7], '.2f'), str(row[8]), str(int(row[9]))]
+    if len(row) > 10:
+        fields += [format(row[10], '.3f'), str(row[11]), str(row[12]), format(row[13], '.3f'), str(row[14])]
+
+    return ','.join(fields)
+
+
+class Stream(object):
+    '''
+    The counters of one received stream. "start" is its start (monotonic),
+    "wall" the same in wall-clock time.
+    '''
+    def __init__(self, sid, local, remote, udp = False):
+        self.id = sid
+        self.local = local
+        self.remote = remote
+        self.udp = udp
+        self.start = monotonic()
+        self.wall = time()
+        self.bytes = 0
+        self.last_seen = self.start
+        # Set (s from the start) when the stream is over.
+        self.ended = None
+        # The end of the last reported interval (s from the start), and the counters then.
+        self.reported = 0.0
+        self.reported_bytes = 0
+        if udp:
+            self.datagrams = 0
+            self.next_seq = 0
+            self.lost = 0
+            self.out_of_order = 0
+            self.jitter = 0.0
+            self.transit = None
+            self.reported_datagrams = 0
+            self.reported_lost = 0
+            self.reported_ooo = 0
+
+    def datagram(self, size, seq, sent, arrived):
+        self.bytes += size
+        self.datagrams += 1
+        self.last_seen = arrived
+        if seq >= self.next_seq:
+            # The datagrams that were skipped are lost (until they show up).
+            self.lost += seq - self.next_seq
+            self.next_seq = seq + 1
+        else:
+            self.out_of_order += 1
+            self.lost = max(self.lost - 1, 0)
+
+        # The jitter of RFC 1889 (as Iperf computes it).
+        transit = time() - sent
+        if self.transit is not None:
+            self.jitter += (abs(transit - self.transit) - self.jitter) / 16.0
+
+        self.transit = transit
+
+    def row(self, start, end, total = False):
+        '''
+        The report of the interval from "start" to "end" (s from the start),
+        with the counters since the last report (or since the start of the
+        stream, for the "total" report).
+        '''
+        nbytes = self.bytes if total else self.bytes - self.reported_bytes
+        length = max(end - start, 1e-9)
+        row = (csv_date(self.wall + end), self.local[0], self.local[1], self.remote[0], self.remote[1], self.id,
+               start, end, nbytes, nbytes * 8 / length)
+        if not self.udp:
+            return row
+
+        received = self.datagrams if total else self.datagrams - self.reported_datagrams
+        lost = self.lost if total else self.lost - self.reported_lost
+        ooo = self.out_of_order if total else self.out_of_order - self.reported_ooo
+        count = received + lost
+        return row + (self.jitter * 1000.0, lost, count, 100.0 * lost / count if count else 0.0, ooo)
+
+    def advance(self, end):
+        self.reported = end
+        self.reported_bytes = self.bytes
+        if self.udp:
+            self.reported_datagrams = self.datagrams
+            self.reported_lost = self.lost
+            self.reported_ooo = self.out_of_order
+
+
+class Receiver(object):
+    '''
+    The server side: receives the streams of the clients on "port", and
+    reports every stream every "interval" seconds (as an Iperf server with
+    "-i"). Every report row goes to "on_row" (by default it is printed as a
+    "-y C" line).
+    '''
+    def __init__(self, port = default_port, interval = 1.0, udp = False, length = None, window = None,
+                 bind = '', on_row = None):
+        self.protocol = 'UDP' if udp else 'TCP'
+        self.interval = interval
+        self.length = int(length or default_len[self.protocol])
+        self.window = window
+        self.on_row = on_row or self.print_row
+        self.streams = []
+        self.next_id = 3
+        self.lock = Lock()
+        self.wake = Event()
+        self.stopped = Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if udp else socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if window:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(window))
+        self.sock.bind((bind, port))
+        self.port = self.sock.getsockname()[1]
+        if not udp:
+            self.sock.listen(128)
+
+    @staticmethod
+    def print_row(row):
+        sys.stdout.write(csv_line(row) + '\n')
+        sys.stdout.flush()
+
+    def _add(self, local, remote):
+        with self.lock:
+            stream = Stream(self.next_id, local, remote, self.protocol == 'UDP')
+            self.next_id += 1
+            self.streams.append(stream)
+
+        return stream
+
+    def _tcp_stream(self, conn, stream):
+        buf = memoryview(bytearray(self.length))
+        try:
+            while True:
+                n = conn.recv_into(buf)
+                if not n:
+                    break
+
+                stream.bytes += n
+        except OSError:
+            pass
+        finally:
+            conn.close()
+            stream.ended = monotonic() - stream.start
+            self.wake.set()
+
+    def _accept(self):
+        while not self.stopped.is_set():
+            try:
+                conn, remote = self.sock.accept()
+            except OSError:
+                break
+
+            if self.window:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(self.window))
+            stream = self._add(conn.getsockname()[:2], remote[:2])
+            Thread(target = self._tcp_stream, args = (conn, stream), daemon = True).start()
+
+    def _udp(self):
+        buf = bytearray(max(self.length, udp_header.size, 65536))
+        view = memoryview(buf)
+        local = self.sock.getsockname()[:2]
+        streams = {}
+        while not self.stopped.is_set():
+            try:
+                n, remote = self.sock.recvfrom_into(view)
+            except OSError:
+                break
+
+            arrived = monotonic()
+            if n < udp_header.size:
+                continue
+
+            seq, sec, usec = udp_header.unpack_from(buf)
+            stream = streams.get(remote)
+            if stream is None or stream.ended is not None:
+                if seq < 0:
+                    # The repeated last datagrams of a stream that is over.
+                    continue
+
+                stream = streams[remote] = self._add(local, remote[:2])
+
+            if seq < 0:
+                stream.ended = arrived - stream.start
+                self.wake.set()
+                continue
+
+            stream.datagram(n, seq, sec + usec / 1e6, arrived)
+
+    def _report(self):
+        interval = self.interval
+        while not self.stopped.is_set():
+            now = monotonic()
+            with self.lock:
+                streams = list(self.streams)
+
+            upcoming = now + interval
+            for stream in streams:
+                if stream.ended is None and stream.udp and now - stream.last_seen > udp_idle_timeout:
+                    stream.ended = stream.last_seen - stream.start
+
+                elapsed = now - stream.start if stream.ended is None else stream.ended
+                while stream.reported + interval <= elapsed + 1e-9:
+                    end = stream.reported + interval
+                    self.on_row(stream.row(stream.reported, end))
+                    stream.advance(end)
+
+                if stream.ended is not None:
+                    # The last (partial) interval, and the whole stream.
+                    if stream.ended > stream.reported + 1e-3:
+                        self.on_row(stream.row(stream.reported, stream.ended))
+                    self.on_row(stream.row(0.0, stream.ended, total = True))
+                    with self.lock:
+                        self.streams.remove(stream)
+                else:
+                    upcoming = min(upcoming, stream.start + stream.reported + interval)
+
+            self.wake.wait(max(min(upcoming - monotonic(), 0.5), 0.0))
+            self.wake.clear()
+
+    def start(self):
+        '''
+        Start receiving, in the background. Returns the receiver.
+        '''
+        target = self._udp if self.protocol == 'UDP' else self._accept
+        Thread(target = target, name = 'receiver', daemon = True).start()
+        self.reporter = Thread(target = self._report, name = 'reporter', daemon = True)
+        self.reporter.start()
+        return self
+
+    def idle(self):
+        with self.lock:
+            return not self.streams
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+        self.reporter.join()
+
+
+class Sender(object):
+    '''
+    The client side: "streams" streams to "host":"port", for "runtime"
+    seconds. The TCP streams write "length" bytes at a time (with sendfile()
+    unless "copy"), the UDP streams send datagrams of "length" bytes at
+    "rate" b/s each. "start_at" is the (wall-clock) time to start sending.
+    '''
+    def __init__(self, host, port = default_port, runtime = 10.0, streams = 1, udp = False, rate = 1048576,
+                 length = None, window = None, start_at = None, copy = False):
+        self.protocol = 'UDP' if udp else 'TCP'
+        self.address = (host, port)
+        self.runtime = runtime
+        self.length = int(length or default_len[self.protocol])
+        self.rate = rate
+        self.window = window
+        self.start_at = start_at
+        self.sendfile = not copy and not udp and hasattr(os, 'sendfile')
+        self.stop = Event()
+        self.socks = [self._connect() for _ in range(streams)]
+        self.sent = [0] * streams
+        self.errors = []
+        self.started = None
+        self.elapsed = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if self.protocol == 'UDP' else socket.SOCK_STREAM)
+        if self.window:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(self.window))
+        sock.connect(self.address)
+        return sock
+
+    def _tcp(self, i, deadline):
+        sock = self.socks[i]
+        sent = 0
+        if self.sendfile:
+            # The buffer as a file, so that the kernel sends it from the page cache.
+            with tempfile.TemporaryFile() as f:
+                f.write(bytes(self.length))
+                f.flush()
+                fd, out = f.fileno(), sock.fileno()
+                while not self.stop.is_set() and monotonic() < deadline:
+                    sent += os.sendfile(out, fd, 0, self.length)
+                    self.sent[i] = sent
+        else:
+            buf = memoryview(bytearray(self.length))
+            while not self.stop.is_set() and monotonic() < deadline:
+                sent += sock.send(buf)
+                self.sent[i] = sent
+
+    def _udp(self, i, deadline):
+        sock = self.socks[i]
+        buf = bytearray(max(self.length, udp_header.size))
+        gap = len(buf) * 8.0 / self.rate
+        seq = 0
+        due = monotonic()
+        while not self.stop.is_set():
+            now = monotonic()
+            if now >= deadline:
+                break
+            if now < due:
+                sleep(due - now)
+                continue
+
+            t = time()
+            udp_header.pack_into(buf, 0, seq, int(t), int((t % 1) * 1e6))
+            try:
+                self.sent[i] += sock.send(buf)
+            except OSError:
+                # E.g. no buffer space for the moment: the datagram is lost.
+                pass
+            seq += 1
+            due += gap
+
+        for _ in range(udp_fin_count):
+            udp_header.pack_into(buf, 0, -max(seq, 1), 0, 0)
+            try:
+                sock.send(buf)
+            except OSError:
+                pass
+            sleep(0.01)
+
+    def _stream(self, i, deadline):
+        try:
+            (self._udp if self.protocol == 'UDP' else self._tcp)(i, deadline)
+        except OSError as err:
+            self.errors.append(err)
+        finally:
+            self.socks[i].close()
+
+    def run(self):
+        '''
+        Send, and wait until all the streams are done. Returns the bytes
+        sent by every stream.
+        '''
+        if self.start_at:
+            sleep(max(self.start_at - time(), 0.0))
+
+        self.started = monotonic()
+        deadline = self.started + self.runtime
+        threads = [Thread(target = self._stream, args = (i, deadline), daemon = True)
+                   for i in range(len(self.socks))]
+        for t in threads:
+            t.start()
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            # Stop sending, and close the streams properly.
+            self.stop.set()
+            for t in threads:
+                t.join()
+
+        self.elapsed = monotonic() - self.started
+        return self.sent
+
+
+def bench(runtime = 5.0, streams = 1, udp = False, rate = 1e9, length = None, interval = 1.0, iperf = 'iperf'):
+    '''
+    Measure the engine on the loopback, in-process (the rows go straight into
+    the result array), and Iperf with the same options (if it is installed).
+    Prints the mean rate, its standard deviation over the intervals, and the
+    CPU time spent per GB received.
+    '''
+    import shutil
+    import subprocess
+    from NM_parsers import process_iperf_csv, read_iperf_csv, report_repetitions
+
+    protocol = 'UDP' if udp else 'TCP'
+    repetitions, mod = report_repetitions(runtime, interval)
+    # One more second, so that the last full interval is reported (as in run_client()).
+    total_time = runtime if mod else runtime + 1
+    results = []
+
+    def row_fields(row):
+        return row[0:1] + row[5:10] + (row[11:13] if udp else ())
+
+    engines = [('native (sendfile)', False), ('native (send)', True)] if not udp else [('native', True)]
+    for name, copy in engines:
+        rows = []
+        receiver = Receiver(0, interval, udp, length, on_row = rows.append, bind = '127.0.0.1').start()
+        cpu = os.times()
+        sender = Sender('127.0.0.1', receiver.port, total_time, streams, udp, rate, length, copy = copy)
+        sender.run()
+        while not receiver.idle():
+            sleep(0.05)
+
+        cpu = os.times()[0] + os.times()[1] - cpu[0] - cpu[1]
+        receiver.stop()
+        raw = [[float(row[0])] + list(row_fields(row)[1:]) for row in rows]
+        results.append((name, raw, cpu))
+
+    if iperf and shutil.which(iperf):
+        with tempfile.NamedTemporaryFile(suffix = '.dat') as out:
+            port = str(default_port + 101)
+            opts = ['-u'] if udp else []
+            server = subprocess.Popen([iperf, '-s', '-y', 'C', '-i', format(interval, 'g'), '-p', port] + opts,
+                                      stdout = out, stderr = subprocess.DEVNULL)
+            sleep(1.0)
+            client_opts = ['-u', '-b', format(rate, 'g')] if udp else []
+            if length:
+                client_opts += ['-l', str(int(length))]
+            before = os.times()
+            subprocess.call([iperf, '-c', '127.0.0.1', '-p', port, '-t', format(total_time, 'g'),
+                             '-P', str(streams)] + client_opts, stdout = subprocess.DEVNULL)
+            sleep(1.0)
+            server.terminate()
+            server.wait()
+            after = os.times()
+            cpu = after[2] + after[3] - before[2] - before[3]
+            results.append(('iperf', read_iperf_csv(out.name, protocol), cpu))
+
+    print('Loopback, ' + protocol + ', ' + str(streams) + ' stream(s), ' + format(runtime, 'g') + ' s:')
+    for name, raw, cpu in results:
+        try:
+            _, mean, stdev, _ = process_iperf_csv(raw, protocol, streams, repetitions, interval)
+        except ValueError as err:
+            print('  ' + format(name, '18s') + ' failed: ' + str(err))
+            continue
+
+        received = mean * repetitions * interval / 8e9
+        print('  ' + format(name, '18s') + format(mean / 1e9, '8.3f') + ' Gb/s  +/-' + format(stdev / 1e9, '.3f') +
+              '  CPU ' + format(cpu / received if received else float('nan'), '.2f') + ' s/GB')
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'The native traffic engine of NetMeter (Iperf options).')
+    mode = parser.add_mutually_exclusive_group(required = True)
+    mode.add_argument('-s', '--server', action = 'store_true', help = 'receive (as "iperf -s")')
+    mode.add_argument('-c', '--client', metavar = 'HOST', help = 'send to HOST')
+    mode.add_argument('--bench', action = 'store_true', help = 'measure the engine (and Iperf) on the loopback')
+    parser.add_argument('-p', '--port', type = int, default = default_port)
+    parser.add_argument('-t', '--time', type = float, default = 10.0, help = 'how long to send (s)')
+    parser.add_argument('-P', '--parallel', type = int, default = 1, help = 'the number of streams')
+    parser.add_argument('-i', '--interval', type = float, default = 1.0, help = 'the report interval (s)')
+    parser.add_argument('-u', '--udp', action = 'store_true')
+    parser.add_argument('-b', '--bandwidth', default = '1M', help = 'the rate of every UDP stream (b/s)')
+    parser.add_argument('-w', '--window', help = 'the socket buffer size')
+    parser.add_argument('-l', '--len', help = 'the buffer or datagram length')
+    parser.add_argument('-y', '--reportstyle', help = 'ignored: the reports are always "C" (CSV)')
+    parser.add_argument('-B', '--bind', default = '', help = 'the address to receive on')
+    parser.add_argument('--txstart-time', type = float, help = 'when to start sending (s since the epoch)')
+    parser.add_argument('--copy', action = 'store_true', help = 'send with send() instead of sendfile()')
+    parser.add_argument('--iperf', default = 'iperf', help = 'the Iperf to compare with (--bench)')
+    args = parser.parse_args(args)
+    window = args.window and parse_amount(args.window)
+    length = args.len and parse_amount(args.len)
+    rate = parse_amount(args.bandwidth, rate = True)
+    if args.bench:
+        bench(args.time, args.parallel, args.udp, rate if args.udp else 1e9, length, args.interval, args.iperf)
+        return
+
+    if args.server:
+        try:
+            receiver = Receiver(args.port, args.interval, args.udp, length, window, args.bind).start()
+        except OSError as err:
+            sys.stderr.write('bind failed: ' + str(err) + '\n')
+            sys.exit(1)
+
+        sys.stderr.write('Server listening on ' + receiver.protocol + ' port ' + str(receiver.port) + '\n')
+        sys.stderr.flush()
+        try:
+            while True:
+                sleep(3600)
+        except KeyboardInterrupt:
+            receiver.stop()
+        return
+
+    try:
+        sender = Sender(args.client, args.port, args.time, args.parallel, args.udp, rate, length, window,
+                        args.txstart_time, args.copy)
+    except OSError as err:
+        sys.stderr.write('connect failed: ' + str(err) + '\n')
+        sys.exit(1)
+
+    sent = sender.run()
+    for i, nbytes in enumerate(sent):
+        sys.stdout.write(','.join([csv_date(time()), args.client, str(args.port), str(i + 3),
+                                   '0.00-' + format(sender.elapsed, '.2f'), str(nbytes),
+                                   str(int(nbytes * 8 / max(sender.elapsed, 1e-9)))]) + '\n')
+    if sender.errors:
+        sys.stderr.write('write failed: ' + str(sender.errors[0]) + '\n')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
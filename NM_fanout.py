@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Fan-out of simultaneous tests over any number of client pairs.
+
+The pairs are read from the "client_pairs" configuration parameter, every pair
+gets its own Iperf port, and the pairs run on a bounded pool of worker threads.
+The pairs that run together share a two-phase start (StartSync): all the
+servers are prepared first, then all the clients are released at a common
+wall-clock instant, each dispatched ahead of it by its own dispatch latency.
+The actual start of every client is recorded, the start skew of every pair is
+reported, and the intervals outside the common run of all the clients can be
+trimmed before aggregating.
+'''
+
+import sys
+from time import time
+from threading import Barrier, BrokenBarrierError, Lock, Event
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Upper bound (s) for waiting on the other pairs at a start barrier.
+barrier_timeout = 600.0
+# The common start is this long (s) after the slowest client can be dispatched.
+start_margin = 0.2
+
+# Set when the run is interrupted, so the workers stop at their next barrier.
+stopping = Event()
+
+
+class Client(object):
+    '''
+    The parameters of client number "num" (the N in the clN_* configuration
+    parameters).
+    '''
+    fields = ['conn_ip', 'test_ip', 'iperf', 'pretty_name']
+    access_fields = ['access_method', 'ssh_port', 'creds']
+
+    def __init__(self, config, num):
+        self.num = num
+        self.name = 'cl' + str(num)
+        try:
+            for f in self.fields:
+                setattr(self, f, config[self.name + '_' + f])
+
+            for f in self.access_fields:
+                setattr(self, f, config[f + '_' + self.name])
+
+        except KeyError as err:
+            print('\033[91mERROR:\033[0m The parameter ' + err.args[0] +
+                  ' is needed for client ' + str(num) + ', but it is not configured.')
+            sys.exit(1)
+
+
+class Pair(object):
+    def __init__(self, index, name, cl_a, cl_b, port):
+        self.index = index
+        self.name = name
+        self.cl_a = cl_a
+        self.cl_b = cl_b
+        self.port = port
+
+
+def get_client_pairs(config, client_pairs, base_port = 5001):
+    '''
+    Build the list of Pair objects from "client_pairs" ((name, N, M) tuples).
+    "config" is the dictionary of the configuration parameters (e.g. globals()).
+    Every pair gets its own port, starting from "base_port".
+    '''
+    clients = {}
+    pairs = []
+    for i, (name, a, b) in enumerate(client_pairs):
+        for n in (a, b):
+            if n not in clients:
+                clients[n] = Client(config, n)
+
+        pairs.append(Pair(i, name, clients[a], clients[b], base_port + i))
+
+    return pairs
+
+
+class StartSync(object):
+    '''
+    The two-phase start shared by the pairs that run at the same time. Every
+    pair prepares its server, then calls the object with the time it needs to
+    dispatch its client ("lead"). Once all the pairs are ready, the common
+    start (wall-clock) instant is set, far enough ahead for the slowest
+    dispatch, and returned to all of them. When its test is over, every pair
+    reports the actual start and end of its client with ended(), which
+    returns the window in which all the clients ran.
+    If one of the pairs fails, the barriers break and the rest go on
+    unsynchronized (None is returned).
+    '''
+    def __init__(self, parties, timeout = barrier_timeout):
+        self.barrier = Barrier(parties, action = self._release)
+        self.end_barrier = Barrier(parties, action = self._overlap)
+        self.timeout = timeout
+        self.lock = Lock()
+        self.leads = []
+        self.start_at = None
+        self.spans = {}
+        self.window = None
+        # Every round: the common start, and the (start, end) of every pair.
+        self.rounds = []
+
+    def _wait(self, barrier):
+        try:
+            barrier.wait(self.timeout)
+            return True
+        except BrokenBarrierError:
+            if stopping.is_set():
+                sys.exit(1)
+
+            return False
+
+    def __call__(self, lead = 0.0):
+        with self.lock:
+            self.leads.append(lead)
+
+        return self.start_at if self._wait(self.barrier) else None
+
+    def _release(self):
+        # Runs once per round, when all the pairs are ready.
+        self.start_at = time() + max(self.leads) + start_margin
+        self.leads = []
+
+    def ended(self, name, start, end):
+        '''
+        Report the start and end (wall-clock) of the client of the pair "name"
+        (None if it did not run), and wait for the other pairs. Returns the
+        (start, end) window in which all the clients that ran were running.
+        '''
+        with self.lock:
+            if start is not None:
+                self.spans[name] = (start, end)
+
+        return self.window if self._wait(self.end_barrier) else None
+
+    def _overlap(self):
+        spans, self.spans = self.spans, {}
+        self.rounds.append((self.start_at, spans))
+        if spans:
+            self.window = (max(s for s, _ in spans.values()), min(e for _, e in spans.values()))
+        else:
+            self.window = None
+
+    def abort(self):
+        self.barrier.abort()
+        self.end_barrier.abort()
+
+    def pair_skews(self):
+        '''
+        The start skews (s, the actual starts after the common start) of
+        every pair, over all the rounds.
+        '''
+        skews = {}
+        for start_at, spans in self.rounds:
+            for name, (start, _) in spans.items():
+                skews.setdefault(name, []).append(start - start_at)
+
+        return skews
+
+    def max_skew(self):
+        '''
+        The largest spread (s) of the actual starts of the clients over all
+        the rounds, or None if no round completed with more than one client.
+        '''
+        skews = [max(s for s, _ in spans.values()) - min(s for s, _ in spans.values())
+                 for _, spans in self.rounds if len(spans) > 1]
+        return max(skews) if skews else None
+
+
+def skew_summary(skews):
+    '''
+    The mean and the largest start skew (s) of a pair, as text.
+    '''
+    return ('mean ' + format(sum(skews) / len(skews) * 1000.0, '.1f') + ' ms, max ' +
+            format(max(skews, key = abs) * 1000.0, '.1f') + ' ms (' + str(len(skews)) + ' tests)')
+
+
+def run_pairs(pairs, worker, max_workers = None):
+    '''
+    Run worker(pair, sync) for all the pairs, at most "max_workers" at a time.
+    The pairs are processed in waves of "max_workers"; each wave shares a StartSync
+    that the worker calls right before it starts transmitting.
+    '''
+    if not max_workers:
+        max_workers = len(pairs)
+
+    waves = [pairs[i:i + max_workers] for i in range(0, len(pairs), max_workers)]
+    failed = []
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        for wave in waves:
+            sync = StartSync(len(wave))
+
+            def run_one(pair, sync = sync):
+                try:
+                    worker(pair, sync)
+                except BaseException:
+                    # Do not leave the rest of the wave waiting for this pair.
+                    sync.abort()
+                    raise
+
+            futures = [(pair, pool.submit(run_one, pair)) for pair in wave]
+            try:
+                wait([f for _, f in futures])
+            except (KeyboardInterrupt, SystemExit):
+                # Interrupted in the main thread.
+                stopping.set()
+                sync.abort()
+                raise
+
+            for pair, future in futures:
+                err = future.exception()
+                if err is not None:
+                    print('\033[91mERROR:\033[0m The tests of ' + pair.name +
+                          ' failed (' + repr(err) + ').')
+                    failed.append(pair)
+
+            skew = sync.max_skew()
+            if skew is not None:
+                print('Maximal start skew between ' + ', '.join(p.name for p in wave) +
+                      ': ' + format(skew * 1000.0, '.1f') + ' ms')
+                for name, skews in sorted(sync.pair_skews().items()):
+                    print('  ' + name + ': ' + skew_summary(skews))
+
+    return failed
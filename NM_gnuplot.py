@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Rendering of gnuplot scripts through persistent gnuplot processes.
+
+Starting gnuplot (and initializing the cairo fonts) for every plot costs more
+than drawing the plot itself. Here a few gnuplot processes are started once,
+and the scripts are fed to them over stdin with "load". After every script, a
+marker is printed to gnuplot's stderr; everything that gnuplot wrote there
+before the marker belongs to that script, so the errors of every plot are still
+detected separately. The scripts and their outputs are the same as before.
+
+Usage (re-render all the plots under the given directories):
+    python3 NM_gnuplot.py [--gnuplot BIN] [--workers N] DIR_OR_SCRIPT...
+'''
+
+import re
+import sys
+import atexit
+import argparse
+from os import walk, cpu_count
+from os.path import abspath, dirname, basename, join, isdir
+from queue import Queue
+from threading import Lock
+from subprocess import Popen, PIPE, DEVNULL
+from concurrent.futures import ThreadPoolExecutor
+
+done_marker = 'NM_GNUPLOT_DONE'
+_message = re.compile(r'line \d+: *(.*)')
+
+
+def _quote(s):
+    # Single-quoted gnuplot string ('' is a literal quote).
+    return "'" + s.replace("'", "''") + "'"
+
+
+class GnuplotError(Exception):
+    pass
+
+
+class Gnuplot(object):
+    '''
+    One persistent gnuplot process. Without file arguments, gnuplot reads its
+    commands from stdin and does not exit on errors.
+    '''
+    def __init__(self, gnuplot_bin = 'gnuplot'):
+        self.gnuplot_bin = gnuplot_bin
+        self.proc = None
+        self.reset_cmd = 'reset'
+
+    def start(self):
+        self.proc = Popen([self.gnuplot_bin], stdin = PIPE, stdout = DEVNULL, stderr = PIPE,
+                          universal_newlines = True, bufsize = 1)
+        # "reset session" (gnuplot 5.2+) also clears the user variables and functions.
+        version = self.command('print GPVAL_VERSION')
+        try:
+            if float(version[-1]) >= 5.2:
+                self.reset_cmd = 'reset session'
+        except (IndexError, ValueError):
+            pass
+
+    def command(self, text):
+        '''
+        Send commands, and return the lines that gnuplot printed to stderr
+        until they were all done.
+        '''
+        if self.proc is None or self.proc.poll() is not None:
+            raise GnuplotError('gnuplot is not running')
+
+        try:
+            self.proc.stdin.write(text + '\nprint "' + done_marker + '"\n')
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise GnuplotError('gnuplot exited')
+
+        lines = []
+        while True:
+            line = self.proc.stderr.readline()
+            if not line:
+                raise GnuplotError('gnuplot exited' + (': ' + ''.join(lines).strip() if lines else ''))
+
+            if line.strip() == done_marker:
+                return [l.rstrip('\n') for l in lines if l.strip()]
+
+            lines.append(line)
+
+    def render(self, script, cwd = None):
+        '''
+        Run one script (in directory "cwd", by default the current one), as
+        "gnuplot script" would. Returns the error output of gnuplot (empty if
+        there were no errors and warnings).
+        '''
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+
+        cwd = abspath(cwd or '.')
+        # Close the output file after the script (a failed multiplot may leave it open).
+        return self.command(self.reset_cmd + '\n'
+                            'cd ' + _quote(cwd) + '\n'
+                            'load ' + _quote(script) + '\n'
+                            'unset multiplot\n'
+                            'set output')
+
+    def close(self):
+        if self.proc and self.proc.poll() is None:
+            try:
+                self.proc.stdin.write('exit\n')
+                self.proc.stdin.close()
+                self.proc.wait(timeout = 10)
+            except Exception:
+                self.proc.kill()
+
+        self.proc = None
+
+
+def is_error(messages):
+    '''
+    True if the gnuplot messages contain an error (and not only warnings).
+    Every message of gnuplot ends with a '... line N: <text>' line; the lines
+    before it echo the failed command.
+    '''
+    for m in messages:
+        found = _message.search(m)
+        if found and not found.group(1).lower().startswith('warning'):
+            return True
+
+        if m.startswith('gnuplot exited') or m.startswith('gnuplot is not running'):
+            return True
+
+    return False
+
+
+class GnuplotPool(object):
+    '''
+    A pool of persistent gnuplot processes, that can be used by several
+    threads at a time. The processes are started when first needed.
+    '''
+    def __init__(self, gnuplot_bin = 'gnuplot', size = 1):
+        self.idle = Queue()
+        self.all = []
+        self.lock = Lock()
+        for _ in range(max(size, 1)):
+            g = Gnuplot(gnuplot_bin)
+            self.all.append(g)
+            self.idle.put(g)
+
+        atexit.register(self.close)
+
+    def render(self, script, cwd = None):
+        '''
+        Render one script. Returns True on success; the gnuplot errors are printed.
+        '''
+        g = self.idle.get()
+        try:
+            messages = g.render(script, cwd)
+        except (GnuplotError, OSError) as err:
+            g.close()
+            messages = ['gnuplot exited (' + str(err) + ')' if isinstance(err, OSError) else str(err)]
+        finally:
+            self.idle.put(g)
+
+        for m in messages:
+            print(m, file = sys.stderr)
+
+        if is_error(messages):
+            print('\033[91mERROR:\033[0m gnuplot failed on ' + join(cwd or '', script) + '.', file = sys.stderr)
+            return False
+
+        return True
+
+    def close(self):
+        with self.lock:
+            for g in self.all:
+                g.close()
+
+
+def find_scripts(paths):
+    scripts = []
+    for p in paths:
+        if isdir(p):
+            for d, _, files in walk(p):
+                scripts += [join(d, f) for f in sorted(files) if f.endswith('.plt')]
+        else:
+            scripts.append(p)
+
+    return scripts
+
+
+def render_all(scripts, gnuplot_bin = 'gnuplot', workers = None):
+    '''
+    Render the scripts, every one in its own directory, on "workers" gnuplot
+    processes. Returns the scripts that failed.
+    '''
+    workers = workers or cpu_count() or 1
+    pool = GnuplotPool(gnuplot_bin, min(workers, max(len(scripts), 1)))
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        results = list(executor.map(lambda s: pool.render(basename(s), dirname(abspath(s))), scripts))
+
+    pool.close()
+    return [s for s, ok in zip(scripts, results) if not ok]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Render gnuplot scripts through persistent gnuplot processes.')
+    parser.add_argument('paths', nargs = '+', help = 'directories (searched for .plt files) or scripts')
+    parser.add_argument('--gnuplot', default = 'gnuplot', help = 'the gnuplot binary')
+    parser.add_argument('--workers', type = int, default = None, help = 'gnuplot processes (default: one per core)')
+    args = parser.parse_args()
+    scripts = find_scripts(args.paths)
+    print('Rendering ' + str(len(scripts)) + ' scripts...')
+    failed = render_all(scripts, args.gnuplot, args.workers)
+    if failed:
+        print('\033[91mERROR:\033[0m ' + str(len(failed)) + ' scripts failed:')
+        for s in failed:
+            print('    ' + s)
+        sys.exit(1)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Catalog of the NetMeter results.
+
+The result trees (export directories) are walked once, and every summary file
+found is recorded in an SQLite database: the campaign (the directory under the
+root), the client pair, the date, protocol, streams, direction, and the rows of
+the summary (size, mean, stdev and test status). Later updates only read the
+summaries that are new or changed, and drop the ones that were deleted. The
+queries, the comparisons and the reports then work from the catalog alone.
+
+Usage:
+    python3 NM_index.py update [--db FILE] ROOT...
+    python3 NM_index.py query [--db FILE] [--pair PAIR] [--protocol TCP|UDP]
+                              [--streams N] [--direction one2two|two2one]
+                              [--size BYTES] [--campaign NAME] [--month YYYY-MM]
+                              [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+    python3 NM_index.py runs [--db FILE] [same filters]
+
+Example (all UDP one2two runs of pc0TOpc2 in November 2020):
+    python3 NM_index.py query --pair pc0TOpc2 --protocol UDP --direction one2two --month 2020-11
+'''
+
+import re
+import sys
+import sqlite3
+import argparse
+from os import walk, listdir
+from os.path import join, isfile, getmtime, abspath, dirname, basename, relpath
+
+from NM_store import load_table
+
+default_db = 'NetMeter_index.sqlite'
+
+# <timestamp>_<protocol>_<streams>_st, as in the names of the run directories.
+_run_dir = re.compile(r'(\d{4})_(\d\d)_(\d\d)_(\d\d)-(\d\d)-(\d\d)_(TCP|UDP)_(\d+)_st')
+_summary_file = re.compile(r'(one2two|two2one)_(iperf_summary|mpstat_summary)\.dat$')
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    dir TEXT,
+    campaign TEXT,
+    pair TEXT,
+    date TEXT,
+    protocol TEXT,
+    streams INTEGER,
+    direction TEXT,
+    kind TEXT,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS points (
+    run_id INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    size INTEGER,
+    status INTEGER,
+    mean REAL,
+    stdev REAL
+);
+CREATE INDEX IF NOT EXISTS runs_dir ON runs(dir);
+CREATE INDEX IF NOT EXISTS runs_select ON runs(pair, protocol, direction, date);
+CREATE INDEX IF NOT EXISTS points_run ON points(run_id);
+'''
+
+
+def connect(db = default_db):
+    conn = sqlite3.connect(db)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(_schema)
+    return conn
+
+
+def describe(path, root):
+    '''
+    The catalog fields of a summary file, from its path. Returns None if the
+    file name does not follow the NetMeter naming.
+    '''
+    f = _summary_file.search(basename(path))
+    run_dir = dirname(path)
+    if basename(run_dir) == 'raw-data':
+        run_dir = dirname(run_dir)
+
+    r = _run_dir.search(basename(run_dir))
+    if not f or not r:
+        return None
+
+    # The pair name is what is left of the directory name around the run part
+    # (e.g. "pc0TOpc3_<run>" or "<run>_LAPTOP-UE-0_2_LAPTOP-UE-2").
+    name = basename(run_dir)
+    pair = (name[:r.start()] + name[r.end():]).strip('_ ')
+    campaign = relpath(dirname(run_dir), root)
+    if campaign == '.':
+        campaign = basename(abspath(root))
+
+    return {
+            'dir': abspath(dirname(path)),
+            'campaign': campaign,
+            'pair': pair,
+            'date': '{}-{}-{} {}:{}:{}'.format(*r.groups()[:6]),
+            'protocol': r.group(7),
+            'streams': int(r.group(8)),
+            'direction': f.group(1),
+            'kind': f.group(2)
+           }
+
+
+def summary_rows(path, kind):
+    '''
+    (size, status, mean, stdev) for every row of a summary file.
+    '''
+    data = load_table(path)
+    if kind == 'iperf_summary':
+        return [(int(r[1]), int(r[0]), float(r[2]), float(r[3])) for r in data]
+    else:
+        return [(int(r[0]), None, float(r[1]), float(r[2])) for r in data]
+
+
+def update(conn, roots):
+    '''
+    Bring the catalog up to date with the result trees under "roots".
+    Returns the numbers of added/changed and removed summaries.
+    '''
+    changed = 0
+    seen = set()
+    known = dict(conn.execute('SELECT path, mtime FROM runs'))
+    for root in roots:
+        for d, _, files in walk(root):
+            for name in files:
+                if not _summary_file.search(name):
+                    continue
+
+                path = abspath(join(d, name))
+                seen.add(path)
+                mtime = getmtime(path)
+                if known.get(path) == mtime:
+                    continue
+
+                fields = describe(path, root)
+                if fields is None:
+                    continue
+
+                try:
+                    rows = summary_rows(path, fields['kind'])
+                except (ValueError, IndexError) as err:
+                    print('\033[93mWARNING:\033[0m Could not read ' + path + ' (' + str(err) + ').')
+                    continue
+
+                conn.execute('DELETE FROM runs WHERE path = ?', (path,))
+                cur = conn.execute('INSERT INTO runs (path, dir, campaign, pair, date, protocol, '
+                                   'streams, direction, kind, mtime) VALUES (?,?,?,?,?,?,?,?,?,?)',
+                                   (path, fields['dir'], fields['campaign'], fields['pair'],
+                                    fields['date'], fields['protocol'], fields['streams'],
+                                    fields['direction'], fields['kind'], mtime))
+                conn.executemany('INSERT INTO points VALUES (?,?,?,?,?)',
+                                 [(cur.lastrowid,) + r for r in rows])
+                changed += 1
+
+    roots = [abspath(r) for r in roots]
+    removed = [p for p in known if p not in seen and any(p.startswith(r) for r in roots) and not isfile(p)]
+    conn.executemany('DELETE FROM runs WHERE path = ?', [(p,) for p in removed])
+    conn.commit()
+    return changed, len(removed)
+
+
+def catalog(roots, db = default_db):
+    '''
+    Open the catalog "db", update it with "roots", and close it.
+    '''
+    conn = connect(db)
+    try:
+        return update(conn, roots)
+    finally:
+        conn.close()
+
+
+def _where(filters):
+    clauses = []
+    args = []
+    for key in ('pair', 'protocol', 'streams', 'direction', 'campaign', 'kind'):
+        if filters.get(key) is not None:
+            clauses.append('runs.' + key + ' = ?')
+            args.append(filters[key])
+
+    if filters.get('month'):
+        clauses.append('substr(runs.date, 1, 7) = ?')
+        args.append(filters['month'])
+
+    if filters.get('since'):
+        clauses.append('runs.date >= ?')
+        args.append(filters['since'])
+
+    if filters.get('until'):
+        clauses.append('runs.date < ?')
+        args.append(filters['until'])
+
+    if filters.get('dir'):
+        clauses.append('runs.dir = ?')
+        args.append(abspath(filters['dir']))
+
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', args
+
+
+def runs(conn, **filters):
+    '''
+    The catalogued summary files that match the filters (pair, protocol,
+    streams, direction, campaign, kind, month 'YYYY-MM', since/until dates,
+    dir), as a list of dictionaries.
+    '''
+    where, args = _where(filters)
+    cur = conn.execute('SELECT * FROM runs' + where + ' ORDER BY runs.date, runs.path', args)
+    names = [c[0] for c in cur.description]
+    return [dict(zip(names, row)) for row in cur]
+
+
+def query(conn, size = None, **filters):
+    '''
+    The summary rows (one per packet size) of the runs that match the filters.
+    By default, only the Iperf summaries are searched.
+    '''
+    filters.setdefault('kind', 'iperf_summary')
+    where, args = _where(filters)
+    if size is not None:
+        where += (' AND' if where else ' WHERE') + ' points.size = ?'
+        args.append(size)
+
+    cur = conn.execute('SELECT runs.campaign, runs.pair, runs.date, runs.protocol, runs.streams, '
+                       'runs.direction, points.size, points.mean, points.stdev, points.status, runs.path '
+                       'FROM points JOIN runs ON points.run_id = runs.id' + where +
+                       ' ORDER BY runs.date, runs.path, points.size', args)
+    names = [c[0] for c in cur.description]
+    return [dict(zip(names, row)) for row in cur]
+
+
+def find_db(d, name = default_db, levels = 4):
+    '''
+    Look for a catalog in "d" and in up to "levels" of its parent directories.
+    '''
+    d = abspath(d)
+    for _ in range(levels + 1):
+        if isfile(join(d, name)):
+            return join(d, name)
+
+        d = dirname(d)
+
+    return None
+
+
+def indexed_files(d, db = None):
+    '''
+    The names of the summary files in directory "d" according to the catalog,
+    or None if "d" is not catalogued, or if the catalog is out of date for it
+    (summaries that were deleted, or that are not catalogued yet): the
+    catalog is only trusted as long as it agrees with the directory.
+    '''
+    db = db or find_db(d)
+    if not db:
+        return None
+
+    conn = connect(db)
+    found = [basename(r['path']) for r in runs(conn, dir = d)]
+    conn.close()
+    on_disk = set(name for name in listdir(d) if _summary_file.search(name) and isfile(join(d, name)))
+    if not found or set(found) != on_disk:
+        return None
+
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Catalog of the NetMeter results.')
+    parser.add_argument('command', choices = ['update', 'query', 'runs'])
+    parser.add_argument('roots', nargs = '*', help = 'result trees to catalog (for "update")')
+    parser.add_argument('--db', default = default_db)
+    for key in ('pair', 'protocol', 'direction', 'campaign', 'month', 'since', 'until'):
+        parser.add_argument('--' + key)
+
+    parser.add_argument('--streams', type = int)
+    parser.add_argument('--size', type = int)
+    args = parser.parse_intermixed_args()
+    conn = connect(args.db)
+    if args.command == 'update':
+        if not args.roots:
+            print('\033[91mERROR:\033[0m At least one result tree is needed.')
+            sys.exit(1)
+
+        changed, removed = update(conn, args.roots)
+        conn.close()
+        print('Catalogued ' + str(changed) + ' new or changed summaries, removed ' + str(removed) + '.')
+        return
+
+    filters = {k: getattr(args, k) for k in ('pair', 'protocol', 'streams', 'direction',
+                                              'campaign', 'month', 'since', 'until')}
+    if args.command == 'runs':
+        for r in runs(conn, **filters):
+            print(r['date'] + '  ' + r['kind'] + '  ' + r['path'])
+
+        return
+
+    print('# Campaign Pair Date Protocol Streams Direction Size(B) Mean Stdev TestOK')
+    for r in query(conn, size = args.size, **filters):
+        print(' '.join(str(r[k] or '-') for k in ('campaign', 'pair')) + ' ' + r['date'].replace(' ', '_') + ' ' +
+              ' '.join(str(r[k]) for k in ('protocol', 'streams', 'direction', 'size')) + ' ' +
+              format(r['mean'], 'g') + ' ' + format(r['stdev'], 'g') + ' ' + str(r['status']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+The journal of a test campaign, for resuming it after an interruption.
+
+Every test (point) that finishes is recorded with its (pair, protocol,
+streams, direction, size) key, and the journal file is replaced atomically
+after every point, so an interruption (Ctrl+C, a dropped SSH connection, a
+client reboot) never leaves it half written. "NetMeter.py --resume" reads it
+back, re-attaches to the result directories of the campaign, skips the
+points that are done, and processes them again from their output files, so
+the summaries and the html reports are still complete.
+'''
+
+import json
+from os import replace, fsync
+from threading import Lock
+
+
+def point_key(pair_name, protocol, streams, direction, size):
+    return (pair_name or '', protocol, int(streams), direction, int(size))
+
+
+class Journal(object):
+    '''
+    The finished points of the campaign "campaign" (a dictionary of its
+    parameters: the run date, the measurement kind, etc.), kept in the file
+    "path". It can be shared by the threads of the simultaneous pairs.
+    '''
+    def __init__(self, path, campaign = None):
+        self.path = path
+        self.campaign = campaign or {}
+        self.points = {}
+        self.lock = Lock()
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read an existing journal. Raises OSError if there is none, and
+        ValueError if it can not be read.
+        '''
+        with open(path) as f:
+            data = json.load(f)
+
+        journal = cls(path, data['campaign'])
+        for p in data['points']:
+            journal.points[point_key(*p['key'])] = p['result']
+
+        return journal
+
+    def __len__(self):
+        return len(self.points)
+
+    def done(self, key):
+        '''
+        What was recorded for the point "key", or None if it is not done.
+        '''
+        with self.lock:
+            return self.points.get(key)
+
+    def record(self, key, **result):
+        with self.lock:
+            self.points[key] = result
+            self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        data = {'campaign': self.campaign,
+                'points': [{'key': list(k), 'result': r} for k, r in self.points.items()]}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            fsync(f.fileno())
+
+        replace(tmp, self.path)
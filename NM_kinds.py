@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Measurement kinds and topologies of the NetMeter engine.
+
+A measurement kind says what is measured between the two clients of a pair:
+the server and client commands, the parser of the server output, and the
+quantity, units and labels of the results. A topology says which client
+pairs are tested, and how: a single pair, several pairs one after another, or
+several pairs at the same time.
+
+NetMeter.py runs any combination of them, so the scheduling, parsing, live
+ingestion, post-processing and plotting are shared by all of them. More can
+be added with register_kind() and register_topology().
+'''
+
+import sys
+
+from NM_fanout import get_client_pairs, run_pairs
+from NM_parsers import get_iperf_data_single, get_latency_data_single, get_ping_data_single
+
+kinds = {}
+topologies = {}
+
+
+def register_kind(name):
+    def add(cls):
+        cls.name = name
+        kinds[name] = cls
+        return cls
+
+    return add
+
+
+def register_topology(name):
+    def add(cls):
+        cls.name = name
+        topologies[name] = cls
+        return cls
+
+    return add
+
+
+def _lookup(table, what, name):
+    if name not in table:
+        raise ValueError('Unknown ' + what + ': ' + str(name) + ' (use one of: ' +
+                         ', '.join(sorted(table)) + ')')
+
+    return table[name]()
+
+
+def get_kind(name):
+    return _lookup(kinds, 'measurement kind', name)
+
+
+def get_topology(name):
+    return _lookup(topologies, 'topology', name)
+
+
+def set_protocol_opts(protocol, tcpwin, client = True, udp_rate = '100M'):
+    if protocol == 'TCP' and tcpwin:
+        return ['-w', str(tcpwin)]
+    elif protocol == 'TCP':
+        return []
+    elif protocol == 'UDP':
+        if client:
+            return ['-u', '-b', udp_rate]
+        else:
+            return ['-u']
+
+    else:
+        print('Protocol must be either "TCP" or "UDP". Exiting.')
+        sys.exit(1)
+
+
+class Kind(object):
+    '''
+    A measurement kind. The defaults are those of the Iperf throughput tests.
+    '''
+    name = None
+    # The quantity (y axis label), its short name (legends and summary
+    # headers), and what the single size plots show as the average.
+    quantity = 'Bandwidth'
+    short = 'BW'
+    average = 'Av. rate'
+    # Fixed units of the results, or None for rates (in b/s, scaled to kb/s,
+    # Mb/s... in the plots).
+    units = None
+    # The column header of the processed per-interval data, and those of the
+    # columns after its standard deviation, if any.
+    column = 'Sum'
+    extra_columns = ''
+    # The server listens on a port (and prints the Iperf banner when ready).
+    listens = True
+    # A text the server prints when it is ready (None: the Iperf banner).
+    banner = None
+    # The format of the server output for NM_live: 'csv', 'latency' or None
+    # (no live ingestion).
+    live = 'csv'
+    # The target rate of the UDP clients.
+    udp_rate = '100M'
+    # The client can be told when to start transmitting (Iperf 2.0.14+: --txstart-time).
+    txstart = True
+    # The results are the payload rates of the test, which the interface
+    # counters of the clients can check (see NM_niccheck.py).
+    wire_rate = True
+    # The native engine (NM_engine.py) can run the tests instead of Iperf.
+    native_engine = True
+
+    def server_args(self, protocol, tcpwin, interval, port = None, peer_addr = None):
+        args = ['-s', '-i', format(interval, 'g'), '-y', 'C']
+        if port:
+            args += ['-p', str(port)]
+
+        return args + set_protocol_opts(protocol, tcpwin, client = False)
+
+    def client_args(self, server_addr, runtime, size, streams, protocol, tcpwin, interval, port = None,
+                    start_at = None):
+        args = ['-c', server_addr, '-t', str(runtime), '-P', str(streams)]
+        if port:
+            args += ['-p', str(port)]
+        if start_at:
+            args += ['--txstart-time', format(start_at, '.6f')]
+
+        return args + set_protocol_opts(protocol, tcpwin, udp_rate = self.udp_rate)
+
+    def parse(self, path, protocol, streams, repetitions, interval, quiet = True):
+        return get_iperf_data_single(path, protocol, streams, repetitions, interval)
+
+    def base_units(self):
+        return self.units or 'b/s'
+
+
+@register_kind('throughput')
+class Throughput(Kind):
+    '''
+    The rates that reach the Iperf server ("-y C" output), summed over the streams.
+    '''
+
+@register_kind('latency')
+class Latency(Kind):
+    '''
+    The latencies reported by the enhanced ("-e") output of an Iperf 2 UDP
+    server, at a low rate so that the latency is not that of a full link.
+    '''
+    quantity = 'Latency'
+    short = 'Latency'
+    average = 'Av. latency'
+    units = 'ms'
+    column = 'Latency-avg(ms)'
+    live = 'latency'
+    udp_rate = '1M'
+    wire_rate = False
+    native_engine = False
+
+    def server_args(self, protocol, tcpwin, interval, port = None, peer_addr = None):
+        args = ['-s', '-i', format(interval, 'g'), '-e']
+        if port:
+            args += ['-p', str(port)]
+
+        return args + set_protocol_opts(protocol, tcpwin, client = False)
+
+    def parse(self, path, protocol, streams, repetitions, interval, quiet = True):
+        return get_latency_data_single(path, protocol, streams, repetitions, interval, quiet = quiet)
+
+
+@register_kind('ping')
+class Ping(Kind):
+    '''
+    ICMP round trip times: both clients ping each other at the report
+    interval, and the "server" side output is the one that is evaluated.
+    The "iperf" binaries of the clients are the ping binaries.
+    '''
+    quantity = 'Round trip time'
+    short = 'RTT'
+    average = 'Av. RTT'
+    units = 'ms'
+    column = 'RTT(ms)'
+    extra_columns = 'Jitter(ms)'
+    listens = False
+    banner = 'PING'
+    live = None
+    txstart = False
+    wire_rate = False
+    native_engine = False
+
+    def server_args(self, protocol, tcpwin, interval, port = None, peer_addr = None):
+        return ['-i', format(interval, 'g'), peer_addr]
+
+    def client_args(self, server_addr, runtime, size, streams, protocol, tcpwin, interval, port = None,
+                    start_at = None):
+        return ['-i', format(interval, 'g'), '-w', str(runtime), server_addr]
+
+    def parse(self, path, protocol, streams, repetitions, interval, quiet = True):
+        return get_ping_data_single(path, protocol, streams, repetitions, interval, quiet = quiet)
+
+
+class Topology(object):
+    '''
+    A topology. pairs() builds the fanout Pair objects of the configuration,
+    and run() calls worker(pair, sync) for all of them, where "sync" is the
+    two-phase start (NM_fanout.StartSync) shared by the pairs that run at the
+    same time (or None).
+    Returns the pairs that failed.
+    '''
+    name = None
+    simultaneous = False
+
+    def pairs(self, config):
+        return get_client_pairs(config, config.get('client_pairs') or [('', 1, 2)],
+                                config.get('base_iperf_port', 5001))
+
+    def run(self, pairs, worker, max_parallel = None):
+        failed = []
+        for pair in pairs:
+            try:
+                worker(pair, None)
+            except (ValueError, OSError) as err:
+                print('\033[91mERROR:\033[0m The tests of ' + (pair.name or 'the clients') +
+                      ' failed (' + repr(err) + ').')
+                failed.append(pair)
+
+        return failed
+
+
+@register_topology('pair')
+class SinglePair(Topology):
+    '''
+    The classic NetMeter test: clients 1 and 2, in both directions.
+    '''
+
+    def pairs(self, config):
+        return get_client_pairs(config, [('', 1, 2)], config.get('base_iperf_port', 5001))[:1]
+
+
+@register_topology('sequential')
+class Sequential(Topology):
+    '''
+    Several pairs (the "client_pairs" parameter), one after another.
+    '''
+
+
+@register_topology('simultaneous')
+class Simultaneous(Topology):
+    '''
+    Several pairs at the same time (see NM_fanout.py), at most
+    "max_parallel_pairs" at a time.
+    '''
+    simultaneous = True
+
+    def run(self, pairs, worker, max_parallel = None):
+        return run_pairs(pairs, worker, max_parallel)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Live ingestion of the Iperf server output while a test is running.
+
+The server output reaches the local output file line by line (over the SSH
+pipe for remote servers). LiveIperf takes the lines straight from the output
+stream of the server (see NM_remote.py), or follows that file from a
+background thread, parses every complete interval line as it arrives ("-y C"
+lines, or the enhanced "-e" latency lines), and keeps per-stream aggregates
+up to date.
+When the test ends, the lines are already parsed: the final processed arrays
+are computed from memory, without reading the file again.
+
+The state of the running tests can be watched on the console (one line per
+interval), or as JSON from a local HTTP endpoint (StatusServer), and a test
+can be aborted early when one of its streams stops reporting.
+
+Usage (follow a file by hand, e.g. during a long field run):
+    python3 NM_live.py [--latency] [--port PORT] [--interval S] FILE TCP|UDP STREAMS
+'''
+
+import json
+import argparse
+import numpy as np
+from time import time, monotonic
+from collections import deque, OrderedDict
+from threading import Thread, Event, Lock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from NM_runstats import RunningStats
+from NM_parsers import (parse_iperf_csv_line, parse_latency_line, process_iperf_csv, process_latency,
+                        latency_fields)
+
+# How often the output file is checked for new lines (s).
+live_period = 1.0
+# The default Iperf report interval (s).
+report_interval = 10.0
+# The running tests, by name, and the last finished ones (for the status endpoint).
+active = OrderedDict()
+finished = deque(maxlen = 20)
+_registry_lock = Lock()
+
+
+def _number(x):
+    # JSON has no NaN.
+    return None if x is None or np.isnan(x) else float(x)
+
+
+class StreamStats(object):
+    '''
+    The running aggregates of one stream (Iperf connection ID).
+    '''
+    def __init__(self, stream_id):
+        self.id = stream_id
+        self.reports = 0
+        self.last_end = 0.0
+        self.last_rate = float('nan')
+        self.last_seen = monotonic()
+        self.rate = RunningStats()
+        self.latency = RunningStats()
+        self.latency_min = float('nan')
+        self.latency_max = float('nan')
+
+    def add(self, start, end, rate, latency = None):
+        self.reports += 1
+        self.last_end = end
+        self.last_rate = rate
+        self.last_seen = monotonic()
+        self.rate.push(rate)
+        if latency:
+            avg, lmin, lmax = latency
+            self.latency.push(avg)
+            self.latency_min = np.fmin(self.latency_min, lmin)
+            self.latency_max = np.fmax(self.latency_max, lmax)
+
+    def status(self):
+        s = {
+             'id': self.id,
+             'reports': self.reports,
+             'last_interval_end': self.last_end,
+             'last_rate': _number(self.last_rate),
+             'mean_rate': _number(self.rate.mean) if self.rate.count else None,
+             'stdev_rate': _number(self.rate.std()) if self.rate.count else None,
+             'silent_for': round(monotonic() - self.last_seen, 1)
+            }
+        if self.latency.count:
+            s['latency_avg'] = _number(self.latency.mean)
+            s['latency_min'] = _number(self.latency_min)
+            s['latency_max'] = _number(self.latency_max)
+
+        return s
+
+
+class LiveIperf(object):
+    '''
+    Follows the server output file "path" of a running test. The parsed rows
+    (as read_iperf_csv would return them, or as parse_latency_line returns
+    them with "latency") are kept in memory. "on_interval(tracker, end, rate,
+    reports)" is called whenever all the streams reported an interval.
+    The file is followed from "offset" on (e.g. a server that serves several
+    tests, see NetMeter.SharedServer).
+    '''
+    def __init__(self, path, protocol, streams, name = None, latency = False,
+                 on_interval = None, period = live_period, interval = report_interval, offset = 0):
+        self.path = path
+        self.protocol = protocol
+        self.streams = streams
+        self.name = name or path
+        self.latency = latency
+        self.on_interval = on_interval
+        self.period = period
+        self.interval = interval
+        self.rows = []
+        self.stream_stats = OrderedDict()
+        self.intervals = {}
+        # The total rates of the intervals that all the streams reported.
+        self.totals = RunningStats()
+        self.offset = offset
+        self.partial = b''
+        self.started = monotonic()
+        self.start_time = time()
+        self.done = False
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.source = None
+
+    def start(self, source = None):
+        '''
+        Start following the file. With "source" (an NM_remote.RemoteProcess
+        whose output is the file), its output lines are parsed as they
+        arrive instead, without reading the file.
+        '''
+        self.source = source
+        if source is not None:
+            source.on_line = self.ingest
+        else:
+            self.thread = Thread(target = self._follow, name = 'live ' + self.name, daemon = True)
+            self.thread.start()
+
+        with _registry_lock:
+            active[self.name] = self
+
+        return self
+
+    def _follow(self):
+        while not self.stop_event.wait(self.period):
+            self.poll()
+
+    def poll(self, final = False):
+        '''
+        Parse the lines that were added to the file since the last call.
+        Without "final", an unterminated last line is kept for the next call.
+        '''
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return
+
+        self.offset += len(data)
+        lines = (self.partial + data).split(b'\n')
+        self.partial = b'' if final else lines.pop()
+        for line in lines:
+            self.ingest(line.decode('utf-8', errors='ignore'))
+
+    def ingest(self, line):
+        if self.latency:
+            fields = parse_latency_line(line)
+            if fields is None:
+                return
+
+            stream_id, start, end, rate = fields[:4]
+            latency = fields[4:7]
+        else:
+            fields = parse_iperf_csv_line(line, self.protocol)
+            if fields is None:
+                return
+
+            stream_id, start, end, rate = fields[1], fields[2], fields[3], fields[5]
+            latency = None
+            if self.protocol == 'UDP':
+                # The rate of the datagrams that actually arrived, as in the parser.
+                lost, total = fields[6], fields[7]
+                rate = rate * (total - lost) / total if total > 0 else float('nan')
+
+        complete = None
+        with self.lock:
+            self.rows.append(fields)
+            # Only the interval reports of the streams count here, not the
+            # sums (negative IDs) and the whole-test reports at the end.
+            if stream_id <= 0 or end - start > self.interval * 1.5:
+                return
+
+            if stream_id not in self.stream_stats:
+                self.stream_stats[stream_id] = StreamStats(int(stream_id))
+
+            self.stream_stats[stream_id].add(start, end, rate, latency)
+            # The number of the interval (the ends are not exact multiples of it).
+            key = int(round(end / self.interval))
+            count, total_rate = self.intervals.get(key, (0, 0.0))
+            count += 1
+            total_rate += 0.0 if np.isnan(rate) else rate
+            self.intervals[key] = (count, total_rate)
+            if count == self.streams:
+                complete = (key * self.interval, total_rate, count)
+                self.totals.push(total_rate)
+
+        if complete and self.on_interval:
+            self.on_interval(self, *complete)
+
+    def stop(self):
+        '''
+        Stop following the file, after reading whatever is left in it.
+        '''
+        self.stop_event.set()
+        if self.source is not None:
+            # The lines of the next test (of a shared server) are not ours.
+            if self.source.on_line == self.ingest:
+                self.source.on_line = None
+        else:
+            if self.thread:
+                self.thread.join()
+
+            self.poll(final = True)
+
+        self.done = True
+        with _registry_lock:
+            if active.get(self.name) is self:
+                del active[self.name]
+
+            finished.append(self)
+
+    def stalled(self, timeout):
+        '''
+        A description of the streams that did not report for "timeout" seconds
+        (or never reported at all), or None if all of them are alive.
+        '''
+        now = monotonic()
+        with self.lock:
+            silent = [str(s.id) for s in self.stream_stats.values() if now - s.last_seen > timeout]
+            missing = self.streams - len(self.stream_stats)
+
+        if missing > 0 and now - self.started > self.interval + timeout:
+            silent.append(str(missing) + ' that never reported')
+
+        return ', '.join(silent) if silent else None
+
+    def converged(self, tolerance, confidence = 0.95, min_intervals = 3):
+        '''
+        The relative half width of the confidence interval of the mean total
+        rate, if it is within "tolerance" after at least "min_intervals"
+        complete intervals. Otherwise None.
+        '''
+        with self.lock:
+            count = self.totals.count
+            mean = self.totals.mean
+            halfwidth = self.totals.ci_halfwidth(confidence)
+
+        if count < max(min_intervals, 2) or mean <= 0:
+            return None
+
+        relative = halfwidth / mean
+        return relative if relative <= tolerance else None
+
+    def complete_intervals(self):
+        with self.lock:
+            return self.totals.count
+
+    def array(self):
+        with self.lock:
+            rows = list(self.rows)
+
+        if self.latency:
+            columns = len(latency_fields)
+        else:
+            columns = 8 if self.protocol == 'UDP' else 6
+
+        return np.array(rows, dtype=float).reshape((-1, columns))
+
+    def result(self, repetitions):
+        '''
+        The same as get_iperf_data_single (get_latency_data_single with
+        "latency") of the finished output file, from the lines that were
+        already parsed.
+        '''
+        if self.latency:
+            return process_latency(self.array(), self.streams, repetitions, self.interval)
+
+        return process_iperf_csv(self.array(), self.protocol, self.streams, repetitions, self.interval)
+
+    def status(self):
+        with self.lock:
+            streams = [s.status() for s in self.stream_stats.values()]
+            intervals = sorted(self.intervals.items())
+
+        last = intervals[-1] if intervals else None
+        return {
+                'name': self.name,
+                'file': self.path,
+                'protocol': self.protocol,
+                'expected_streams': self.streams,
+                'started': self.start_time,
+                'elapsed': round(monotonic() - self.started, 1),
+                'finished': self.done,
+                'lines': len(self.rows),
+                'last_interval_end': last[0] * self.interval if last else None,
+                'last_interval_rate': _number(last[1][1]) if last else None,
+                'complete_intervals': self.totals.count,
+                'mean_rate': _number(self.totals.mean) if self.totals.count else None,
+                'ci_halfwidth': _number(min(self.totals.ci_halfwidth(), 1e300)) if self.totals.count > 1 else None,
+                'streams': streams
+               }
+
+
+def status():
+    '''
+    The state of the running tests and of the last finished ones.
+    '''
+    with _registry_lock:
+        running = list(active.values())
+        done = list(finished)
+
+    return {
+            'time': time(),
+            'running': [t.status() for t in running],
+            'finished': [t.status() for t in reversed(done)]
+           }
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/status'):
+            self.send_error(404)
+            return
+
+        body = json.dumps(status(), indent=1).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StatusServer(object):
+    '''
+    Serves status() as JSON on http://host:port/ (from a background thread).
+    '''
+    def __init__(self, port, host = '127.0.0.1'):
+        self.httpd = ThreadingHTTPServer((host, port), _StatusHandler)
+        self.httpd.daemon_threads = True
+        self.thread = Thread(target = self.httpd.serve_forever, name = 'live status', daemon = True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def print_interval(tracker, end, rate, reports):
+    print('Live: ' + tracker.name + ': ' + format(end - tracker.interval, 'g') + '-' + format(end, 'g') +
+          ' s: ' + format(rate / 1e6, '.2f') + ' Mb/s (' + str(reports) + ' streams)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Follow the output of an Iperf server.')
+    parser.add_argument('file')
+    parser.add_argument('protocol', choices = ['TCP', 'UDP'])
+    parser.add_argument('streams', type = int)
+    parser.add_argument('--latency', action = 'store_true', help = 'enhanced (-e) output instead of -y C')
+    parser.add_argument('--port', type = int, help = 'serve the status as JSON on this local port')
+    parser.add_argument('--interval', type = float, default = report_interval, help = 'the Iperf report interval (s)')
+    args = parser.parse_args()
+    server = StatusServer(args.port) if args.port else None
+    tracker = LiveIperf(args.file, args.protocol, args.streams, latency = args.latency,
+                        on_interval = print_interval, interval = args.interval).start()
+    try:
+        while True:
+            tracker.stop_event.wait(3600)
+    except KeyboardInterrupt:
+        tracker.stop()
+        print(json.dumps(tracker.status(), indent=1))
+        if server:
+            server.close()
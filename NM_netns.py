@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+A test bed of Linux network namespaces, to run whole NetMeter campaigns on
+one machine, without real clients, and to time the phases of the
+orchestration (the standard benchmark of its overhead).
+
+The clients are the namespaces nm1, nm2... Every one has an "eth0" (one end
+of a veth pair, with the address 10.177.0.N), and the other ends are on one
+bridge, so that any two clients can test. The egress of every eth0 can be
+shaped with tc netem (delay, loss, rate), and the links of single clients
+can be shaped differently (--link). Without netem in the kernel, only the
+rate is shaped (tbf).
+
+NetMeter reaches the clients with the 'netns' access method (the commands run
+through "ip netns exec", see NetMeter.Connect), so they are local clients
+with their own network stacks. The campaigns are the usual NetMeter runs
+(NetMeter.main, with a configuration module written for the test bed):
+
+    throughput    - the throughput tests of the first two clients
+    latency       - the latency tests (enhanced Iperf 2 output) of the same
+    ping          - the ping round trip times of the same
+    simultaneous  - the throughput tests of the pairs (nm1, nm2), (nm3, nm4)...
+                    at the same time
+
+After every campaign, the time spent in every phase of the tests (see
+NM_scheduler.PhaseTimer) is printed, and all of it is saved in phases.json
+and phases.txt next to the results. With --baseline (the phases.json of an
+earlier run), the changes are printed too.
+
+Usage (as root):
+    python3 NM_netns.py [--clients N] [--delay 10ms] [--loss 0.1%] [--rate 100mbit]
+                        [--link 3=20ms,1%,50mbit] [--campaigns throughput,ping,...]
+                        [--engine iperf|native] [--duration S] [--interval S]
+                        [--out DIR] [--baseline FILE] [--keep]
+    python3 NM_netns.py --teardown [--clients N]
+'''
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+from os.path import join, abspath, dirname
+from time import monotonic
+from subprocess import run, PIPE
+from importlib import invalidate_caches
+from collections import OrderedDict
+
+prefix = 'nm'
+bridge = prefix + 'br0'
+subnet = '10.177.0.'
+
+# The NetMeter parameters of every campaign (on top of those of the test bed).
+campaigns = OrderedDict([
+    ('throughput', {'measurement_kind': 'throughput', 'topology': 'pair', 'protocols': ['TCP', 'UDP']}),
+    ('latency', {'measurement_kind': 'latency', 'topology': 'pair', 'protocols': ['UDP']}),
+    ('ping', {'measurement_kind': 'ping', 'topology': 'pair', 'protocols': ['UDP']}),
+    ('simultaneous', {'measurement_kind': 'throughput', 'topology': 'simultaneous', 'protocols': ['TCP']}),
+])
+
+
+def _run(cmd, check = True):
+    p = run(cmd, stdout = PIPE, stderr = PIPE, universal_newlines = True)
+    if check and p.returncode:
+        raise RuntimeError(' '.join(cmd) + ': ' + p.stderr.strip())
+
+    return p.returncode == 0
+
+
+class Link(object):
+    '''
+    The shaping of the egress of a client: delay ("10ms"), loss ("0.1%") and
+    rate ("100mbit"), each of them None for none.
+    '''
+    def __init__(self, delay = None, loss = None, rate = None):
+        self.delay = delay
+        self.loss = loss
+        self.rate = rate
+
+    @classmethod
+    def parse(cls, text, default):
+        '''
+        "DELAY,LOSS,RATE" (the empty fields are those of "default").
+        '''
+        fields = (text.split(',') + ['', '', ''])[:3]
+        return cls(*[f or d for f, d in zip(fields, (default.delay, default.loss, default.rate))])
+
+    def netem(self):
+        args = []
+        if self.delay:
+            args += ['delay', self.delay]
+        if self.loss:
+            args += ['loss', self.loss]
+        if self.rate:
+            args += ['rate', self.rate]
+
+        return args
+
+    def describe(self):
+        return ', '.join(f for f in (self.delay and 'delay ' + self.delay, self.loss and 'loss ' + self.loss,
+                                     self.rate and 'rate ' + self.rate) if f) or 'not shaped'
+
+
+class TestBed(object):
+    '''
+    The namespaces of "clients" clients, and their links ("links" maps the
+    numbers of the clients to their Link, "default" is that of the rest).
+    '''
+    def __init__(self, clients, default = None, links = None):
+        self.clients = clients
+        self.default = default or Link()
+        self.links = links or {}
+
+    def namespace(self, n):
+        return prefix + str(n)
+
+    def address(self, n):
+        return subnet + str(n)
+
+    def setup(self):
+        self.teardown()
+        _run(['ip', 'link', 'add', bridge, 'type', 'bridge'])
+        _run(['ip', 'link', 'set', bridge, 'up'])
+        for n in range(1, self.clients + 1):
+            ns, host_end, ns_end = self.namespace(n), prefix + 'h' + str(n), prefix + 'n' + str(n)
+            _run(['ip', 'netns', 'add', ns])
+            _run(['ip', 'link', 'add', host_end, 'type', 'veth', 'peer', 'name', ns_end])
+            _run(['ip', 'link', 'set', ns_end, 'netns', ns])
+            _run(['ip', '-n', ns, 'link', 'set', ns_end, 'name', 'eth0'])
+            _run(['ip', '-n', ns, 'addr', 'add', self.address(n) + '/24', 'dev', 'eth0'])
+            _run(['ip', '-n', ns, 'link', 'set', 'eth0', 'up'])
+            _run(['ip', '-n', ns, 'link', 'set', 'lo', 'up'])
+            _run(['ip', 'link', 'set', host_end, 'master', bridge, 'up'])
+            self.shape(n, self.links.get(n, self.default))
+
+    def shape(self, n, link):
+        args = link.netem()
+        if not args:
+            return
+
+        ns = self.namespace(n)
+        if _run(['ip', 'netns', 'exec', ns, 'tc', 'qdisc', 'add', 'dev', 'eth0', 'root', 'netem'] + args, False):
+            print(ns + ': ' + link.describe())
+        elif link.rate and _run(['ip', 'netns', 'exec', ns, 'tc', 'qdisc', 'add', 'dev', 'eth0', 'root', 'tbf',
+                                 'rate', link.rate, 'burst', '64kb', 'latency', '50ms'], False):
+            print('\033[93mWARNING:\033[0m netem is not available: ' + ns + ' is shaped to rate ' + link.rate +
+                  ' only (tbf).')
+        else:
+            print('\033[93mWARNING:\033[0m netem is not available: the link of ' + ns + ' is not shaped.')
+
+    def teardown(self):
+        # Deleting a namespace deletes its end of the veth pair, and with it the other end.
+        for n in range(1, self.clients + 1):
+            _run(['ip', 'netns', 'del', self.namespace(n)], False)
+        _run(['ip', 'link', 'del', bridge], False)
+
+    def config(self, export_dir, opts, **params):
+        '''
+        The NetMeter parameters of a campaign on the test bed.
+        '''
+        config = {
+                  'export_dir': export_dir,
+                  'title': 'Test bed: ' + str(self.clients) + ' namespaces (' + self.default.describe() + ')',
+                  'run_duration': opts.duration,
+                  'report_interval': opts.interval,
+                  'test_range': opts.sizes,
+                  'streams': [1],
+                  'shutdown': False,
+                  'remote_telemetry': True,
+                  'live_status_port': None,
+                  'traffic_engine': opts.engine,
+                  'engine_command': sys.executable + ' ' + abspath(join(dirname(__file__), 'NM_engine.py')),
+                  'client_pairs': [(self.namespace(n) + 'TO' + self.namespace(n + 1), n, n + 1)
+                                   for n in range(1, self.clients, 2)]
+                 }
+        if opts.plot_backend:
+            config['plot_backend'] = opts.plot_backend
+        binary = 'ping' if params['measurement_kind'] == 'ping' else opts.iperf
+        for n in range(1, self.clients + 1):
+            cl = 'cl' + str(n)
+            config.update({cl + '_conn_ip': self.namespace(n), cl + '_test_ip': self.address(n),
+                           cl + '_iperf': binary, cl + '_pretty_name': self.namespace(n),
+                           'access_method_' + cl: 'netns', 'ssh_port_' + cl: '22', 'creds_' + cl: ''})
+        config.update(params)
+        return config
+
+
+def write_config(config, directory, name):
+    '''
+    Write "config" as the configuration module "name" (see NetMeter.load_config()).
+    '''
+    with open(join(directory, name + '.py'), 'w') as f:
+        f.write('# Written by NM_netns.py\n')
+        for k, v in config.items():
+            f.write(k + ' = ' + repr(v) + '\n')
+
+    invalidate_caches()
+
+
+def skipped(name, params, opts):
+    '''
+    Why the campaign "name" can not run, or None.
+    '''
+    if params['measurement_kind'] == 'ping':
+        return None if shutil.which('ping') else 'there is no ping'
+    if opts.engine == 'native':
+        return None if params['measurement_kind'] == 'throughput' else 'the native engine does not measure it'
+
+    return None if shutil.which(opts.iperf) else 'there is no ' + opts.iperf
+
+
+def phase_table(phases):
+    lines = ['    ' + format('phase', '14s') + format('count', '>7s') + format('total(s)', '>11s') +
+             format('mean(s)', '>10s') + format('max(s)', '>10s')]
+    for name, p in phases.items():
+        lines.append('    ' + format(name, '14s') + format(p['count'], '7d') + format(p['total'], '11.3f') +
+                     format(p['mean'], '10.3f') + format(p['max'], '10.3f'))
+
+    return lines
+
+
+def report(results, duration, baseline = None):
+    '''
+    The timing report of the campaigns (lines of text). With "baseline"
+    (the results of an earlier run), the relative change of the overhead per
+    round (of tests at the same time), and the changes of the mean time of
+    every phase.
+    '''
+    lines = []
+    for name, r in results.items():
+        if r.get('skipped'):
+            lines.append('Campaign ' + name + ': skipped (' + r['skipped'] + ').')
+            continue
+
+        lines.append('Campaign ' + name + (' (FAILED)' if r['failed'] else '') + ': ' + str(r['tests']) +
+                     ' test(s) in ' + str(r['rounds']) + ' round(s), ' + format(r['wall'], '.2f') + ' s: ' +
+                     format(r['overhead'], '.3f') + ' s per round on top of the ' + format(duration, 'g') + ' s runs.')
+        lines += phase_table(r['phases'])
+        old = (baseline or {}).get(name)
+        if old and not old.get('skipped'):
+            changes = ['overhead per round ' + format(_change(r['overhead'], old['overhead']), '+.1f') + '%']
+            changes += [phase + ' ' + format((p['mean'] - old['phases'][phase]['mean']) * 1000, '+.1f') + ' ms'
+                        for phase, p in r['phases'].items() if phase in old['phases']]
+            lines.append('    vs. baseline: ' + ', '.join(changes))
+
+    return lines
+
+
+def _change(new, old):
+    return (new / old - 1.0) * 100.0 if old else float('nan')
+
+
+def run_campaigns(bed, opts):
+    '''
+    Run the campaigns of "opts" on the test bed. Returns the timings of
+    every campaign, by name.
+    '''
+    import NetMeter
+
+    out = join(opts.out, NetMeter.rundate)
+    os.makedirs(out, exist_ok = True)
+    config_dir = tempfile.mkdtemp(prefix = 'nm-netns-')
+    sys.path.insert(0, config_dir)
+    results = OrderedDict()
+    try:
+        for name in opts.campaigns:
+            params = campaigns[name]
+            why = skipped(name, params, opts)
+            if why:
+                print('\033[93mWARNING:\033[0m Skipping the ' + name + ' campaign: ' + why + '.')
+                results[name] = {'skipped': why}
+                continue
+
+            module = 'NM_netns_' + name + '_config'
+            write_config(bed.config(join(out, name), opts, **params), config_dir, module)
+            print('\033[92mCampaign: ' + name + '\033[0m')
+            NetMeter.phases.reset()
+            NetMeter.journal = None
+            start = monotonic()
+            try:
+                NetMeter.main(['--config', module])
+                failed = False
+            except SystemExit as err:
+                failed = bool(err.code)
+
+            wall = monotonic() - start
+            points = NetMeter.journal.points if NetMeter.journal is not None else {}
+            # The pairs of a simultaneous campaign run their points at the same time: one round each.
+            rounds = len(set(key[1:] for key in points))
+            phases = OrderedDict((p, {'count': count, 'total': total, 'mean': mean, 'max': longest})
+                                 for p, count, total, mean, longest in NetMeter.phases.summary())
+            results[name] = {'failed': failed, 'tests': len(points), 'rounds': rounds, 'wall': wall, 'phases': phases,
+                             'overhead': (wall - rounds * opts.duration) / rounds if rounds else float('nan')}
+            print('\n'.join(report(OrderedDict([(name, results[name])]), opts.duration)))
+    finally:
+        shutil.rmtree(config_dir, ignore_errors = True)
+
+    with open(join(out, 'phases.json'), 'w') as f:
+        json.dump({'clients': bed.clients, 'link': bed.default.describe(), 'duration': opts.duration,
+                   'interval': opts.interval, 'engine': opts.engine, 'campaigns': results}, f, indent = 1)
+
+    baseline = None
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)['campaigns']
+
+    lines = report(results, opts.duration, baseline)
+    with open(join(out, 'phases.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    print('\n'.join(['', 'Timing report (' + join(out, 'phases.txt') + '):'] + lines))
+    return results
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Run NetMeter campaigns on a test bed of network namespaces.')
+    parser.add_argument('--clients', type = int, default = 4, help = 'the number of namespaces (default: 4)')
+    parser.add_argument('--delay', help = 'the delay of every link (one way, e.g. 10ms)')
+    parser.add_argument('--loss', help = 'the loss of every link (e.g. 0.1%%)')
+    parser.add_argument('--rate', help = 'the rate of every link (e.g. 100mbit)')
+    parser.add_argument('--link', action = 'append', default = [], metavar = 'N=DELAY,LOSS,RATE',
+                        help = 'the shaping of the link of client N (empty fields: as the others)')
+    parser.add_argument('--campaigns', default = ','.join(campaigns),
+                        help = 'the campaigns to run: ' + ', '.join(campaigns) + ' (default: all)')
+    parser.add_argument('--engine', default = 'iperf', choices = ['iperf', 'native'],
+                        help = 'the traffic engine (see NM_engine.py)')
+    parser.add_argument('--iperf', default = 'iperf', help = 'the Iperf executable')
+    parser.add_argument('--duration', type = int, default = 5, help = 'the duration of every test (s)')
+    parser.add_argument('--interval', type = float, default = 1.0, help = 'the report interval (s)')
+    parser.add_argument('--sizes', default = '1024,65536', help = 'the buffer/datagram sizes (B)')
+    parser.add_argument('--plot-backend', help = 'the plot backend (default: plot_backend)')
+    parser.add_argument('--out', default = join('out', 'netns'), help = 'where the campaigns are saved')
+    parser.add_argument('--baseline', help = 'the phases.json of an earlier run, to compare with')
+    parser.add_argument('--keep', action = 'store_true', help = 'do not remove the namespaces at the end')
+    parser.add_argument('--teardown', action = 'store_true', help = 'only remove the namespaces')
+    opts = parser.parse_args(args)
+    opts.campaigns = [c.strip() for c in opts.campaigns.split(',') if c.strip()]
+    opts.sizes = [int(s) for s in opts.sizes.split(',')]
+    unknown = [c for c in opts.campaigns if c not in campaigns]
+    if unknown or opts.clients < 2:
+        print('\033[91mERROR:\033[0m ' + ('Unknown campaign(s): ' + ', '.join(unknown) if unknown else
+                                          'At least 2 clients are needed.'))
+        sys.exit(1)
+
+    if os.geteuid() != 0:
+        print('\033[91mERROR:\033[0m The namespaces can only be set up by root.')
+        sys.exit(1)
+
+    default = Link(opts.delay, opts.loss, opts.rate)
+    links = {}
+    for spec in opts.link:
+        n, _, fields = spec.partition('=')
+        links[int(n)] = Link.parse(fields, default)
+    bed = TestBed(opts.clients, default, links)
+    if opts.teardown:
+        bed.teardown()
+        return
+
+    try:
+        print('Setting up ' + str(opts.clients) + ' namespaces (' + default.describe() + ')...')
+        bed.setup()
+        run_campaigns(bed, opts)
+    except RuntimeError as err:
+        print('\033[91mERROR:\033[0m ' + str(err))
+        sys.exit(1)
+    finally:
+        if not opts.keep:
+            bed.teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+A cross-check of the Iperf rates against the interface counters of the
+clients.
+
+The rates of a test come from what Iperf reports about itself, and that
+output is not always reliable (see the too_few/too_many faults of the
+parsers). The CPU samplers of NM_cpustat.py also record the /proc/net/dev
+counters of all the interfaces, locally and on the ssh clients. Here the
+test interface of each client is found by its test address (in the output of
+"ip -o addr show"), the byte and packet deltas of that interface are summed
+up to the report intervals, and the headers of the packets are subtracted,
+so that the kernel's count of the payload can be set against the Iperf rate:
+what the sender's interface transmitted, and what the receiver's interface
+received.
+
+The other traffic of the interfaces (e.g. the ssh sessions, if the test and
+connection addresses are the same) is counted too, and the header estimate
+does not know about offloads and fragmentation, so small differences are
+expected. A difference beyond the tolerance is flagged.
+'''
+
+import numpy as np
+
+# The headers of a packet as counted by the interface (bytes): Ethernet (14),
+# IPv4 (20), and TCP with the timestamps option (32) or UDP (8).
+header_bytes = {'TCP': 66, 'UDP': 42}
+
+nic_header = 'TimeStamp(s) Iperf(b/s) Sender(b/s) Receiver(b/s)'
+
+
+def iface_of(text, ip):
+    '''
+    The interface that has the address "ip", from the output of
+    "ip -o addr show" ("2: eth0    inet 10.0.0.1/24 brd ..."). None if no
+    interface has it.
+    '''
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) > 3 and fields[2] in ('inet', 'inet6') and fields[3].split('/')[0] == ip:
+            # Alias interfaces show as "eth0:1", but count as "eth0" in /proc/net/dev.
+            return fields[1].rstrip(':').split('@')[0].split(':')[0]
+
+    return None
+
+
+def payload_rates(samples, iface, side, protocol, interval, repetitions = None):
+    '''
+    The payload rate (b/s) of the interface "iface" in the samples
+    "samples" (an NM_cpustat.CpuSamples), per report interval: what it
+    transmitted ("side" = 'tx') or received ('rx'), less the headers of the
+    packets. Returns the interval times and the rates, or None if the
+    interface was not sampled.
+    '''
+    if iface not in samples.ifaces:
+        return None
+
+    table = samples.net(interval, repetitions)
+    rows = table[table[:,1] == samples.ifaces.index(iface)]
+    bits, packets = (rows[:,3], rows[:,5]) if side == 'tx' else (rows[:,2], rows[:,4])
+    return rows[:,0], np.maximum(bits - packets * header_bytes.get(protocol, 0) * 8, 0.0)
+
+
+def _align(times, nic, interval):
+    # The NIC rate of the interval that starts closest to every time (NaN if none is near).
+    out = np.full(times.shape, np.nan)
+    if nic is None or not nic[0].size:
+        return out
+
+    nic_times, rates = nic
+    idx = np.abs(times[:, None] - nic_times[None, :]).argmin(axis = 1)
+    near = np.abs(nic_times[idx] - times) <= interval / 2.0
+    out[near] = rates[idx[near]]
+    return out
+
+
+def compare(iperf_array, sender, receiver, interval):
+    '''
+    Set the Iperf rates ("iperf_array", as returned by the parsers) against
+    the NIC rates of the sender and of the receiver (as returned by
+    payload_rates(), or None). Returns the per-interval table (see
+    nic_header), and the mean rates of the sender and of the receiver and
+    their relative differences from the mean Iperf rate (NaN when unknown),
+    over the intervals that all of them have.
+    '''
+    times = iperf_array[:,0]
+    table = np.column_stack((times, iperf_array[:,1], _align(times, sender, interval),
+                             _align(times, receiver, interval)))
+    means = []
+    diffs = []
+    for column in (2, 3):
+        both = ~np.isnan(table[:,1]) & ~np.isnan(table[:,column])
+        if both.any() and table[both, 1].mean() > 0:
+            means.append(table[both, column].mean())
+            diffs.append(means[-1] / table[both, 1].mean() - 1.0)
+        else:
+            means.append(np.nan)
+            diffs.append(np.nan)
+
+    return table, means, diffs
+
+
+def diverged(diffs, tolerance):
+    '''
+    Which of the sides ('sender', 'receiver') differ from Iperf by more than
+    "tolerance" (a fraction), with their relative differences.
+    '''
+    return [(side, d) for side, d in zip(('sender', 'receiver'), diffs)
+            if not np.isnan(d) and abs(d) > tolerance]
+
+
+def describe(flagged):
+    return ', '.join(side + ' NIC ' + format(d * 100, '+.1f') + '%' for side, d in flagged)
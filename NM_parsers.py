@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Parsers for the raw Iperf output, shared by the NetMeter scripts.
+
+The files are read and validated in bulk, and the columns are converted by
+NumPy, so the parsing time stays low even for hours-long multi-stream runs,
+and at sub-second report intervals.
+'''
+
+import re
+import numpy as np
+
+from NM_runstats import prefix_std, rolling_std
+
+_num = r'(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+_int = r'(-?\d+)'
+_skip_num = r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'
+_skip_int = r'-?\d+'
+# A valid "-y C" line: date, 2 x (address, port), ID, interval, bytes, rate,
+# and for UDP also jitter, lost, total, percentage and out of order datagrams.
+# Only the fields used by the parsers are captured: date, ID, interval start,
+# interval end, bytes, rate, and for UDP also lost and total datagrams.
+_csv_head = r'^[ \t]*(\d+(?:\.\d+)?)(?:,[^,\n]*){4},' + _int + r',' + _num + r'-' + _num + r',' + _int + r',' + _num
+_csv_line = {
+             'TCP': re.compile(_csv_head + r'[ \t\r]*$', re.M),
+             'UDP': re.compile(_csv_head + r',' + _skip_num + r',' + _int + r',' + _int + r',' +
+                               _skip_num + r',' + _skip_int + r'[ \t\r]*$', re.M)
+            }
+_csv_columns = {'TCP': 6, 'UDP': 8}
+# The enhanced ("-e") UDP server output is split in columns on spaces and on
+# these separators. An interval line then reads:
+# ID  start-end sec  transfer unit  rate unit(bits) sec  jitter ms  lost total %
+# avg min max stdev ms  [PPS pps  [NetPwr]]
+# The latencies are "-" when Iperf could not measure them, and PPS and NetPwr
+# are missing in the output of older Iperf versions.
+_latency_separators = str.maketrans('[]/()', '     ')
+# The columns of read_iperf_latency (and the fields of parse_latency_line).
+latency_fields = ('id', 'start', 'end', 'rate', 'latency_avg', 'latency_min', 'latency_max', 'latency_stdev',
+                  'jitter', 'lost', 'total', 'pps', 'netpwr')
+# The compiled patterns of _latency_line(), by columns.
+_latency_lines = {}
+# The columns of read_iperf_latency that get_latency_data_single uses.
+_process_columns = ('id', 'start', 'end', 'latency_avg', 'latency_stdev')
+_rate_prefix = {'': 1.0, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+# An echo reply of ping: "64 bytes from ADDRESS: icmp_seq=N ttl=T time=RTT ms".
+_ping_reply = re.compile(r'^\d+ bytes from [^\n]*?icmp_[rs]eq=(\d+)[^\n]*? time[=<](\d+(?:\.\d+)?) ?ms', re.M)
+
+
+def report_repetitions(runtime, interval = 10.0):
+    '''
+    The number of complete report intervals in "runtime" seconds, and the time
+    left after them (as divmod, but without the rounding errors of fractional
+    intervals, e.g. 30 s at 0.1 s intervals are 300 intervals, not 299).
+    '''
+    repetitions = int(round(runtime / float(interval)))
+    if abs(repetitions * interval - runtime) > interval * 1e-6:
+        repetitions = int(runtime // interval)
+
+    return repetitions, max(runtime - repetitions * interval, 0.0)
+
+
+def mpstat_interval(interval):
+    '''
+    The mpstat sampling period for the report interval "interval": mpstat only
+    takes whole seconds, so sub-second intervals are sampled every second.
+    '''
+    return max(1, int(round(interval)))
+
+
+def mpstat_args(repetitions, interval = 10.0):
+    '''
+    The mpstat period and count arguments covering "repetitions" intervals.
+    '''
+    period = mpstat_interval(interval)
+    return [str(period), str(max(int(round(repetitions * interval / period)), 1))]
+
+
+def csv_timestamps(stamps):
+    '''
+    Convert an array of YYYYMMDDHHMMSS numbers (as Iperf writes them, newer
+    versions with a fraction of a second) to seconds since the epoch, without
+    parsing every date separately.
+    '''
+    stamps = np.asarray(stamps, dtype=float)
+    fraction = stamps - np.floor(stamps)
+    stamps = np.floor(stamps).astype(np.int64)
+    date, clock = np.divmod(stamps, 1000000)
+    year, month_day = np.divmod(date, 10000)
+    month, day = np.divmod(month_day, 100)
+    months = (year - 1970) * 12 + month - 1
+    days = (months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + day - 1)
+    hours, minutes_seconds = np.divmod(clock, 10000)
+    minutes, seconds = np.divmod(minutes_seconds, 100)
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds + fraction
+
+
+def read_iperf_csv(iperf_out, protocol):
+    '''
+    Read the valid "-y C" lines of an Iperf server output file.
+    Returns a 2D float array with the columns: date (YYYYMMDDHHMMSS), ID,
+    interval start, interval end, bytes, rate, and for UDP also lost and
+    total datagrams. Lines that can not be read are skipped.
+    '''
+    with open(iperf_out, encoding='utf-8', errors='ignore') as inputfile:
+        text = inputfile.read()
+
+    fields = _csv_line[protocol].findall(text)
+    if not fields:
+        return np.empty((0, _csv_columns[protocol]))
+
+    return np.array(fields, dtype=float)
+
+
+def parse_iperf_csv_line(line, protocol):
+    '''
+    The fields of one "-y C" line, as in a row of read_iperf_csv, or None if the
+    line is not a valid one. Used to follow the server output while it is written.
+    '''
+    found = _csv_line[protocol].match(line)
+    if not found:
+        return None
+
+    return tuple(float(f) for f in found.groups())
+
+
+def _latency_columns(t):
+    '''
+    The numbers of one split interval line (as strings, in the order of
+    latency_fields, without the rate prefix) and the rate prefix, or None if
+    the line is not an interval line.
+    '''
+    if len(t) > 2 and t[1].endswith('-'):
+        # "0.0- 1.0 sec", as older versions print the short intervals.
+        t = [t[0], t[1] + t[2]] + t[3:]
+
+    if len(t) < 18 or t[2] != 'sec' or t[9] != 'ms' or t[17] != 'ms' or not t[0].isdigit():
+        return None
+
+    start, _, end = t[1].partition('-')
+    latency = t[13:17] if t[13] != '-' else ['nan'] * 4
+    pps = t[18] if len(t) > 19 and t[19] == 'pps' else 'nan'
+    netpwr = t[20] if len(t) > 20 else 'nan'
+    return [t[0], start, end, t[5]] + latency + [t[8], t[10], t[11], pps, netpwr], t[6][:-4]
+
+
+def parse_latency_line(line):
+    '''
+    The fields of one interval line of the enhanced ("-e") UDP server output
+    (as in latency_fields), or None for any other line.
+    '''
+    found = _latency_columns(line.translate(_latency_separators).split())
+    if found is None:
+        return None
+
+    try:
+        row = [float(x) for x in found[0]]
+        row[3] *= _rate_prefix[found[1]]
+    except (ValueError, KeyError):
+        return None
+
+    return tuple(row)
+
+
+def _latency_line(columns):
+    '''
+    The pattern of an interval line of the enhanced ("-e") UDP server output,
+    with a group for each of the columns (fields of latency_fields), in the
+    order of the line; the rate also has a group for its unit. The latencies
+    are empty if "-", and PPS and NetPwr if not printed.
+    '''
+    if columns not in _latency_lines:
+        def field(name, pattern = r'[^\s/]+'):
+            return ('(' if name in columns else '(?:') + pattern + ')'
+
+        # "[" then not after another character of the line: as "^[", but much faster to search for.
+        line = (r'\[(?<![^\n]\[) *' + field('id', r'\d+') + r'\][ \t]+' + field('start', r'\d+(?:\.\d+)?') + r'-[ \t]*' +
+                field('end') + r'[ \t]+sec[ \t]+\S+[ \t]+\S+[ \t]+' + field('rate') + r'[ \t]+' +
+                field('rate', r'[^\s/]*') + r'/sec[ \t]+' + field('jitter') + r'[ \t]+ms[ \t]+' + field('lost') +
+                r'/[ \t]*' + field('total') + r'[ \t]+\(\S*[ \t]+(?:-(?:/[ \t]*[^\s/]+){3}|' +
+                r'/[ \t]*'.join(field(f) for f in latency_fields[4:8]) + r')[ \t]+ms')
+        if 'pps' in columns or 'netpwr' in columns:
+            line += (r'(?:[ \t]+' + field('pps') + r'[ \t]+pps(?:[ \t]+' + field('netpwr', r'[^\s\[\]/()]+') +
+                     r'(?![^\s\[\]/()]))?)?')
+
+        _latency_lines[columns] = re.compile(line)
+
+    return _latency_lines[columns]
+
+
+def read_iperf_latency(iperf_out, columns = latency_fields):
+    '''
+    Read the interval lines of an enhanced ("-e") UDP server output file.
+    Returns a 2D float array with the given columns (of latency_fields; rate
+    in b/s, jitter and latencies in ms; NaN where Iperf did not print a
+    value). Only these columns are converted, so asking for fewer is faster.
+    Lines that can not be read are skipped.
+    '''
+    with open(iperf_out, encoding='utf-8', errors='ignore') as inputfile:
+        text = inputfile.read()
+
+    # All the lines are matched at once, and the columns converted by NumPy.
+    columns = tuple(columns)
+    fields = _latency_line(columns).findall(text)
+    if not fields:
+        return np.empty((0, len(columns)))
+
+    # The groups are in the order of the line, with the unit after the rate.
+    groups = [f for f in ('id', 'start', 'end', 'rate') + latency_fields[8:11] + latency_fields[4:8] +
+              latency_fields[11:] if f in columns]
+    if 'rate' in columns:
+        groups.insert(groups.index('rate') + 1, 'unit')
+
+    fields = np.array(fields, dtype=object).reshape((len(fields), len(groups)))
+    values = fields[:,[groups.index(c) for c in columns]]
+    values[values == ''] = 'nan'
+    try:
+        raw = values.astype(float)
+    except ValueError:
+        # Some column was not a number (e.g. a garbled line): convert row by row.
+        rows, kept = [], []
+        for i, row in enumerate(values.tolist()):
+            try:
+                rows.append([float(x) for x in row])
+                kept.append(i)
+            except ValueError:
+                pass
+
+        raw, fields = np.array(rows, dtype=float).reshape((-1, len(columns))), fields[kept]
+
+    if 'rate' in columns:
+        units = fields[:,groups.index('unit')].astype(str)
+        rate = columns.index('rate')
+        for unit in np.unique(units):
+            # "Mbits" and so on (the prefix of the rate).
+            raw[units == unit, rate] *= _rate_prefix.get(unit[:-4], np.nan)
+
+    return raw
+
+
+def _check_streams(conns, streams):
+    num_conn = conns.shape[0]
+    if num_conn < streams:
+        raise ValueError(str(num_conn) + ' out of ' + str(streams) + ' streams reached the server.')
+    elif num_conn > streams:
+        raise ValueError(str(num_conn) + ' connections reached the server (' + str(streams) + ' expected).')
+
+
+def _equal_blocks(data, id_column, conns, repetitions):
+    '''
+    Sort the rows (time in column 0) by connection, then by time, and keep
+    the same number of rows (at most "repetitions") of every connection.
+    Returns the rows and the server fault.
+    '''
+    # Sort by connection number, then by date. Get indices of the result.
+    bi_sorted_indices = np.lexsort((data[:,0], data[:,id_column]))
+    data = data[bi_sorted_indices]
+    ### Mechanism to check if too few or too many connections received
+    # Get the index of the line after the last of each connection
+    conn_ranges = np.searchsorted(data[:,id_column], conns, side='right')
+    # Get sizes of connection blocks
+    conn_count = np.diff(np.insert(conn_ranges, 0, 0))
+    server_fault = False
+    conn_reached = conn_count.min()
+    if conn_reached < repetitions:
+        # If there was at least one occasion when there were fewer connections than expected
+        server_fault = 'too_few'
+        repetitions = conn_reached
+
+    # Keep only the first "repetitions" lines of every connection block
+    if (conn_count > repetitions).any():
+        block_starts = conn_ranges - conn_count
+        position = np.arange(data.shape[0]) - np.repeat(block_starts, conn_count)
+        data = data[position < repetitions]
+        if not server_fault:
+            server_fault = 'too_many'
+
+    ### End connection ammount check
+    return data, server_fault
+
+
+def get_iperf_data_single(iperf_out, protocol, streams, repetitions, interval = 10.0):
+    '''
+    Parse the server output of a throughput test. Returns the per-interval
+    array (mean time, summed rate, rate standard deviation of the streams),
+    the mean and standard deviation of the summed rate, and the server fault
+    (False, 'too_few' or 'too_many' interval reports per stream).
+    Notice: lines that do not have the expected format (as sometimes the
+    beginning of an output row is unreadable) are ignored. This is also the
+    reason for "errors='ignore'".
+    "repetitions" is the expected number of report intervals of "interval"
+    seconds (the -i option of the server).
+    '''
+    return process_iperf_csv(read_iperf_csv(iperf_out, protocol), protocol, streams, repetitions, interval)
+
+
+def process_iperf_csv(raw, protocol, streams, repetitions, interval = 10.0):
+    '''
+    get_iperf_data_single for lines that were already read (the rows of
+    read_iperf_csv, e.g. as collected while the test was running).
+    '''
+    raw = np.asarray(raw, dtype=float).reshape((-1, _csv_columns[protocol]))
+    interval_end = raw[:,3]
+    conn_id = raw[:,1]
+    # Iperf prints the interval bounds rounded, hence the small tolerance.
+    keep = (interval_end <= repetitions * interval + interval * 1e-3) & (conn_id > 0)
+    if protocol == 'UDP':
+        keep &= raw[:,7] > 0
+
+    raw = raw[keep]
+    if not raw.shape[0]:
+        raise ValueError('Nothing reached the server.')
+
+    if interval < 1.0:
+        # The dates may only have whole seconds: the interval ends are exact.
+        times = raw[:,3]
+    else:
+        times = csv_timestamps(raw[:,0])
+
+    rate = raw[:,5]
+    if protocol == 'UDP':
+        # For UDP: rate = rate * (total_datagrams - lost_datagrams) / total_datagrams
+        rate = rate * (raw[:,7] - raw[:,6]) / raw[:,7]
+
+    rate = np.where((raw[:,4] < 0) | (rate < 0.0), np.nan, rate)
+    iperf_data = np.empty((raw.shape[0], 3))
+    iperf_data[:,0] = times - times[0]
+    iperf_data[:,1] = raw[:,1]
+    iperf_data[:,2] = rate
+    conns = np.unique(iperf_data[:,1])
+    num_conn = conns.shape[0]
+    _check_streams(conns, streams)
+    iperf_data, server_fault = _equal_blocks(iperf_data, 1, conns, repetitions)
+    iperf_data = iperf_data[:,[0,2]].reshape((num_conn, iperf_data.shape[0]//num_conn, 2))
+    iperf_data = np.ma.masked_array(iperf_data, np.isnan(iperf_data))
+    mean_times = np.mean(iperf_data[:,:,0], axis=0)
+    iperf_stdev = np.std(iperf_data[:,:,1], axis=0) * np.sqrt(num_conn)
+    out_arr = np.vstack((mean_times, iperf_data[:,:,1].sum(axis=0), iperf_stdev)).filled(np.nan).T
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std(), server_fault
+
+
+def get_latency_data_single(iperf_out, protocol, streams, repetitions, interval = 10.0, quiet = True):
+    '''
+    Parse the enhanced ("-e") UDP server output of a latency test. Returns the
+    per-interval array (mean interval start time, mean latency of the streams,
+    mean latency standard deviation of the streams, in ms), the mean and
+    standard deviation of the mean latency, and the server fault.
+    Without "quiet", what was parsed is printed, to check the field outputs.
+    ("protocol" is only there for the same call as get_iperf_data_single.)
+    '''
+    return process_latency(read_iperf_latency(iperf_out, _process_columns), streams, repetitions, interval,
+                           quiet = quiet, name = iperf_out, columns = _process_columns)
+
+
+def process_latency(raw, streams, repetitions, interval = 10.0, quiet = True, name = 'the output',
+                    columns = latency_fields):
+    '''
+    get_latency_data_single for lines that were already read (the rows of
+    read_iperf_latency, with the given columns, which must include those of
+    _process_columns).
+    '''
+    raw = np.asarray(raw, dtype=float).reshape((-1, len(columns)))
+    # The start, average latency, latency standard deviation and ID, then the end of the interval.
+    raw = raw[:,[columns.index(c) for c in ('start', 'latency_avg', 'latency_stdev', 'id', 'end')]]
+    # Only the interval reports, not the final report of the whole test.
+    keep = np.abs((raw[:,4] - raw[:,0]) - interval) < interval * 1e-3
+    if not quiet:
+        print('Parsed ' + str(raw.shape[0]) + ' interval lines of ' + name + ', ' +
+              str(int(keep.sum())) + ' of ' + format(interval, 'g') + ' s.')
+
+    raw = raw[keep]
+    if not raw.shape[0]:
+        raise ValueError('Nothing reached the server.')
+
+    latency_data = raw[:,:4]
+    conns = np.unique(latency_data[:,3])
+    num_conn = conns.shape[0]
+    _check_streams(conns, streams)
+    latency_data, server_fault = _equal_blocks(latency_data, 3, conns, repetitions)
+    if not quiet:
+        counts = np.unique(raw[:,3], return_counts = True)[1]
+        print('Intervals per stream: ' + ', '.join(str(int(c)) for c in counts) +
+              ' (' + str(repetitions) + ' expected)' + (', ' + server_fault if server_fault else '') + '.')
+
+    latency_data = latency_data[:,[0,1,2]].reshape((num_conn, latency_data.shape[0]//num_conn, 3))
+    latency_data = np.ma.masked_array(latency_data, np.isnan(latency_data))
+    mean_times = np.mean(latency_data[:,:,0], axis=0)
+    latency_stdev = np.mean(latency_data[:,:,2], axis=0)
+    out_arr = np.vstack((mean_times, latency_data[:,:,1].mean(axis=0), latency_stdev)).filled(np.nan).T
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std(), server_fault
+
+
+def get_ping_data_single(ping_out, protocol, streams, repetitions, interval = 1.0, quiet = True,
+                         jitter_window = 10):
+    '''
+    Parse the output of ping (the server side of a ping test). Returns the
+    per-reply array (time from the start by the ICMP sequence number, round
+    trip time, standard deviation of the round trip times before it, and the
+    jitter: that of the last "jitter_window" replies, in ms),
+    the mean and standard deviation of the round trip time, and the fault
+    (too few or too many replies). A ping is a single stream.
+    ("protocol" is only there for the same call as get_iperf_data_single.)
+    '''
+    with open(ping_out, encoding='utf-8', errors='ignore') as inputfile:
+        replies = _ping_reply.findall(inputfile.read())
+
+    if not quiet:
+        print('Parsed ' + str(len(replies)) + ' replies of ' + ping_out + ' (' + str(repetitions) + ' expected).')
+
+    if not replies:
+        raise ValueError('Nothing reached the server.')
+
+    replies = np.array(replies, dtype=float)
+    ping_data = np.zeros((replies.shape[0], 3))
+    ping_data[:,0] = replies[:,0] * interval
+    ping_data[:,2] = replies[:,1]
+    conns = np.zeros(1)
+    _check_streams(conns, streams)
+    ping_data, server_fault = _equal_blocks(ping_data, 1, conns, repetitions)
+    rtt = ping_data[:,2]
+    out_arr = np.column_stack((ping_data[:,0], rtt, prefix_std(rtt), rolling_std(rtt, jitter_window)))
+    return out_arr, np.nanmean(rtt), np.nanstd(rtt), server_fault
+
+
+def trim_to_window(data, window, interval):
+    '''
+    Keep the intervals (the rows of a processed array, with the interval start
+    time in column 0) whose middle is within "window" (start, end: s from the
+    start of the test), e.g. the common run of simultaneous clients. Returns
+    the rows, the mean and standard deviation of column 1 (without the
+    missing values), and the number of rows removed. If nothing would be left, nothing
+    is removed.
+    '''
+    middle = data[:,0] + interval / 2.0
+    keep = (middle >= window[0]) & (middle <= window[1])
+    if not keep.any():
+        return data, np.nanmean(data[:,1]), np.nanstd(data[:,1]), 0
+
+    data = data[keep]
+    return data, np.nanmean(data[:,1]), np.nanstd(data[:,1]), int((~keep).sum())
+
+
+# An mpstat line: the time (12 or 24 hour), the CPU column, ..., %idle.
+_mpstat_line = re.compile(r'^(\d\d?:\d\d:\d\d)(?:[ \t]*([AP]M))?[ \t]+(\S+)[ \t][^\n]*[ \t](\S+)[ \t\r]*$', re.M)
+
+
+def _clock_seconds(clock, half):
+    h, m, sec = (int(x) for x in clock.split(':'))
+    if half:
+        h = h % 12 + (12 if half == 'PM' else 0)
+
+    return h * 3600 + m * 60 + sec
+
+
+def get_mpstat_data_single(mpstat_out, interval = None):
+    '''
+    Parse the output of "mpstat -P ALL <interval> <count>". Returns the
+    per-sample array (time, total CPU busy fraction, standard deviation of the
+    cores), and the mean and standard deviation of the total. The sampling
+    interval is taken from the first timestamps, unless "interval" is given.
+    An incomplete last sample (of an interrupted mpstat) is dropped.
+    '''
+    with open(mpstat_out, encoding='utf-8', errors='ignore') as inputfile:
+        found = _mpstat_line.findall(inputfile.read())
+
+    # Without the header lines (the CPU column reads "CPU" there).
+    fields = [f for f in found if f[2] != 'CPU']
+    cpu = np.array([f[2] for f in fields])
+    starts = np.flatnonzero(cpu == 'all')
+    if not starts.size:
+        raise ValueError('No CPU samples in ' + mpstat_out + '.')
+
+    idle = np.array([f[3] for f in fields], dtype=float)
+    # The per-core lines follow the "all" line of every sample.
+    num_cpu = (starts[1] if starts.size > 1 else cpu.size) - starts[0] - 1
+    sample = np.cumsum(cpu == 'all') - 1
+    per_core = (cpu != 'all') & (sample >= 0)
+    counts = np.bincount(sample[per_core], minlength = starts.size)
+    complete = np.flatnonzero(counts == num_cpu)
+    mpstat_data = idle[per_core & np.isin(sample, complete)].reshape((complete.size, num_cpu))
+    if interval is None:
+        interval = 0.0
+        if starts.size > 1:
+            first = fields[starts[0]]
+            second = fields[starts[1]]
+            interval = float((_clock_seconds(second[0], second[1]) - _clock_seconds(first[0], first[1])) % 86400)
+
+    num_measurements = mpstat_data.shape[0]
+    times = np.arange(num_measurements) * interval
+    mpstat_data = (1 - mpstat_data / 100) / num_cpu
+    tot_cpu_usage = mpstat_data.sum(axis=1)
+    core_stdev = np.std(mpstat_data, axis=1) * np.sqrt(num_cpu)
+    out_arr = np.vstack((times, tot_cpu_usage, core_stdev)).T
+    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std()
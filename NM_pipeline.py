@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Background post-processing of the finished tests.
+
+The parsing, exporting and plotting of a test is handed to a small pool of
+worker threads, so the test loop can go on to the next measurement right away.
+The heavy parts either run in NumPy or in a gnuplot subprocess, so threads are
+enough to overlap them with the measurements.
+'''
+
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+class PostProcessor(object):
+    '''
+    Runs the submitted jobs on "workers" background threads, in submission order.
+    With no workers, every job runs immediately in the calling thread.
+    '''
+    def __init__(self, workers):
+        if workers:
+            self.pool = ThreadPoolExecutor(max_workers = workers)
+        else:
+            self.pool = None
+
+    def submit(self, fn, *args, **kwargs):
+        if self.pool:
+            return self.pool.submit(fn, *args, **kwargs)
+
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as err:
+            future.set_exception(err)
+
+        return future
+
+    def drain(self):
+        '''
+        Wait for all the submitted jobs to finish.
+        '''
+        if self.pool:
+            self.pool.shutdown(wait = True)
+            self.pool = None
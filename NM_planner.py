@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Planning of the test matrix of a client pair.
+
+The tests of a pair are the (protocol, streams, size, direction) matrix. Run
+one by one, every test starts its own Iperf server and kills it once the
+client is done. The planner builds the whole matrix up front and groups the
+tests that can share one long-lived server: the same direction (server side),
+protocol, TCP window and port. The number of streams and the buffer/datagram
+size are client options, so they do not need a new server. The tests of a
+group are dispatched back to back, and a server is only restarted when the
+group changes.
+'''
+
+from collections import OrderedDict
+from datetime import timedelta
+
+directions = ['one2two', 'two2one']
+
+
+class PlannedRun(object):
+    '''
+    A single test of the matrix.
+    '''
+    def __init__(self, protocol, streams, size, direction):
+        self.protocol = protocol
+        self.streams = streams
+        self.size = size
+        self.direction = direction
+
+
+class ServerGroup(object):
+    '''
+    The tests that are served by one server, in the order they run.
+    '''
+    def __init__(self, protocol, tcpwin, direction, port = None):
+        self.protocol = protocol
+        self.tcpwin = tcpwin
+        self.direction = direction
+        self.port = port
+        self.runs = []
+
+    def describe(self):
+        '''
+        The tests of the group, by number of streams, e.g.
+        "1 st: 32B 64B; 2 st: 32B 64B".
+        '''
+        sizes = OrderedDict()
+        for run in self.runs:
+            sizes.setdefault(run.streams, []).append(str(run.size) + 'B')
+
+        return '; '.join(str(s) + ' st: ' + ' '.join(sizes[s]) for s in sizes)
+
+
+def build_matrix(protocols, stream_list, sizes):
+    '''
+    All the tests of a pair, in the order of the unplanned test loop: by
+    number of streams, then protocol, then direction, then size.
+    '''
+    return [PlannedRun(protocol, int(streams), size, direction)
+            for streams in stream_list
+            for protocol in protocols
+            for direction in directions
+            for size in sizes]
+
+
+def plan_runs(matrix, tcpwin, port = None, shared = True):
+    '''
+    Group the tests of "matrix" by the server they need. The groups keep the
+    order in which they are first needed, and the tests keep their order
+    within a group. Without "shared", every test gets a server of its own
+    (the unplanned order).
+    '''
+    groups = OrderedDict()
+    for run in matrix:
+        key = (run.protocol, tcpwin, port, run.direction) if shared else len(groups)
+        if key not in groups:
+            groups[key] = ServerGroup(run.protocol, tcpwin, run.direction, port)
+
+        groups[key].runs.append(run)
+
+    return list(groups.values())
+
+
+def print_plan(groups, tests, restart_cost, server_names = None):
+    '''
+    Print the planned schedule, and the time saved by the server restarts
+    that are avoided, with "restart_cost" seconds per restart. "tests" is the
+    number of tests (server starts without planning), "server_names" maps the
+    directions to the names of the serving clients.
+    '''
+    server_names = server_names or {'one2two': 'cl2', 'two2one': 'cl1'}
+    print('Planned schedule: ' + str(tests) + ' test(s) on ' + str(len(groups)) + ' server(s):')
+    for i, group in enumerate(groups):
+        print('  ' + str(i + 1) + '. ' + group.protocol + ' server on ' + server_names[group.direction] +
+              ' (' + group.direction + (', port ' + str(group.port) if group.port else '') + '): ' +
+              group.describe())
+
+    saved = (tests - len(groups)) * restart_cost
+    print('Server restarts avoided: ' + str(tests - len(groups)) + '. Estimated time saved: ' +
+          str(timedelta(seconds = int(saved))))
+    return saved
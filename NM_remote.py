@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+The command layer: runs the commands of the tests (locally, or on the clients
+through ssh/winexe) as asyncio subprocesses, without a local shell.
+
+A single event loop, in a background thread, drives all the commands of the
+process: the servers and clients of all the pairs, the stop commands and the
+readiness probes. Waiting for a command costs no thread and no polling. The
+output of a command is written straight into its output files, and every
+complete line can also be handed to a parser while the command runs (e.g.
+NM_live.LiveIperf).
+
+Coroutines (for code that runs on the loop): run(), spawn(), and
+RemoteProcess.finished(). The threaded test loop uses the blocking wrappers:
+call(), start(), and the Popen-like methods of RemoteProcess (poll, wait
+with a timeout, kill, send_signal), which can be called from any thread.
+'''
+
+import asyncio
+from threading import Thread, Event, Lock
+from subprocess import DEVNULL, PIPE, TimeoutExpired
+
+# The size of the reads from the output pipes (bytes).
+read_size = 65536
+# The exit code of a command that could not be started (as that of a shell).
+not_found = 127
+
+_loop = None
+_loop_lock = Lock()
+
+
+def get_loop():
+    '''
+    The event loop of the commands (started on first use).
+    '''
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(target = _loop.run_forever, name = 'commands', daemon = True).start()
+
+    return _loop
+
+
+def call(coro, timeout = None):
+    '''
+    Run the coroutine "coro" on the event loop, and wait for its result (from
+    any thread but that of the loop).
+    '''
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+async def run(cmd, timeout = None):
+    '''
+    Run the command "cmd" (a list) to completion. Returns the exit code and
+    the output and error output (bytes). If the command is not over in
+    "timeout" seconds, it is killed and the exit code is None.
+    '''
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdin = DEVNULL, stdout = PIPE, stderr = PIPE)
+    except OSError as err:
+        return not_found, b'', str(err).encode()
+
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        out, err = await proc.communicate()
+        return None, out, err
+
+    return proc.returncode, out, err
+
+
+class RemoteProcess(object):
+    '''
+    A command that runs on the event loop. Its output and error output go to
+    the files "outfile" and "errfile" (paths, or None to discard them), and
+    every complete output line is passed to "on_line", which may be changed
+    while the command runs (None: no parsing).
+    '''
+    def __init__(self, cmd, on_line = None):
+        self.cmd = cmd
+        self.on_line = on_line
+        self.returncode = None
+        self.proc = None
+        self.task = None
+        self.exited = Event()
+
+    async def _start(self, outfile, errfile):
+        out = open(outfile, 'wb') if outfile else None
+        err = open(errfile, 'wb') if errfile else None
+        try:
+            self.proc = await asyncio.create_subprocess_exec(*self.cmd, stdin = DEVNULL, stdout = PIPE,
+                                                             stderr = PIPE)
+        except OSError as e:
+            # As a shell would: the error goes to the error output.
+            if err:
+                err.write((str(e) + '\n').encode())
+
+            for f in (out, err):
+                if f:
+                    f.close()
+
+            self.returncode = not_found
+            self.exited.set()
+            return
+
+        self.task = asyncio.ensure_future(self._run(out, err))
+
+    async def _pump(self, stream, f, lines):
+        partial = b''
+        while True:
+            data = await stream.read(read_size)
+            if not data:
+                break
+
+            if f:
+                f.write(data)
+                # Whoever follows the file sees the output as it arrives.
+                f.flush()
+
+            if lines:
+                chunks = (partial + data).split(b'\n')
+                partial = chunks.pop()
+                on_line = self.on_line
+                if on_line:
+                    for line in chunks:
+                        on_line(line.decode('utf-8', errors='ignore'))
+
+        if lines and partial and self.on_line:
+            self.on_line(partial.decode('utf-8', errors='ignore'))
+
+    async def _run(self, out, err):
+        try:
+            await asyncio.gather(self._pump(self.proc.stdout, out, True),
+                                 self._pump(self.proc.stderr, err, False))
+            self.returncode = await self.proc.wait()
+        finally:
+            for f in (out, err):
+                if f:
+                    f.close()
+
+            self.exited.set()
+
+    async def finished(self):
+        '''
+        Wait (on the loop) until the command exits. Returns its exit code.
+        '''
+        if self.task:
+            await self.task
+
+        return self.returncode
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    def poll(self):
+        return self.returncode if self.exited.is_set() else None
+
+    def wait(self, timeout = None):
+        '''
+        Wait until the command exits and all its output is written. Raises
+        subprocess.TimeoutExpired if it does not exit in "timeout" seconds.
+        '''
+        if not self.exited.wait(timeout):
+            raise TimeoutExpired(self.cmd, timeout)
+
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.proc is not None and not self.exited.is_set():
+            get_loop().call_soon_threadsafe(self._signal, sig)
+
+    def _signal(self, sig):
+        try:
+            self.proc.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        if self.proc is not None and not self.exited.is_set():
+            get_loop().call_soon_threadsafe(self._kill)
+
+    def _kill(self):
+        try:
+            self.proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def spawn(cmd, outfile = None, errfile = None, on_line = None):
+    '''
+    Start the command "cmd" (a list) as a RemoteProcess.
+    '''
+    p = RemoteProcess(cmd, on_line)
+    await p._start(outfile, errfile)
+    return p
+
+
+def start(cmd, outfile = None, errfile = None, on_line = None):
+    '''
+    spawn(), from a thread.
+    '''
+    return call(spawn(cmd, outfile, errfile, on_line))
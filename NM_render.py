@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Plot renderers.
+
+NetMeter and NM_compare describe every chart as a dictionary (a "chart"): its
+type ('singlesize', 'multisize' or 'comparison'), the output file, the data
+files, and the titles and labels. A renderer turns charts into images:
+
+    gnuplot    - runs the gnuplot script written for the chart ("script" key),
+                 through persistent gnuplot processes (see NM_gnuplot.py).
+    matplotlib - draws the same charts in-process, directly from the data files
+                 (binary or text, see NM_store.py), without any gnuplot scripts.
+                 Needs matplotlib (optional). Many charts can be drawn at once
+                 on a pool of processes.
+
+All the paths in a chart are relative to the directory passed to render().
+'''
+
+import sys
+from os import cpu_count
+from os.path import join, abspath
+from subprocess import Popen
+from importlib.util import find_spec
+from concurrent.futures import ProcessPoolExecutor
+
+from NM_gnuplot import GnuplotPool
+from NM_store import load_table
+
+renderers = {}
+
+
+def register(name):
+    def add(cls):
+        renderers[name] = cls
+        return cls
+
+    return add
+
+
+def get_renderer(name, **opts):
+    '''
+    Create the renderer "name" with the given options. Raises ImportError if the
+    backend needs a package that is not installed.
+    '''
+    if name not in renderers:
+        raise ValueError('Unknown plot backend: ' + str(name) + ' (use one of: ' +
+                         ', '.join(sorted(renderers)) + ')')
+
+    return renderers[name](**opts)
+
+
+class Renderer(object):
+    # True if the charts need a gnuplot script to be written first.
+    needs_script = False
+
+    def render(self, chart, cwd = '.'):
+        '''
+        Draw one chart. Returns True on success.
+        '''
+        raise NotImplementedError
+
+    def render_many(self, charts, cwd = '.'):
+        return [self.render(c, cwd) for c in charts]
+
+    def close(self):
+        pass
+
+
+@register('gnuplot')
+class GnuplotRenderer(Renderer):
+    needs_script = True
+
+    def __init__(self, gnuplot_bin = 'gnuplot', workers = 1, persistent = True, **_):
+        self.gnuplot_bin = gnuplot_bin
+        self.pool = GnuplotPool(gnuplot_bin, workers) if persistent else None
+
+    def render(self, chart, cwd = '.'):
+        script = chart['script']
+        if self.pool:
+            return self.pool.render(script, cwd)
+
+        return Popen([self.gnuplot_bin, script], cwd = cwd).wait() == 0
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+
+
+@register('matplotlib')
+class MatplotlibRenderer(Renderer):
+    def __init__(self, workers = None, **_):
+        # Fail early (on creation) if matplotlib is missing.
+        if find_spec('matplotlib') is None:
+            raise ImportError("No module named 'matplotlib'")
+        self.workers = workers
+
+    def render(self, chart, cwd = '.'):
+        try:
+            draw_chart(chart, cwd)
+            return True
+        except Exception as err:
+            print('\033[91mERROR:\033[0m Could not draw ' + join(cwd, chart['output']) +
+                  ' (' + repr(err) + ').', file = sys.stderr)
+            return False
+
+    def render_many(self, charts, cwd = '.'):
+        if len(charts) < 2:
+            return Renderer.render_many(self, charts, cwd)
+
+        workers = min(self.workers or cpu_count() or 1, len(charts))
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            return list(pool.map(_render_one, charts, [cwd] * len(charts)))
+
+
+def _render_one(chart, cwd):
+    return MatplotlibRenderer().render(chart, cwd)
+
+
+###################### matplotlib drawing ######################
+
+# Sizes and fonts as in the gnuplot scripts.
+_png_size = (1024, 768)
+_pdf_size = (29.7 / 2.54, 21.0 / 2.54)
+# The colors of the CPU plots of the machines (as those of the gnuplot scripts).
+_cpu_colors = ['red', 'darkgreen', 'orange', 'purple']
+# The colors of the NIC rates of the sender and the receiver.
+_nic_colors = ['steelblue', 'darkcyan']
+
+
+def print_size(x):
+    if x < 1024.0:
+        return format(x, '.0f') + 'B'
+    elif x < 1048576.0:
+        return format(x / 1024.0, '.0f') + 'KB'
+    else:
+        return format(x / 1048576.0, '.0f') + 'MB'
+
+
+def _figure(size, dpi = 100):
+    from matplotlib.figure import Figure
+    return Figure(figsize = size, dpi = dpi)
+
+
+def _band(ax, x, mean, stdev, color):
+    ax.fill_between(x, mean - stdev, mean + stdev, color = color, alpha = 0.2, linewidth = 0)
+
+
+def _size_axis(ax, sizes):
+    ax.set_xscale('log', base = 2)
+    ax.set_xticks(sizes)
+    ax.set_xticklabels([print_size(s) for s in sizes], rotation = -30)
+    ax.minorticks_off()
+
+
+def _cpu_axis(ax, cwd, proc_files, x_column):
+    ax2 = ax.twinx()
+    ax2.set_ylabel('CPU busy time fraction')
+    ax2.set_ylim(0, 1)
+    for (proc_file, title), color in zip(proc_files, _cpu_colors):
+        data = load_table(join(cwd, proc_file))
+        _band(ax2, data[:,x_column], data[:,x_column + 1], data[:,x_column + 2], color)
+        ax2.plot(data[:,x_column], data[:,x_column + 1], '+', color = color, markersize = 9,
+                 markeredgewidth = 2, label = title)
+
+    return ax2
+
+
+def _nic_lines(ax, cwd, nic_file, rf):
+    # The rates that the interfaces counted (columns 3 and 4, see NM_niccheck.py).
+    data = load_table(join(cwd, nic_file))
+    for column, marker, title, color in zip((2, 3), ('o', 's'), ('Sender NIC', 'Receiver NIC'), _nic_colors):
+        ax.plot(data[:,0], data[:,column] / rf, '--' + marker, color = color, markersize = 5,
+                markerfacecolor = 'none', label = title)
+
+
+def _legend(fig, axes):
+    handles = []
+    labels = []
+    for ax in axes:
+        h, l = ax.get_legend_handles_labels()
+        handles += h
+        labels += l
+
+    if handles:
+        fig.legend(handles, labels, loc = 'lower center', ncol = len(handles), frameon = True)
+
+
+def draw_single(chart, cwd):
+    fig = _figure((_png_size[0] / 100.0, _png_size[1] / 100.0))
+    ax = fig.add_axes([0.1, 0.17, 0.8 if chart.get('proc_files') else 0.85, 0.68])
+    rf = chart['rate_factor']
+    data = load_table(join(cwd, chart['net_file']))
+    t, bw, std = data[:,0], data[:,1] / rf, data[:,2] / rf
+    _band(ax, t, bw, std, 'blue')
+    ax.plot(t, bw, 'x', color = 'blue', markersize = 9, markeredgewidth = 2,
+            label = 'Mean tot. ' + chart.get('short', 'BW'))
+    if t.size and t.max() > t.min():
+        ax.set_xlim(t.min(), t.max())
+
+    if chart.get('nic_file'):
+        _nic_lines(ax, cwd, chart['nic_file'], rf)
+
+    axes = [ax]
+    if chart.get('proc_files'):
+        axes.append(_cpu_axis(ax, cwd, chart['proc_files'], 0))
+
+    return fig, ax, axes
+
+
+def draw_multi(chart, cwd):
+    fig = _figure((_png_size[0] / 100.0, _png_size[1] / 100.0))
+    ax = fig.add_axes([0.1, 0.2, 0.8 if chart.get('proc_files') else 0.85, 0.65])
+    rf = chart['rate_factor']
+    data = load_table(join(cwd, chart['net_file']))
+    status, sizes, bw, std = data[:,0], data[:,1], data[:,2] / rf, data[:,3] / rf
+    ran = status >= 0
+    _band(ax, sizes[ran], bw[ran], std[ran], 'blue')
+    if status.all():
+        ax.plot(sizes[ran], bw[ran], 'x', color = 'blue', markersize = 9, markeredgewidth = 2,
+                label = 'Mean tot. ' + chart.get('short', 'BW'))
+    else:
+        if status[ran].any():
+            ax.plot(sizes[ran], bw[ran], 'x', color = 'blue', markersize = 9, markeredgewidth = 2,
+                    label = 'Mean tot. ' + chart.get('short', 'BW'))
+
+        ax.plot(sizes[status == 0], bw[status == 0], 'x', color = 'magenta', markersize = 9,
+                markeredgewidth = 2, label = 'Approx. ' + chart.get('short', 'BW'))
+
+    for s, b in zip(sizes[ran], bw[ran]):
+        ax.annotate(format(b, '.2f') + ' ' + chart['rate_units'], (s, b), xytext = (9, 10),
+                    textcoords = 'offset points', rotation = 90, fontsize = 9)
+
+    low = bw[ran].min() if ran.any() else 0.0
+    for s in sizes[~ran]:
+        ax.annotate('Net test failed!', (s, low), xytext = (9, 25), textcoords = 'offset points',
+                    rotation = 90, fontsize = 9, color = 'red')
+
+    if chart.get('nic_file'):
+        _nic_lines(ax, cwd, chart['nic_file'], rf)
+
+    _size_axis(ax, sizes)
+    axes = [ax]
+    if chart.get('proc_files'):
+        axes.append(_cpu_axis(ax, cwd, chart['proc_files'], 0))
+
+    return fig, ax, axes
+
+
+def draw_test(chart, cwd):
+    if chart['type'] == 'singlesize':
+        fig, ax, axes = draw_single(chart, cwd)
+    else:
+        fig, ax, axes = draw_multi(chart, cwd)
+
+    ax.set_title(chart['title'] + '\n' + chart['subtitle'], fontsize = 13)
+    ax.set_xlabel(chart['xlabel'])
+    ax.set_ylabel(chart.get('quantity', 'Bandwidth') + ' (' + chart['rate_units'] + ')')
+    if chart.get('scientific'):
+        ax.ticklabel_format(axis = 'y', style = 'sci', scilimits = (0, 0))
+
+    if chart.get('warning'):
+        fig.text(0.01, 0.99, chart['warning'], color = 'red', va = 'top', fontsize = 10)
+
+    _legend(fig, axes)
+    return fig
+
+
+def _comparison_block(fig, rect, cwd, data_unit, block):
+    '''
+    One row of a comparison page: bandwidth on the left, CPU usage on the right.
+    '''
+    left = fig.add_axes([rect[0], rect[1], 0.4, rect[2]])
+    right = fig.add_axes([rect[0] + 0.5, rect[1], 0.4, rect[2]])
+    rf = block['rate_factor']
+    all_sizes = []
+    for version, color, height in (('old', 'red', 25), ('new', 'blue', 60)):
+        data = load_table(join(cwd, block[version + '_iperf']))
+        status, sizes, bw, std = data[:,0], data[:,1], data[:,2] / rf, data[:,3] / rf
+        ran = status >= 0
+        _band(left, sizes[ran], bw[ran], std[ran], color)
+        left.plot(sizes[ran], bw[ran], 'x', color = color, label = 'Mean - ' + version)
+        if not status[ran].all():
+            left.plot(sizes[status == 0], bw[status == 0], 'x',
+                      color = 'cyan' if version == 'old' else 'magenta', label = 'Approx. - ' + version)
+
+        for s in sizes[~ran]:
+            left.annotate(version.capitalize() + ' failed!', (s, 0), xytext = (9, height),
+                          textcoords = 'offset points', rotation = 90, fontsize = 8, color = color)
+
+        all_sizes += list(sizes)
+
+    _size_axis(left, sorted(set(all_sizes)))
+    left.set_ylim(bottom = 0)
+    left.set_title(block['title'])
+    left.set_xlabel(data_unit + ' size')
+    left.set_ylabel('Bandwidth (' + block['rate_units'] + ')')
+    left.legend(loc = 'upper center', bbox_to_anchor = (0.5, -0.25), ncol = 4, fontsize = 8)
+    if block.get('old_mpstat') and block.get('new_mpstat'):
+        all_sizes = []
+        for version, color in (('old', 'red'), ('new', 'blue')):
+            data = load_table(join(cwd, block[version + '_mpstat']))
+            _band(right, data[:,0], data[:,1], data[:,2], color)
+            right.plot(data[:,0], data[:,1], '+', color = color, label = 'Mean tot. CPU - ' + version)
+            all_sizes += list(data[:,0])
+
+        _size_axis(right, sorted(set(all_sizes)))
+
+        right.set_ylim(0, 1)
+        right.set_title(block['title'])
+        right.set_xlabel(data_unit)
+        right.set_ylabel('CPU busy time fraction')
+        right.legend(loc = 'upper center', bbox_to_anchor = (0.5, -0.25), ncol = 2, fontsize = 8)
+    else:
+        right.set_facecolor('#ffffee')
+        right.set_xticks([])
+        right.set_yticks([])
+        right.text(0.5, 0.5, 'No CPU results found', ha = 'center', va = 'center',
+                   fontsize = 18, transform = right.transAxes)
+
+
+def draw_comparison(chart, cwd):
+    fig = _figure(_pdf_size)
+    fig.text(0.01, 0.99, 'Old: ' + chart['old_label'] + '\nNew: ' + chart['new_label'], va = 'top', fontsize = 11)
+    fig.text(0.254, 0.91, 'Bandwidth Comparison', ha = 'center', fontsize = 16)
+    fig.text(0.756, 0.91, 'CPU Usage Comparison', ha = 'center', fontsize = 16)
+    for block, (y, height) in zip(chart['blocks'], ((0.55, 0.28), (0.1, 0.28))):
+        if block.get('missing'):
+            fig.patches.append(_rectangle(fig, (0, y - 0.1), 1.0, height + 0.15))
+            fig.text(0.5, y + height / 2, '\n'.join(block['missing']), ha = 'center', va = 'center', fontsize = 18)
+        else:
+            _comparison_block(fig, (0.06, y, height), cwd, chart['data_unit'], block)
+
+    return fig
+
+
+def _rectangle(fig, xy, width, height):
+    from matplotlib.patches import Rectangle
+    return Rectangle(xy, width, height, transform = fig.transFigure, facecolor = '#ffcccc',
+                     edgecolor = 'none', zorder = -1)
+
+
+def draw_chart(chart, cwd = '.'):
+    '''
+    Draw a chart and save it to its output file (png or pdf, by the extension).
+    '''
+    if chart['type'] == 'comparison':
+        fig = draw_comparison(chart, cwd)
+    else:
+        fig = draw_test(chart, cwd)
+
+    fig.savefig(join(cwd, chart['output']))
+    return abspath(join(cwd, chart['output']))
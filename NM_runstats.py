@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Running statistics for the ping and latency parsers.
+
+RunningStats and WindowedStats update the mean and the variance one sample at
+a time (Welford's method), so a statistic "so far" never has to be recomputed
+from all the previous samples. prefix_std and rolling_std do the same for
+whole arrays at once. Missing samples (NaN or masked) are skipped everywhere.
+confidence_interval (and RunningStats.ci_halfwidth) give the Student's t
+confidence interval of the mean, e.g. to decide when a test ran long enough.
+'''
+
+import numpy as np
+from collections import deque
+from math import atan, cos, sin, sqrt, pi
+from statistics import NormalDist
+
+
+def _t_cdf(t, df):
+    '''
+    The distribution function of Student's t with a whole number "df" of
+    degrees of freedom, at t >= 0 (its closed form: a finite series in the
+    cosine of atan(t / sqrt(df))).
+    '''
+    theta = atan(t / sqrt(df))
+    c2 = cos(theta)**2
+    term = total = 1.0
+    if df % 2:
+        for k in range(1, (df - 1) // 2):
+            term *= c2 * 2 * k / (2 * k + 1)
+            total += term
+        inside = 2 / pi * (theta + (sin(theta) * cos(theta) * total if df > 1 else 0.0))
+    else:
+        for k in range(1, df // 2):
+            term *= c2 * (2 * k - 1) / (2 * k)
+            total += term
+        inside = sin(theta) * total
+
+    return 0.5 + inside / 2.0
+
+
+def t_quantile(p, df):
+    '''
+    The "p" quantile of Student's t distribution with "df" degrees of freedom.
+    Exact (the closed-form distribution function, inverted by bisection) up
+    to 30 degrees of freedom; above, the Cornish-Fisher expansion around the
+    normal quantile, which is then within 0.01% up to 99.9% intervals.
+    '''
+    if df <= 0:
+        return float('inf')
+    if p < 0.5:
+        return -t_quantile(1.0 - p, df)
+
+    if df <= 30 and df == int(df):
+        low, high = 0.0, 1.0
+        while _t_cdf(high, int(df)) < p:
+            low, high = high, high * 2
+        for _ in range(100):
+            middle = (low + high) / 2.0
+            if middle in (low, high):
+                break
+            if _t_cdf(middle, int(df)) < p:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2.0
+
+    z = NormalDist().inv_cdf(p)
+    return (z + (z**3 + z) / (4.0 * df) + (5 * z**5 + 16 * z**3 + 3 * z) / (96.0 * df**2) +
+            (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384.0 * df**3))
+
+
+def ci_halfwidth(stdev, count, confidence = 0.95):
+    '''
+    The half width of the confidence interval of the mean of "count" samples
+    with the sample standard deviation "stdev". Infinite for fewer than 2.
+    '''
+    if count < 2:
+        return float('inf')
+
+    return t_quantile(0.5 + confidence / 2.0, count - 1) * stdev / np.sqrt(count)
+
+
+class RunningStats(object):
+    '''
+    Mean and (population) standard deviation of all the samples pushed so far.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value):
+        if value is np.ma.masked or np.isnan(value):
+            return
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        if not self.count:
+            return 0.0
+
+        return self.m2 / self.count
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def ci_halfwidth(self, confidence = 0.95):
+        '''
+        The half width of the confidence interval of the mean so far.
+        '''
+        if self.count < 2:
+            return float('inf')
+
+        return ci_halfwidth(np.sqrt(self.m2 / (self.count - 1)), self.count, confidence)
+
+
+class WindowedStats(RunningStats):
+    '''
+    Like RunningStats, but only over the last "window" samples.
+    '''
+    def __init__(self, window):
+        RunningStats.__init__(self)
+        self.window = window
+        self.samples = deque()
+
+    def push(self, value):
+        if value is np.ma.masked or np.isnan(value):
+            return
+
+        self.samples.append(value)
+        if len(self.samples) <= self.window:
+            RunningStats.push(self, value)
+            return
+
+        # Replace the oldest sample by the new one.
+        old = self.samples.popleft()
+        old_mean = self.mean
+        self.mean += (value - old) / self.count
+        self.m2 += (value - old) * (value - self.mean + old - old_mean)
+        self.m2 = max(self.m2, 0.0)
+
+
+def _valid(values):
+    '''
+    The samples as a float array with zeros in place of the missing ones, and the
+    mask of the present ones.
+    '''
+    values = np.ma.masked_invalid(np.ma.asarray(values, dtype=float))
+    present = ~np.ma.getmaskarray(values)
+    return values.filled(0.0), present
+
+
+def prefix_std(values):
+    '''
+    out[i] = standard deviation of values[0:i] (i.e. of all the samples before
+    sample i), as in the original per-sample loops of the ping parsers, but in
+    linear time. Where there are no samples yet (e.g. sample 0), the result
+    is NaN, as the standard deviation of an empty array.
+    '''
+    data, present = _valid(values)
+    if not present.any():
+        return np.full(data.shape, np.nan)
+
+    # Shifting by the mean keeps the sums of squares small, so that the
+    # difference below does not lose the precision of the variance.
+    data = np.where(present, data - data[present].mean(), 0.0)
+    count = np.concatenate(([0], np.cumsum(present)))[:-1]
+    s1 = np.concatenate(([0.0], np.cumsum(data)))[:-1]
+    s2 = np.concatenate(([0.0], np.cumsum(data * data)))[:-1]
+    n = np.maximum(count, 1)
+    var = np.maximum(s2 / n - (s1 / n) ** 2, 0.0)
+    return np.where(count > 0, np.sqrt(var), np.nan)
+
+
+def rolling_std(values, window):
+    '''
+    out[i] = standard deviation of the (present) samples in values[i-window+1:i+1].
+    Used as the jitter of the round trip times over the last "window" pings.
+    NaN where the window has no samples.
+    '''
+    data, present = _valid(values)
+    if not present.any():
+        return np.full(data.shape, np.nan)
+
+    data = np.where(present, data - data[present].mean(), 0.0)
+
+    def window_sums(x):
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        start = np.maximum(np.arange(1, len(x) + 1) - window, 0)
+        return c[1:] - c[start]
+
+    count = window_sums(present.astype(float))
+    s1 = window_sums(data)
+    s2 = window_sums(data * data)
+    n = np.maximum(count, 1)
+    var = np.maximum(s2 / n - (s1 / n) ** 2, 0.0)
+    # The counts are differences of float sums: an empty window is ~0.
+    return np.where(count > 0.5, np.sqrt(var), np.nan)
+
+
+def confidence_interval(values, confidence = 0.95):
+    '''
+    The mean of the (present) values, the half width of its confidence
+    interval, and the number of values.
+    '''
+    data, present = _valid(values)
+    data = data[present]
+    if not data.size:
+        return float('nan'), float('inf'), 0
+
+    stdev = data.std(ddof = 1) if data.size > 1 else 0.0
+    return data.mean(), ci_halfwidth(stdev, data.size, confidence), data.size
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Event-driven pacing for the test loop.
+
+Instead of sleeping for a fixed time after every server start, client run and
+server stop, the test loop waits for the event it actually needs (the server
+banner or listening socket, the client process exit, the server port being
+closed). The old fixed delays survive only as upper-bound timeouts.
+
+The time the test loop spends in each of its phases (server start, client
+run, processing...) is accounted by a PhaseTimer, e.g. for the orchestration
+benchmarks of NM_netns.py.
+'''
+
+import numpy as np
+from time import sleep, monotonic
+from threading import Lock
+from functools import wraps
+from contextlib import contextmanager
+from collections import OrderedDict
+from subprocess import TimeoutExpired
+from os import replace, fsync
+from os.path import isfile, getsize, getmtime, abspath
+
+# Upper bounds (s) for each of the waits. These are the old fixed sleeps.
+server_start_timeout = 10.0
+server_stop_timeout = 10.0
+client_grace_timeout = 12.0
+# How long the server output has to stay unchanged to be considered flushed (s).
+server_settle_time = 0.5
+# Polling period of all the waits (s).
+poll_period = 0.1
+# Used for the time estimates until some overhead was actually measured (s).
+default_overhead = 3.0
+# How many of the last overhead measurements the estimates are based on (and are kept).
+max_overhead_samples = 50
+
+server_banner = 'Server listening'
+
+
+def wait_until(condition, timeout, period = poll_period, wake = None):
+    '''
+    Poll "condition" until it returns True, or until "timeout" seconds pass.
+    Returns True if the condition was met, and False on timeout. Setting the
+    Event "wake" checks the condition right away, without waiting for the
+    next poll.
+    '''
+    deadline = monotonic() + timeout
+    while True:
+        if condition():
+            return True
+
+        if monotonic() >= deadline:
+            return False
+
+        if wake is not None:
+            wake.wait(period)
+        else:
+            sleep(period)
+
+
+def file_contains(paths, marker):
+    for path in paths:
+        if isfile(path):
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                if marker in f.read():
+                    return True
+
+    return False
+
+
+def wait_for_server(paths, probe = None, timeout = server_start_timeout, banner = server_banner):
+    '''
+    Wait for the Iperf server to become ready: either its banner appears in one
+    of the output files, or "probe" (if given) reports a listening socket.
+    '''
+    def ready():
+        if file_contains(paths, banner):
+            return True
+
+        return bool(probe and probe())
+
+    # The probe may be a remote command, so it is polled less often.
+    return wait_until(ready, timeout, period = 0.5 if probe else poll_period)
+
+
+def wait_for_exit(proc, timeout):
+    '''
+    Wait for a Popen process (or an NM_remote.RemoteProcess) to exit.
+    Returns True if it exited in time.
+    '''
+    try:
+        proc.wait(timeout = timeout)
+        return True
+    except TimeoutExpired:
+        return False
+
+
+def wait_for_quiet(path, quiet = server_settle_time, timeout = server_stop_timeout):
+    '''
+    Wait until the file at "path" has not been modified for "quiet" seconds.
+    Used to let the server flush its last interval reports.
+    '''
+    state = {'stamp': None, 'since': monotonic()}
+
+    def settled():
+        stamp = (getsize(path), getmtime(path)) if isfile(path) else None
+        now = monotonic()
+        if stamp != state['stamp']:
+            state['stamp'] = stamp
+            state['since'] = now
+            return False
+
+        return now - state['since'] >= quiet
+
+    return wait_until(settled, timeout)
+
+
+class OverheadTracker(object):
+    '''
+    Keeps the measured per-test overhead (time spent on top of the Iperf run
+    time itself) and gives run time estimates based on it. The last
+    "max_overhead_samples" measurements can be persisted, so the next
+    campaign starts with a realistic estimate. The pairs that run at the
+    same time share one tracker per store (see overhead_tracker()).
+    '''
+    def __init__(self, store = None):
+        self.store = store
+        self.lock = Lock()
+        self.samples = []
+        if store and isfile(store):
+            try:
+                self.samples = list(np.atleast_1d(np.loadtxt(store)))[-max_overhead_samples:]
+            except ValueError as err:
+                print('\033[93mWARNING:\033[0m Ignoring the overhead measurements of ' + store +
+                      ' (' + str(err) + ').')
+
+    def record(self, elapsed, runtime):
+        with self.lock:
+            self.samples.append(max(elapsed - runtime, 0.0))
+            del self.samples[:-max_overhead_samples]
+            if self.store:
+                self._save()
+
+    def _save(self):
+        # Written aside and renamed, so that the store is never left half written.
+        tmp = self.store + '.tmp'
+        with open(tmp, 'w') as f:
+            np.savetxt(f, self.samples, fmt='%g', header='Overhead(s)')
+            f.flush()
+            fsync(f.fileno())
+
+        replace(tmp, self.store)
+
+    def overhead(self):
+        with self.lock:
+            if self.samples:
+                return float(np.median(self.samples))
+            else:
+                return default_overhead
+
+    def estimate(self, runtime, points, extra = 0.0):
+        return points * (runtime + self.overhead()) + extra
+
+
+_trackers = {}
+_trackers_lock = Lock()
+
+
+def overhead_tracker(store):
+    '''
+    The OverheadTracker of the file "store", shared by all its users (e.g.
+    the pairs that run at the same time), so that their measurements add up
+    instead of overwriting each other.
+    '''
+    key = abspath(store)
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = OverheadTracker(store)
+
+        return _trackers[key]
+
+
+class PhaseTimer(object):
+    '''
+    The wall-clock time spent in every phase of a campaign, summed over the
+    tests and the threads that run them (so the phases of simultaneous pairs,
+    and those that run in the background, can add up to more than the
+    campaign). Phases can be nested: every phase is timed on its own.
+
+        with phases('server_start'):
+            ...
+    '''
+    def __init__(self):
+        self.lock = Lock()
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def __call__(self, name):
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, monotonic() - start)
+
+    def timed(self, name):
+        '''
+        A decorator that times every call of a function as the phase "name".
+        '''
+        def decorate(function):
+            @wraps(function)
+            def timed_call(*args, **kwargs):
+                with self(name):
+                    return function(*args, **kwargs)
+
+            return timed_call
+
+        return decorate
+
+    def add(self, name, elapsed):
+        with self.lock:
+            count, total, longest = self.phases.get(name, (0, 0.0, 0.0))
+            self.phases[name] = (count + 1, total + elapsed, max(longest, elapsed))
+
+    def reset(self):
+        with self.lock:
+            self.phases.clear()
+
+    def summary(self):
+        '''
+        Every phase (in the order they first ran): its name, how many times
+        it ran, and the total, mean and longest time (s).
+        '''
+        with self.lock:
+            return [(name, count, total, total / count, longest)
+                    for name, (count, total, longest) in self.phases.items()]
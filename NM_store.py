@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020, Dick Carrillo
+# All rights reserved.
+#
+# For documentation please refer to README.md
+#
+# This code is licensed under standard 3-clause BSD license.
+# See file LICENSE supplied with this package for the full license text.
+
+'''
+Binary result store.
+
+Every result array (the processed per-interval data of a test, or the summary
+of a test series) can be kept next to its text .dat file as a pair of files:
+
+    <name>.npy  - the array, in NumPy's binary format (can be memory-mapped)
+    <name>.json - the metadata: the column names, the text header, and the test
+                  parameters (protocol, streams, direction, size, names, ...)
+
+Loading a .npy file is much faster than parsing the text, and with mmap only
+the parts of the array that are actually used are read from the disk. The text
+files that gnuplot needs can always be regenerated from the binary ones.
+
+Usage:
+    python3 NM_store.py show FILE...      print the metadata and the shape
+    python3 NM_store.py export FILE...    (re)write the gnuplot text files
+    python3 NM_store.py import FILE...    store existing text results in binary
+'''
+
+import sys
+import json
+import numpy as np
+from os.path import isfile, basename
+
+data_suffix = '.npy'
+meta_suffix = '.json'
+text_suffix = '.dat'
+
+
+def result_name(path):
+    '''
+    The common name of the files of a result, i.e. the path without the suffix.
+    '''
+    for suffix in (data_suffix, meta_suffix, text_suffix):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+
+    return path
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, np.ndarray):
+        return value.tolist()
+    else:
+        return str(value)
+
+
+def save_result(name, data, header, **meta):
+    '''
+    Save "data" (2D, one row per line of the text file) as "name".npy, and its
+    text "header" and the rest of the metadata as "name".json.
+    '''
+    data = np.asarray(data, dtype=float)
+    meta = dict(meta)
+    meta['header'] = header
+    meta['columns'] = header.split()
+    meta['shape'] = list(data.shape)
+    np.save(name + data_suffix, data)
+    with open(name + meta_suffix, 'w') as f:
+        json.dump(meta, f, indent=1, sort_keys=True, default=_jsonable)
+
+
+def load_meta(name):
+    name = result_name(name)
+    with open(name + meta_suffix) as f:
+        return json.load(f)
+
+
+def load_result(name, mmap = True):
+    '''
+    Load a result saved by save_result. Returns (data, metadata). With "mmap",
+    the array is a read-only view of the file, which is read only when used.
+    '''
+    name = result_name(name)
+    data = np.load(name + data_suffix, mmap_mode = 'r' if mmap else None)
+    return data, load_meta(name)
+
+
+def has_result(name):
+    name = result_name(name)
+    return isfile(name + data_suffix) and isfile(name + meta_suffix)
+
+
+def load_table(path):
+    '''
+    Load a result table, preferring the binary file over the text one.
+    '''
+    if has_result(path):
+        return load_result(path)[0]
+
+    return np.loadtxt(result_name(path) + text_suffix, ndmin=2)
+
+
+def export_text(name, outname = None):
+    '''
+    Write the gnuplot-compatible text file of a stored result.
+    '''
+    name = result_name(name)
+    data, meta = load_result(name)
+    if outname is None:
+        outname = name + text_suffix
+
+    np.savetxt(outname, data, fmt='%g', header=meta['header'])
+    return outname
+
+
+def name_meta(path):
+    '''
+    The metadata that can be read from a default NetMeter file name:
+    <protocol>_<streams>_st_<date>_<time>_<direction>[_<size>B]_<kind>.dat
+    '''
+    fields = basename(result_name(path)).split('_')
+    meta = {}
+    try:
+        meta['protocol'] = fields[0]
+        meta['streams'] = int(fields[1])
+        meta['direction'] = [f for f in fields if f in ('one2two', 'two2one')][0]
+        sizes = [f for f in fields if f.endswith('B') and f[:-1].isdigit()]
+        if sizes:
+            meta['size'] = int(sizes[0][:-1])
+
+        meta['kind'] = '_'.join(fields[fields.index(meta['direction']) + 1 + len(sizes):])
+    except (IndexError, ValueError):
+        pass
+
+    return meta
+
+
+def import_text(path):
+    '''
+    Store an existing text result (e.g. of an older run) in binary form.
+    '''
+    name = result_name(path)
+    with open(name + text_suffix) as f:
+        first = f.readline()
+
+    header = first[1:].strip() if first.startswith('#') else ''
+    data = np.loadtxt(name + text_suffix, ndmin=2)
+    save_result(name, data, header, **name_meta(name))
+    return name + data_suffix
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('show', 'export', 'import'):
+        print('Usage: python3 NM_store.py show|export|import FILE...')
+        sys.exit(2)
+
+    for path in sys.argv[2:]:
+        if sys.argv[1] == 'import':
+            print('Stored ' + import_text(path))
+            continue
+
+        if not has_result(path):
+            print('\033[91mERROR:\033[0m No stored result for ' + path + '.')
+            continue
+
+        if sys.argv[1] == 'export':
+            print('Exported ' + export_text(path))
+        else:
+            data, meta = load_result(path)
+            print(result_name(path) + ': ' + ' x '.join(str(n) for n in data.shape))
+            for key in sorted(meta):
+                print('    ' + key + ': ' + str(meta[key]))
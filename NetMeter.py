@@ -11,49 +11,216 @@
 # See file LICENSE supplied with this package for the full license text.
 
 import numpy as np
+import re
 import sys
 import signal
+import atexit
+import argparse
+from types import ModuleType
+from importlib import import_module
 from datetime import datetime, timedelta
-from time import sleep
-from subprocess import Popen, PIPE
-from os import makedirs
-from os.path import isdir, isfile, join
+from time import sleep, monotonic, time
+from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+from os import makedirs, getpid
+from os.path import isdir, isfile, join, getsize
+from tempfile import gettempdir
+from threading import Lock
+from collections import OrderedDict
 from ntpath import dirname, basename
 
+from NM_scheduler import (wait_for_server, wait_for_exit, wait_for_quiet, wait_until,
+                          overhead_tracker, PhaseTimer, server_stop_timeout, client_grace_timeout,
+                          server_banner)
+from NM_pipeline import PostProcessor
+from NM_parsers import get_mpstat_data_single, report_repetitions, mpstat_interval, mpstat_args, trim_to_window
+from NM_live import LiveIperf, StatusServer
+from NM_runstats import confidence_interval
+from NM_store import save_result
+from NM_index import catalog
+from NM_render import get_renderer
+from NM_kinds import get_kind, get_topology, kinds, topologies
+from NM_planner import build_matrix, plan_runs, print_plan, directions
+from NM_journal import Journal, point_key
+from NM_fanout import skew_summary
+from NM_remote import run, spawn, call, start as start_command
+from NM_cpustat import (CpuSampler, CpuSamples, RemoteSampler, cores_table, detail_header, cores_header,
+                        net_header, telemetry_script, available as cpustat_available)
+from NM_niccheck import iface_of, payload_rates, compare, diverged, describe, nic_header
+
 # Import configuration
 from NetMeterConfig import *
 
 rundate = datetime.now().strftime('%Y_%m_%d_%H-%M-%S')
+# The port Iperf uses when none is given explicitly.
+default_iperf_port = 5001
+# The exit codes of the stop scripts (see port_stop_script()): nothing was
+# running, and ss is missing (with no other way to find the processes).
+stop_none_code = 3
+stop_no_ss_code = 4
+# The measured per-test overhead is kept here (in export_dir) between runs.
+overhead_store = '.NetMeter_overhead.dat'
+# The measured cost of a server restart (start and stop) is kept here.
+restart_store = '.NetMeter_restart.dat'
+# The journal of the finished tests of the campaign, for --resume (see NM_journal.py).
+journal_store = '.NetMeter_journal.json'
+journal = None
+# What is measured, and between which clients (see NM_kinds.py).
+kind = get_kind(measurement_kind)
+# The simultaneous pairs update the results catalog one at a time.
+catalog_lock = Lock()
+# The time spent in every phase of the tests (see NM_scheduler.PhaseTimer).
+phases = PhaseTimer()
+
+
+def port_stop_script(port, side = 'both', fallback = None):
+    '''
+    A shell command that kills the processes with a socket on "port" (found
+    with ss, as in Connect.listening()): on the server side ("side" =
+    'server': what listens on the port, with its connections), on the
+    client side ('client': what connects to the port), or both ('both').
+    Without ss, the command "fallback" (a string) is run instead, if any.
+    Exits with stop_none_code if nothing was running, and with
+    stop_no_ss_code if ss (and the fallback) is missing.
+    '''
+    filters = {'server': 'sport = :{0}', 'client': 'dport = :{0}', 'both': 'sport = :{0} or dport = :{0}'}
+    if fallback:
+        missing = fallback + ' 2> /dev/null || { echo "no process found" >&2; exit ' + str(stop_none_code) + '; }; exit 0'
+    else:
+        missing = 'echo "ss not found" >&2; exit ' + str(stop_no_ss_code)
+    return ('command -v ss > /dev/null || { ' + missing + '; }; '
+            "pids=$(ss -tuanp '( " + filters[side].format(port) + " )' | grep -o 'pid=[0-9]*' | cut -c5- | sort -u); "
+            'if [ -n "$pids" ]; then kill -9 $pids; else echo "no process found" >&2; exit ' + str(stop_none_code) + '; fi')
+
+
+def peer_stop_script(cmd, peer = None, pids = None):
+    '''
+    A shell command that kills the processes of the command "cmd" (a list)
+    whose last argument is the address "peer" (e.g. ping; any, if None),
+    among "pids" (a shell word), or else among all the processes. The
+    command line has to start with the command, so that a shell that runs
+    it is not killed. Exits with stop_none_code if nothing was running.
+    '''
+    none = '{ echo "no process found" >&2; exit ' + str(stop_none_code) + '; }'
+    if pids is None:
+        return "pkill -9 -f '^" + _ere(' '.join(cmd)) + (' .* ' + _ere(peer) + '$' if peer else ' ') + "' || " + none
+
+    return ('found=; for p in ' + pids + '; do case "$(tr "\\000" " " < /proc/$p/cmdline 2> /dev/null)" in '
+            '"' + ' '.join(cmd) + ' "*' + ('" ' + peer + ' "' if peer else '') + ') kill -9 $p; found=1;; esac; done; '
+            '[ -n "$found" ] || ' + none)
+
+
+def _ere(text):
+    # "text" as a literal in an extended regular expression (pkill -f).
+    return re.sub(r'([.^$*+?()\[\]{}|\\])', r'\\\1', text)
 
 
 class Connect(object):
     def __init__(self, access_method, ip, conn_name, iperf_bin, ssh_port = 22,
-                 creds = None):
+                 creds = None, multiplex = True):
         self.conn_type = basename(access_method)
         self.conn_name = conn_name
         self.creds = creds
         self.ip = ip
         self.ssh_port = ssh_port
+        self.control_path = None
+        # The interfaces of the addresses of this client (see interface()).
+        self.ifaces = {}
         self.verify_credsfile()
-        self.iperf_cmd = [iperf_bin]
-        if self.conn_type == 'local':
+        if isinstance(iperf_bin, str):
+            self.iperf_cmd = [iperf_bin]
+            # All the Iperf instances, by name (see stop_command()).
             self.stop_iperf = ['killall', '-9', basename(iperf_bin)]
+        else:
+            # An interpreter and its script (the native engine, see NM_engine.py). It has no name
+            # of its own to be stopped by (a pattern of its command line would also match the
+            # shells that run it), so it is only stopped by its port.
+            self.iperf_cmd = list(iperf_bin)
+            self.stop_iperf = None
+            if self.conn_type == 'winexe':
+                print('\033[91mThe native engine does not run on Windows clients.\033[0m Exiting.')
+                sys.exit(1)
+
+        if self.conn_type == 'local':
+            pass
         elif self.conn_type == 'ssh':
             self.auth = [access_method, '-i', self.key, '-p', str(ssh_port), '-l', self.username,
                          '-o', 'UserKnownHostsFile=/dev/null', '-o', 'StrictHostKeyChecking=no',
                          '-o', 'BatchMode=yes', '-o', 'LogLevel=ERROR', ip]
-            self.stop_iperf = ['killall', '-9', basename(iperf_bin)]
             self.shutdown_command = ['sudo', 'shutdown', '-h', 'now']
+            if multiplex:
+                self.open_master()
         elif self.conn_type == 'winexe':
             self.auth = [access_method, '-A',  self.creds, '//' + ip]
             self.stop_iperf = ['taskkill /im ' + basename(iperf_bin) + ' /f']
             self.shutdown_command = ['shutdown /t 10 /s /f']
+        elif self.conn_type == 'netns':
+            # A network namespace of the local machine (e.g. of NM_netns.py), named by "ip".
+            self.auth = ['ip', 'netns', 'exec', ip]
         else:
             print('\033[91mConnection method not supported.\033[0m Exiting.')
             sys.exit(1)
 
-    def islocal(self):
+    def open_master(self):
+        '''
+        Open a persistent multiplexed SSH connection (ControlMaster). All the
+        following commands to this client reuse it instead of doing a full SSH
+        handshake each. If it can not be opened, every command connects by itself.
+        '''
+        # The path must be unique for this connection, as it is closed on exit.
+        # "%C" is a hash of the connection parameters (keeps the socket path short).
+        control_path = join(gettempdir(), 'nm-' + str(getpid()) + '-' + self.conn_name +
+                            '-' + format(id(self) & 0xffff, 'x') + '-%C')
+        control_opts = ['-o', 'ControlPath=' + control_path]
+        master = self.auth[:-1] + control_opts + ['-o', 'ControlMaster=yes',
+                                                  '-o', 'ControlPersist=yes', '-N', '-f', self.ip]
+        start = monotonic()
+        try:
+            p = Popen(master, stdout=DEVNULL, stderr=PIPE)
+            _, err = p.communicate(timeout = 60)
+        except TimeoutExpired:
+            p.kill()
+            p.communicate()
+            err = b'timed out'
+
+        if p.returncode:
+            print('\033[93mCould not open a persistent connection to ' + self.conn_name + '.\033[0m '
+                  'Using a new connection for every command. (' +
+                  err.strip().decode('ascii', errors='ignore') + ')')
+            return
+
+        self.control_path = control_path
+        self.auth = self.auth[:-1] + control_opts + ['-o', 'ControlMaster=no', self.ip]
+        atexit.register(self.close_master)
+        print('Persistent connection to ' + self.conn_name + ' opened in ' +
+              format(monotonic() - start, '.3f') + ' s.')
+
+    def close_master(self):
+        if not self.control_path:
+            return
+
+        p = Popen(self.auth[:-1] + ['-O', 'exit', self.ip], stdout=DEVNULL, stderr=DEVNULL)
+        p.wait()
+        self.control_path = None
+
+    def dispatch_latency(self):
+        '''
+        The time (s) it takes to run a no-op command on the client, i.e. the
+        overhead of dispatching a command to it. None if it can not be measured.
+        '''
         if self.conn_type == 'local':
+            return 0.0
+        elif self.conn_type not in ('ssh', 'netns'):
+            return None
+
+        start = monotonic()
+        code, _, _ = call(run(self.auth + ['true']))
+        if code:
+            return None
+
+        return monotonic() - start
+
+    def islocal(self):
+        if self.conn_type in ('local', 'netns'):
             return True
         else:
             return False
@@ -61,32 +228,145 @@ class Connect(object):
     def getname(self):
         return self.conn_name
 
-    def get_command(self, args, outfile = None, errfile = None):
-        if args == 'stop_iperf':
-            cmd = self.stop_iperf
+    def get_command(self, args):
+        '''
+        The command (a list, run without a local shell) that runs "args" (the
+        Iperf arguments) on this client.
+        '''
+        cmd = self.iperf_cmd + args
+        if self.conn_type == 'local':
+            return cmd
+        elif self.conn_type == 'netns':
+            return self.auth + cmd
         else:
-            cmd = self.iperf_cmd + args
-
-        if outfile:
-            if self.conn_type == 'local':
-                self.print_cmd = ' '.join(cmd)
-            else:
-                self.print_cmd = ' '.join(self.auth) + ' "' + ' '.join(cmd) + '"'
+            return self.auth + [' '.join(cmd)]
 
-            err_redirect = ''
+    def stop_command(self, port = None, side = 'both', peer = None):
+        '''
+        The command that stops the Iperf instances of one test on this
+        client, and not those of the other pairs that share it: those with a
+        socket on "port" (see port_stop_script()), or else those that run to
+        the address "peer" (ping, which has no port). Without either (and on
+        Windows clients), all the Iperf instances are stopped, by name (the
+        native engine: those on the default port).
+        '''
+        if self.conn_type == 'winexe':
+            return self.auth + self.stop_iperf
+        elif port or self.stop_iperf is None:
+            # Without ss, all the Iperf instances are stopped by name (not the native engine).
+            script = port_stop_script(port or default_iperf_port, side,
+                                      self.stop_iperf and ' '.join(self.stop_iperf))
+            if self.conn_type == 'netns':
+                # The sockets of the namespace are only seen from inside of it.
+                return self.auth + ['sh', '-c', script]
+        elif self.conn_type == 'netns':
+            # Only the processes of the namespace (they share the process IDs of the machine).
+            script = peer_stop_script(self.iperf_cmd, peer, '$(ip netns pids ' + self.ip + ')')
+        elif peer:
+            script = peer_stop_script(self.iperf_cmd, peer)
+        else:
+            script = ' '.join(self.stop_iperf) + ' 2> /dev/null || { echo "no process found" >&2; exit ' + str(stop_none_code) + '; }'
 
-            if (errfile):
-                err_redirect = ' 2> ' + errfile
+        if self.conn_type == 'ssh':
+            return self.auth + [script]
+        else:
+            return ['sh', '-c', script]
+
+    async def arun(self, args, timeout = None):
+        '''
+        Run "args" on this client to completion. Returns the exit code (None
+        if it was killed after "timeout" seconds), the output and the error
+        output (see NM_remote.run).
+        '''
+        return await run(self.get_command(args), timeout)
+
+    async def astream(self, args, outfile = None, errfile = None, on_line = None):
+        '''
+        Start "args" on this client, with its output streamed into "outfile"
+        and "errfile", and its output lines to "on_line". Returns the
+        NM_remote.RemoteProcess.
+        '''
+        return await spawn(self.get_command(args), outfile, errfile, on_line)
+
+    async def akill(self, timeout = None, port = None, side = 'both', peer = None):
+        '''
+        Kill the Iperf instances of a test on this client (see stop_command()).
+        '''
+        return await run(self.stop_command(port, side, peer), timeout)
+
+    # The same, for the threads of the test loop.
+    def run(self, args, timeout = None):
+        return call(self.arun(args, timeout))
+
+    def stream(self, args, outfile = None, errfile = None, on_line = None):
+        return call(self.astream(args, outfile, errfile, on_line))
+
+    def kill(self, timeout = None, port = None, side = 'both', peer = None):
+        return call(self.akill(timeout, port, side, peer))
+
+    def telemetry(self, period, on_line):
+        '''
+        Start sampling the CPU and the interfaces of this client every
+        "period" seconds (see NM_cpustat.RemoteSampler), with the output
+        lines passed to "on_line". Returns the RemoteProcess, or None if the
+        client can not be sampled this way (only ssh clients and namespaces
+        are: the /proc/net/dev of a namespace has its own interfaces).
+        '''
+        if self.conn_type == 'ssh':
+            return call(spawn(self.auth + [telemetry_script(period)], on_line = on_line))
+        elif self.conn_type == 'netns':
+            return call(spawn(self.auth + ['sh', '-c', telemetry_script(period)], on_line = on_line))
+
+        return None
+
+    def interface(self, ip):
+        '''
+        The interface of this client that has the address "ip" (from
+        "ip -o addr show"), or None if it can not be found (or the client is
+        not a Linux one).
+        '''
+        if self.conn_type == 'winexe':
+            return None
+
+        if ip not in self.ifaces:
+            cmd = ['ip', '-o', 'addr', 'show']
+            if self.conn_type == 'ssh':
+                cmd = self.auth + [' '.join(cmd)]
+            elif self.conn_type == 'netns':
+                cmd = self.auth + cmd
+
+            code, out, err = call(run(cmd, timeout = 10))
+            self.ifaces[ip] = iface_of(out.decode('utf-8', errors='ignore'), ip) if code == 0 else None
+            if self.ifaces[ip] is None:
+                print('\033[93mWARNING:\033[0m Could not find the interface of ' + ip + ' on ' +
+                      self.conn_name + '. Its counters will not be checked.')
+
+        return self.ifaces[ip]
+
+    def listening(self, port, protocol = None):
+        '''
+        Check whether anything listens on "port" on this client (TCP, UDP, or
+        both if the protocol is not given). Returns None if this can not be checked.
+        '''
+        if self.conn_type == 'winexe':
+            return None
+
+        flags = {'TCP': '-lnt', 'UDP': '-lnu'}.get(protocol, '-lntu')
+        cmd = ['ss', flags, 'sport = :' + str(port)]
+        if self.conn_type == 'ssh':
+            cmd = self.auth + [' '.join(cmd[:-1]) + " '" + cmd[-1] + "'"]
+        elif self.conn_type == 'netns':
+            cmd = self.auth + cmd
 
-            return self.print_cmd, ' > ' + outfile + err_redirect
+        code, out, err = call(run(cmd, timeout = 10))
+        if code != 0:
+            return None
 
-        if self.conn_type == 'local':
-            return cmd
-        else:
-            return self.auth + [' '.join(cmd)]
+        # The first line is the header.
+        return len(out.strip().splitlines()) > 1
 
     def shutdown(self):
-        if self.conn_type != 'local':
+        if not self.islocal():
             print('Shutting down ' + self.conn_name + '...')
             if self.conn_type == 'ssh':
                 self.auth = self.auth[:-1] + ['-t'] + [self.auth[-1]]
@@ -96,7 +376,7 @@ class Connect(object):
             sleep(10)
 
     def verify_credsfile(self):
-        if self.conn_type != 'local' and (not isfile(self.creds)):
+        if not self.islocal() and (not isfile(self.creds)):
             print('\033[91mCredentials file "' + self.creds + '" not found.\033[0m Exiting.')
             sys.exit(1)
 
@@ -154,6 +434,8 @@ def tprint(str):
 
 def interrupt_exit(signal, frame):
     print('\n\033[91mInterrupted by user. Exiting.\033[0m')
+    if journal and len(journal):
+        print('The finished tests are kept. Run with --resume to continue the campaign.')
     sys.exit(1)
 
 
@@ -184,7 +466,7 @@ def dir_prep(dir, subdir):
     print('The output directory is set to: \033[93m' + dir + '\033[0m')
 
 
-def cmd_print(text, conn_name, dir_time):
+def cmd_print(text, conn_name, dir_time, latency = None):
     if isinstance(text, str):
         # The command is a string
         print_cmd = text
@@ -205,6 +487,9 @@ def cmd_print(text, conn_name, dir_time):
 
         print_cmd = ' '.join(print_cmd)
 
+    if latency is not None:
+        print_log += '  [dispatch: ' + format(latency, '.3f') + ' s]'
+
     with open(dir_time + '_iperf_commands.log', 'a') as logfile:
             logfile.write(time_header() + conn_name + ': ' + print_log + '\n')
 
@@ -257,9 +542,10 @@ def place_images(direction, protocol, summary_img, image_list, print_unit,
     return content
 
 
+@phases.timed('html')
 def gen_html(title, one2two_summary, two2one_summary, one2two_images, two2one_images, html_outname,
              protocol, streams, all_one2two_failed, all_two2one_failed, print_unit, localpart,
-             cl1_pretty_name, cl2_pretty_name, tcpwin):
+             cl1_pretty_name, cl2_pretty_name, tcpwin, note = None):
     if localpart:
         CPU_note = 'and CPU '
     else:
@@ -337,12 +623,13 @@ def gen_html(title, one2two_summary, two2one_summary, one2two_images, two2one_im
                '}\n'
                '</style>\n'
                '<title>Iperf ' + cl1_pretty_name + ' &#8596; ' + cl2_pretty_name
-               + ' Bandwidth ' + CPU_note + 'Performance Report</title>\n'
+               + ' ' + kind.quantity + ' ' + CPU_note + 'Performance Report</title>\n'
                '</head>\n'
                '<body>\n'
                '<div id="header">\n'
                )
-    content += ('    <h3>' + title + ' [' + protocol + ', ' + str(streams) + ' st.' + tcp_win_msg + ']</h3>\n'
+    content += ('    <h3>' + title + ' [' + protocol + ', ' + str(streams) + ' st.' + tcp_win_msg + ']</h3>\n' +
+                ('    <p>' + note + '</p>\n' if note else '') +
                 '</div>\n'
                 '<div id="container">\n'
                )
@@ -383,6 +670,17 @@ def get_size_units_factor(num, rate=False):
     return "%3.2f" % num, 'T' + s, str(factor)
 
 
+def get_value_units_factor(value):
+    '''
+    get_size_units_factor for the results of the measurement kind: rates are
+    scaled, other quantities keep their units.
+    '''
+    if kind.units:
+        return "%3.2f" % value, kind.units, '1.0'
+
+    return get_size_units_factor(value, rate=True)
+
+
 def get_round_size_name(i, gap = False):
     size_name = get_size_units_factor(i)
     if gap:
@@ -391,140 +689,19 @@ def get_round_size_name(i, gap = False):
         return str(int(round(float(size_name[0])))) + size_name[1]
 
 
-def get_iperf_data_single(iperf_out, protocol, streams, repetitions):
+def export_data(data, data_outname, header, **meta):
     '''
-    Notice: all entries are counted from the end, as sometimes the beginning of an
-    output row can be unreadable. This is also the reason for "errors='ignore'".
+    Write the gnuplot-compatible text file, and (if "binary_results" is set)
+    the binary copy of the data with its metadata (see NM_store.py).
     '''
-    iperf_data = []
-    additional_fields = 0
-    if protocol == 'UDP':
-        additional_fields = 5
-
-    with open(iperf_out, encoding='utf-8', errors='ignore') as inputfile:
-        for line in inputfile:
-            tmp_lst = line.strip().split(',')
-            if (
-                not tmp_lst[0].isdigit()
-                or len(tmp_lst) != (9 + additional_fields)
-                or (additional_fields and float(tmp_lst[-3]) <= 0)
-                or float(tmp_lst[-3 - additional_fields].split('-')[-1]) > repetitions * 10.0
-               ):
-                continue
-
-            if (int(tmp_lst[-4 - additional_fields]) > 0):
-                # If the link number is positive (i.e if it is not a summary, where it's -1)...
-                date = datetime.strptime(tmp_lst[0], '%Y%m%d%H%M%S')
-                if not iperf_data:
-                    first_date = date
-
-                time_from_start = float((date - first_date).total_seconds())
-                rate = float(tmp_lst[-1 - additional_fields])
-                if additional_fields:
-                    # For UDP: rate = rate * (total_datagrams - lost_datagrams) / total_datagrams
-                    rate = rate * (float(tmp_lst[-3]) - float(tmp_lst[-4])) / float(tmp_lst[-3])
-                if (int(tmp_lst[-2 - additional_fields]) < 0) or (rate < 0.0):
-                    rate = np.nan
-                iperf_data.append([ time_from_start, int(tmp_lst[-4 - additional_fields]), rate ])
-
-    if not iperf_data:
-        raise ValueError('Nothing reached the server.')
-
-    iperf_data = np.array(iperf_data)
-    conns = np.unique(iperf_data[:,1])
-    num_conn = conns.shape[0]
-    if num_conn < streams:
-        raise ValueError(str(num_conn) + ' out of ' + str(streams) + ' streams reached the server.')
-    elif num_conn > streams:
-        raise ValueError(str(num_conn) + ' connections reached the server (' + str(streams) + ' expected).')
-
-    # Sort by connection number, then by date. Get indices of the result.
-    bi_sorted_indices = np.lexsort((iperf_data[:,0], iperf_data[:,1]))
-    iperf_data = iperf_data[bi_sorted_indices]
-    ### Mechanism to check if too few or too many connections received
-    # Get the index of the line after the last of each connection
-    conn_ranges = np.searchsorted(iperf_data[:,1], conns, side='right')
-    # Get sizes of connection blocks
-    conn_count = np.diff(np.insert(conn_ranges, 0, 0))
-    server_fault = False
-    conn_reached = conn_count.min()
-    if conn_reached < repetitions:
-        # If there was at least one occasion when there were fewer connections than expected
-        server_fault = 'too_few'
-        repetitions = conn_reached
-
-    # Get indices of connection block sizes that are bigger than expected (if any)
-    where_extra_conn = (conn_count > repetitions).nonzero()[0]
-    if where_extra_conn.size:
-        ## If there were connection blocks bigger than expected
-        # Get indices of lines after the last (n+1) for removal
-        remove_before_lines = conn_ranges[where_extra_conn]
-        # Get the amount of extra lines
-        amount_lines_to_remove = [remove_before_lines[0] - repetitions * (where_extra_conn[0] + 1)]
-        for i in where_extra_conn[1:]:
-            amount_lines_to_remove.append(conn_ranges[i] - repetitions * (i + 1) - sum(amount_lines_to_remove))
-
-        # Get the first lines to remove
-        first_for_removal = remove_before_lines - amount_lines_to_remove
-        # Get the ranges of lines to remove
-        lines_to_remove = np.array([
-                                    np.arange(first_for_removal[i],remove_before_lines[i])
-                                    for i in np.arange(first_for_removal.size)
-                                   ]).flatten()
-        # Remove the extra lines
-        iperf_data = np.delete(iperf_data, lines_to_remove, axis=0)
-        if not server_fault:
-            server_fault = 'too_many'
-
-    ### End connection ammount check
-    iperf_data = iperf_data[:,[0,2]].reshape((num_conn, iperf_data.shape[0]//num_conn, 2))
-    iperf_data = np.ma.masked_array(iperf_data, np.isnan(iperf_data))
-    mean_times = np.mean(iperf_data[:,:,0], axis=0)
-    iperf_stdev = np.std(iperf_data[:,:,1], axis=0) * np.sqrt(num_conn)
-    out_arr = np.vstack((mean_times, iperf_data[:,:,1].sum(axis=0), iperf_stdev)).filled(np.nan).T
-    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std(), server_fault
-
-
-def get_mpstat_data_single(mpstat_out):
-    mpstat_data = []
-    tmp_row = []
-    time_interval = 0.0
-    with open(mpstat_out) as inputfile:
-        for line in inputfile:
-            tmp_lst = line.split()
-            if (not any('CPU' in s for s in tmp_lst)) and tmp_lst and ('Average' not in tmp_lst[0]):
-                if any('all' in s for s in tmp_lst):
-                    if tmp_row:
-                        mpstat_data.append(tmp_row)
-
-                    tmp_row = []
-                else:
-                    tmp_row.append(float(tmp_lst[-1]))
-
-                if not time_interval:
-                    try:
-                        time = datetime.strptime(tmp_lst[0] + tmp_lst[1], '%I:%M:%S%p')
-                    except ValueError:
-                        time = datetime.strptime(tmp_lst[0], '%H:%M:%S')
+    np.savetxt(data_outname, data, fmt='%g', header=header)
+    if binary_results:
+        save_result(data_outname[:-len('.dat')], data, header, **meta)
 
-                    if not mpstat_data:
-                        first_time = time
 
-                    time_interval = float((time - first_time).total_seconds())
-
-    mpstat_data.append(tmp_row)
-    mpstat_data = np.array(mpstat_data)
-    num_measurements, num_cpu = mpstat_data.shape
-    times = np.arange(0, num_measurements * time_interval, time_interval)
-    mpstat_data = (1 - mpstat_data / 100) / num_cpu
-    tot_cpu_usage = mpstat_data.sum(axis=1)
-    core_stdev = np.std(mpstat_data, axis=1) * np.sqrt(num_cpu)
-    out_arr = np.vstack((times, tot_cpu_usage, core_stdev)).T
-    return out_arr, out_arr[:,1].mean(), out_arr[:,1].std()
-
-
-def export_single_data(data_processed, data_outname):
-    np.savetxt(data_outname, data_processed, fmt='%g', header='TimeStamp(s) Sum Stdev')
+def export_single_data(data_processed, data_outname, column = 'Sum', extra_columns = '', **meta):
+    export_data(data_processed, data_outname, 'TimeStamp(s) ' + column + ' Stdev' +
+                (' ' + extra_columns if extra_columns else ''), **meta)
 
 
 def plot_iperf_data(passed, plot_type, net_dat_file):
@@ -548,7 +725,7 @@ def plot_iperf_data(passed, plot_type, net_dat_file):
     xtic_explicit = ':xtic(printxsizes($2))'
     xtic = ['', xtic_explicit, xtic_explicit, xtic_explicit]
     point_color = ['blue', 'blue', 'blue', 'magenta']
-    title = ['Mean tot. BW', 'Mean tot. BW', 'Mean tot. BW', 'Approx. BW']
+    title = ['Mean tot. ' + kind.short] * 3 + ['Approx. ' + kind.short]
     initial_points = (
                       '     "" using {0}:({1}${2}/rf{3}){4} with points'
                             ' pt 2 ps 1.5 lw 3 lc rgb "{5}" title "{6}", \\\n'
@@ -573,22 +750,34 @@ def plot_iperf_data(passed, plot_type, net_dat_file):
         return for_all_areas[1] + for_all_points[3]
 
 
-def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
+# The colors of the CPU plots of the machines.
+cpu_colors = ['red', 'dark-green', 'orange', 'purple']
+# The colors of the rates that the interfaces of the sender and the receiver counted.
+nic_colors = ['steelblue', 'dark-cyan']
+
+
+def write_gp(gp_outname, net_dat_file, proc_dat_files, img_file, net_rate,
              protocol, streams, print_unit, cl1_pretty_name, cl2_pretty_name,
              plot_type = 'singlesize', direction = 'one2two', finished = True,
-             server_fault = False, packet_size = 0.0, tcpwin = None):
+             server_fault = False, packet_size = 0.0, tcpwin = None, nic_dat_file = None):
+    '''
+    "proc_dat_files" are the CPU data files, as (file, machine name) pairs
+    (the name is shown if there are several of them). "nic_dat_file" has the
+    rates that the interfaces of the sender and the receiver counted (see
+    NM_niccheck.py), in its 3rd and 4th columns.
+    '''
     try:
-        net_rate, rate_units, rate_factor = get_size_units_factor(net_rate, rate=True)
+        net_rate, rate_units, rate_factor = get_value_units_factor(net_rate)
         rate_format = ''
     except:
         net_rate = '???'
-        rate_units = 'b/s'
+        rate_units = kind.base_units()
         rate_factor = '1.0'
         rate_format = 'set format y "%.1tx10^%T"\n'
 
     packet_size = get_round_size_name(packet_size, gap = True)
     if plot_type == 'singlesize':
-        plot_title = print_unit + ' size: ' + packet_size + ', Av. rate: ' + net_rate + ' ' + rate_units
+        plot_title = print_unit + ' size: ' + packet_size + ', ' + kind.average + ': ' + net_rate + ' ' + rate_units
         x_title = 'Time (s)'
         labels_above_points = ''
         failed_labels = ''
@@ -597,7 +786,7 @@ def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
         rotate_xtics = ''
         formatx = ''
     else:
-        plot_title = 'Bandwidth \\\\& CPU usage for different packet sizes'
+        plot_title = kind.quantity + ' \\\\& CPU usage for different packet sizes'
         x_title = print_unit + ' size'
         labels_above_points = ('     "" using 2:($1 >= 0 ? $3/rf : 1/0)'
                                ':(sprintf("%.2f ' + rate_units + '", $3/rf))'
@@ -619,9 +808,14 @@ def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
     else:
         plot_subtitle = cl2_pretty_name + ' to ' + cl1_pretty_name
 
-    if proc_dat_file:
-        proc_plot = ('     "' + proc_dat_file + '" using 1:($2-$3):($2+$3) with filledcurves lc rgb "red" axes x1y2 notitle, \\\n'
-                     '     "" using 1:2 with points pt 1 ps 1.5 lw 3 lc rgb "red" axes x1y2 title "Mean tot. CPU"\n')
+    proc_files = [(f, 'Mean tot. CPU' + (' (' + name + ')' if name and len(proc_dat_files) > 1 else ''))
+                  for f, name in proc_dat_files or []]
+    if proc_files:
+        proc_plot = ', \\\n'.join('     "' + f + '" using 1:($2-$3):($2+$3) with filledcurves lc rgb "' + color +
+                                   '" axes x1y2 notitle, \\\n'
+                                   '     "" using 1:2 with points pt 1 ps 1.5 lw 3 lc rgb "' + color +
+                                   '" axes x1y2 title "' + cpu_title + '"'
+                                   for (f, cpu_title), color in zip(proc_files, cpu_colors)) + '\n'
         y2_axis = ('set y2label "CPU busy time fraction"\n'
                    'set y2tics nomirror\n'
                    'set y2range [0:1]\n')
@@ -631,15 +825,32 @@ def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
         y2_axis = ''
         rmargin = 'set rmargin 4.5\n'
 
+    if nic_dat_file:
+        nic_plot = ('     "' + nic_dat_file + '" using 1:($3/rf) with linespoints pt 6 ps 1 lw 2 dt 2'
+                    ' lc rgb "' + nic_colors[0] + '" title "Sender NIC", \\\n'
+                    '     "" using 1:($4/rf) with linespoints pt 4 ps 1 lw 2 dt 2'
+                    ' lc rgb "' + nic_colors[1] + '" title "Receiver NIC", \\\n')
+    else:
+        nic_plot = ''
+
     tcp_win_msg = gen_tcp_win_msg(tcpwin)
     warning_message = ''
+    if isinstance(server_fault, np.ndarray):
+        # For the multi size plots these are the test statuses, not a fault.
+        fault_msg = False
+    else:
+        fault_msg = server_fault
+
     if not finished:
         warning_message = 'set label "Warning:\\nTest failed to finish!\\nResults may not be accurate!" at screen 0.01, screen 0.96 tc rgb "red"\n'
-    elif server_fault == 'too_few':
+    elif fault_msg == 'too_few':
         warning_message = 'set label "Warning:\\nToo few connections!\\nResults may not be accurate!" at screen 0.01, screen 0.96 tc rgb "red"\n'
-    elif server_fault == 'too_many':
+    elif fault_msg == 'too_many':
         warning_message = 'set label "Warning:\\nToo many connections!\\nResults may not be accurate!" at screen 0.01, screen 0.96 tc rgb "red"\n'
 
+    if not plot_warnings:
+        warning_message = ''
+
     plot_net_data = plot_iperf_data(server_fault, plot_type, net_dat_file)
     content = (
                'set terminal pngcairo nocrop enhanced size 1024,768 font "Verdana,15"\n'
@@ -649,7 +860,7 @@ def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
                + rate_format + warning_message +
                '\n'
                'set xlabel "' + x_title + '"\n'
-               'set ylabel "Bandwidth (' + rate_units + ')"\n'
+               'set ylabel "' + kind.quantity + ' (' + rate_units + ')"\n'
                'set ytics nomirror\n'
                + y2_axis +
                'set key bmargin center horizontal box samplen 1 width -1\n'
@@ -660,26 +871,30 @@ def write_gp(gp_outname, net_dat_file, proc_dat_file, img_file, net_rate,
                + stats_calc + log2_scale +
                'set style fill transparent solid 0.2 noborder\n'
                'set autoscale xfix\n'
-               'plot ' + plot_net_data + labels_above_points + failed_labels + proc_plot
+               'plot ' + plot_net_data + labels_above_points + failed_labels + nic_plot + proc_plot
               )
-    with open(gp_outname, 'w') as outfile:
-        outfile.write(content)
-
-
-def set_protocol_opts(protocol, tcpwin, client = True):
-    if protocol == 'TCP' and tcpwin:
-        return ['-w', str(tcpwin)]
-    elif protocol == 'TCP':
-        return []
-    elif protocol == 'UDP':
-        if client:
-            return ['-u', '-b', '100M']
-        else:
-            return ['-u']
-
-    else:
-        print('Protocol must be either "TCP" or "UDP". Exiting.')
-        sys.exit(1)
+    if gp_outname:
+        with open(gp_outname, 'w') as outfile:
+            outfile.write(content)
+
+    # The same chart, for the renderers of NM_render.py.
+    return {
+            'type': plot_type,
+            'script': basename(gp_outname) if gp_outname else None,
+            'output': img_file,
+            'net_file': net_dat_file,
+            'proc_files': proc_files,
+            'nic_file': nic_dat_file,
+            'title': plot_title.replace('\\\\&', '&'),
+            'subtitle': '(' + plot_subtitle + ', ' + protocol + ', ' + str(streams) + ' st.' + tcp_win_msg + ')',
+            'xlabel': x_title,
+            'quantity': kind.quantity,
+            'short': kind.short,
+            'rate_units': rate_units,
+            'rate_factor': float(rate_factor),
+            'scientific': bool(rate_format),
+            'warning': warning_message.split('"')[1].replace('\\n', '\n') if warning_message else ''
+           }
 
 
 def bend_max_size(size, protocol):
@@ -692,217 +907,963 @@ def bend_max_size(size, protocol):
         return size
 
 
-def run_server(protocol, init_name, dir_time, conn, tcpwin):
-    iperf_args = ['-s', '-i', '10', '-y', 'C']
-    #iperf_args = ['-s', '-1', '10']
-    protocol_opts = set_protocol_opts(protocol, tcpwin, client = False)
-    iperf_args += protocol_opts
+@phases.timed('server_start')
+def run_server(protocol, init_name, dir_time, conn, tcpwin, port = None, peer_addr = None):
+    '''
+    Start the server side of a test. "port" is the Iperf port (None for the
+    default one), "peer_addr" the test address of the client.
+    '''
+    iperf_args = kind.server_args(protocol, tcpwin, report_interval, port, peer_addr)
     conn_name = conn.getname()
-    iperf_command, output = conn.get_command(iperf_args, init_name + '_iperf.dat', init_name + '_iperf.err')
+    iperf_command = conn.get_command(iperf_args)
     print('Starting server on ' + conn_name + '...')
-    cmd_print(iperf_command, conn_name, dir_time)
-    p = Popen(iperf_command + output, shell=True)
-    sleep(10)
+    start = monotonic()
+    p = conn.stream(iperf_args, init_name + '_iperf.dat', init_name + '_iperf.err')
+    if kind.listens:
+        probe = lambda: conn.listening(port or default_iperf_port, protocol)
+    else:
+        probe = None
+
+    if wait_for_server([init_name + '_iperf.dat', init_name + '_iperf.err'], probe,
+                       banner = kind.banner or server_banner):
+        # For the server, the dispatch latency is the time until it is ready.
+        cmd_print(iperf_command, conn_name, dir_time, monotonic() - start)
+    else:
+        cmd_print(iperf_command, conn_name, dir_time)
+        print('\033[93mThe server did not report being ready.\033[0m Continuing anyway.')
 
+    return p
 
+
+@phases.timed('client')
 def run_client(server_addr, runtime, p_size, streams, init_name, dir_time,
-               protocol, conn, localpart, tcpwin):
+               protocol, conn, localpart, tcpwin, live = None, port = None, server_out = None,
+               start_at = None, lead = None, server_conn = None, server_proc = None):
+    '''
+    Run the client side of a test. "server_out" is the output file of the
+    server, if it is not that of this test alone (see SharedServer), and
+    "server_conn" and "server_proc" are its client and process.
+    "start_at" is the common (wall-clock) start of the simultaneous clients
+    (see NM_fanout.StartSync), and "lead" the dispatch latency of "conn"
+    (measured if None).
+    Returns whether the test finished, its number of report intervals, and
+    the (wall-clock) start and end of the client.
+    '''
     p_size = bend_max_size(p_size, protocol)
-    repetitions, mod = divmod(runtime, 10)
+    repetitions, mod = report_repetitions(runtime, report_interval)
     if not mod:
         runtime += 1
 
-    #iperf_args =  ['-c', server_addr, '-t', str(runtime), '-l', str(p_size),
-     #              '-P', str(streams)]
-    iperf_args = ['-c', server_addr, '-t', str(runtime), '-P', str(streams)]
-    protocol_opts = set_protocol_opts(protocol, tcpwin)
-    iperf_args += protocol_opts
-    iperf_command, output = conn.get_command(iperf_args, init_name + '_iperf_client.out', init_name + '_iperf_client.err')
+    if lead is None:
+        lead = conn.dispatch_latency()
+    # Let Iperf itself wait for the common start, if it can.
+    txstart = start_at and iperf_txstart and kind.txstart
+    iperf_args = kind.client_args(server_addr, runtime, p_size, streams, protocol, tcpwin,
+                                  report_interval, port, start_at if txstart else None)
+    iperf_command = conn.get_command(iperf_args)
     source_name = conn.getname()
     size_name = get_round_size_name(p_size)
     tprint('Running ' + size_name + ' test from ' + source_name + '. (Duration: '
-          + str(timedelta(seconds = repetitions * 10 + mod)) + ')')
+          + str(timedelta(seconds = repetitions * report_interval + mod)) + ')')
     conn_name = conn.getname()
-    cmd_print(iperf_command, conn_name, dir_time)
-    iperf_proc = Popen(iperf_command + output, shell=True)
-    if localpart:
-        mpstat_proc = Popen('mpstat -P ALL 10 ' + str(repetitions) + ' > ' + init_name + '_mpstat.dat', shell=True)
-        mpstat_proc.wait()
+    cmd_print(iperf_command, conn_name, dir_time, lead)
+    if start_at and not txstart:
+        # Dispatch the client ahead of the common start by its dispatch latency.
+        sleep(max(start_at - (lead or 0.0) - time(), 0.0))
+    launched = time()
+    with phases('dispatch'):
+        iperf_proc = conn.stream(iperf_args, init_name + '_iperf_client.out', init_name + '_iperf_client.err')
+    started = launched + (lead or 0.0)
+    if txstart:
+        started = max(started, start_at)
+    cpu = None
+    if localpart and cpu_sampler == 'proc' and cpustat_available():
+        # Sample the CPU in-process, and attribute the CPU time of the local Iperf processes.
+        pids = [local_pid(conn, iperf_proc), server_conn and local_pid(server_conn, server_proc)]
+        cpu = CpuSampler(cpu_sample_period, int((runtime + client_grace_timeout) / cpu_sample_period) + 2,
+                         [pid for pid in pids if pid]).start()
+    elif localpart:
+        mpstat_proc = start_command(['mpstat', '-P', 'ALL'] + mpstat_args(repetitions, report_interval),
+                                    init_name + '_mpstat.dat')
+
+    telemetry = start_telemetry(((conn, 'client'), (server_conn, 'server')), runtime)
+
+    # The run time is only an upper bound: move on as soon as the client exits.
+    stalled = None
+    converged = None
+    if live and (live_abort_after or adaptive_run):
+        # Also stop early if a stream stops reporting to the server, or (in the
+        # adaptive mode) once the mean rate is known precisely enough.
+        def over():
+            return (iperf_proc.poll() is not None or
+                    (live_abort_after and live.stalled(live_abort_after)) or
+                    (adaptive_run and live.converged(adaptive_tolerance, adaptive_confidence,
+                                                     adaptive_min_intervals)))
+
+        in_time = wait_until(over, runtime + client_grace_timeout, period = 0.5, wake = iperf_proc.exited)
+        if in_time and iperf_proc.poll() is None:
+            stalled = live_abort_after and live.stalled(live_abort_after)
+            if not stalled:
+                converged = live.converged(adaptive_tolerance, adaptive_confidence, adaptive_min_intervals)
     else:
-        sleep(10 * repetitions)
-
-    sleep(2)
-    waitcount = 1  # Positive integer. Number of 10 sec intervals to wait for the client to finish.
-    while iperf_proc.poll() == None:
-        # iperf_proc.poll() may be "False" or "None". Here we want "None" specifically, thus "not iperf_proc.poll()" won't work.
-        if waitcount:
-            tprint('\033[93mThe Iperf test is not over yet.\033[0m Waiting for 10 more seconds...')
-            sleep(10)
-            waitcount -= 1
-        else:
-            iperf_proc.kill()
-            sleep(2)
+        in_time = wait_for_exit(iperf_proc, runtime + client_grace_timeout)
+
+    if stalled:
+        tprint('\033[91mNo reports from stream(s) ' + stalled + ' for ' + str(live_abort_after) +
+               ' s.\033[0m Aborting the test.')
+        stop_client(conn, iperf_proc, port)
+    elif converged is not None:
+        # Only the complete intervals count (the last one is cut short).
+        repetitions = live.complete_intervals()
+        tprint('\033[92mThe rate converged\033[0m after ' + str(repetitions) + ' intervals (' +
+               format(adaptive_confidence * 100, 'g') + '% CI: +/-' + format(converged * 100, '.2f') +
+               '%). Stopping the client.')
+        stop_client(conn, iperf_proc, port)
+    elif not in_time:
+        tprint('\033[93mThe Iperf test is not over in time.\033[0m Killing the client.')
+        iperf_proc.kill()
+        iperf_proc.wait()
+
+    ended = time()
+    stop_telemetry(telemetry, init_name)
+    if cpu:
+        cpu.stop()
+        cpu.save(init_name + '_cpustat.npz')
+    elif localpart:
+        if converged is not None:
+            # mpstat prints its averages and exits on SIGINT.
+            mpstat_proc.send_signal(signal.SIGINT)
 
-    if not iperf_proc.poll():
-        tprint('\033[92mThe ' + size_name + ' test finished.\033[0m Waiting for 10 seconds.')
-        sleep(10)
-        return True, repetitions
+        mpstat_proc.wait()
+
+    # Let the server flush its last reports.
+    with phases('settle'):
+        wait_for_quiet(server_out or init_name + '_iperf.dat')
+    if converged is not None or not iperf_proc.returncode:
+        tprint('\033[92mThe ' + size_name + ' test finished.\033[0m')
+        return True, repetitions, (started, ended)
     else:
-        tprint('\033[91mThe Iperf test failed to finish.\033[0m Skipping in 10 seconds.')
-        sleep(10)
-        return False, repetitions
+        tprint('\033[91mThe Iperf test failed to finish.\033[0m Skipping.')
+        return False, repetitions, (started, ended)
+
+
+@phases.timed('telemetry')
+def start_telemetry(endpoints, runtime):
+    '''
+    Start sampling the CPU and the interfaces of the remote clients of
+    "endpoints" ((connection, role) pairs, see Connect.telemetry()), if
+    "remote_telemetry" is set. Returns the (connection, role, sampler,
+    process) of each.
+    '''
+    if not remote_telemetry:
+        return []
+
+    # A sample per report interval, or per second for the longer intervals.
+    period = min(max(report_interval, cpu_sample_period), 1.0)
+    started = []
+    for conn, role in endpoints:
+        if conn is None or conn.conn_type == 'local':
+            continue
 
+        sampler = RemoteSampler(period, int((runtime + client_grace_timeout) / period) + 4)
+        proc = conn.telemetry(period, sampler.line)
+        if proc is not None:
+            started.append((conn, role, sampler, proc))
 
-def stop_server(conn, dir_time):
+    return started
+
+
+@phases.timed('telemetry')
+def stop_telemetry(started, init_name):
+    '''
+    Stop the samplers of start_telemetry(), and save their samples.
+    '''
+    for conn, role, sampler, proc in started:
+        sampler.stop()
+        # The loop on the client stops once its output is closed.
+        proc.kill()
+        if not sampler.save(init_name + '_' + role + '_cpustat.npz'):
+            tprint('\033[93mWARNING:\033[0m No CPU samples from ' + conn.getname() + '.')
+
+
+def stop_client(conn, iperf_proc, port = None):
+    '''
+    Stop a running Iperf client: the local process (the shell, or the SSH
+    connection), and the Iperf client itself, by the port it sends to (the
+    clients of the other pairs may run on the same machine).
+    '''
+    iperf_proc.kill()
+    conn.kill(server_stop_timeout, port or default_iperf_port, 'client')
+    iperf_proc.wait()
+
+
+@phases.timed('server_stop')
+def stop_server(conn, dir_time, server_proc = None, port = None, protocol = None, peer = None):
+    '''
+    Stop the server "server_proc" of a test, or (without it) whatever is
+    left of the tests of the pair on "conn". Only the Iperf instances on the
+    port of the pair are stopped (on the address "peer" for ping), as the
+    other pairs may share the client.
+    '''
     conn_name = conn.getname()
-    iperf_stop_command = conn.get_command('stop_iperf')
+    if kind.listens:
+        scope = {'port': port or default_iperf_port, 'side': 'server' if server_proc else 'both'}
+    else:
+        scope = {'peer': peer}
+    iperf_stop_command = conn.stop_command(**scope)
     print('Stopping previous Iperf instances on ' + conn_name + '...')
-    cmd_print(iperf_stop_command, conn_name, dir_time)
-    p = Popen(iperf_stop_command, stdout=PIPE, stderr=PIPE)
-    p.wait()
-    out, err = p.communicate()
-    if 'found' in str(err):
+    start = monotonic()
+    code, out, err = conn.kill(server_stop_timeout, **scope)
+    if server_proc:
+        # The local end of the server (the server itself, if it runs here).
+        server_proc.kill()
+    cmd_print(iperf_stop_command, conn_name, dir_time, monotonic() - start)
+    if code == stop_none_code or (conn.conn_type == 'winexe' and 'not found' in str(err)):
         print('None were running.')
         return
+    elif code == stop_no_ss_code:
+        print('\033[91mCould not stop the Iperf instances on ' + conn_name + ':\033[0m ss is not installed there.')
     elif (out or err):
         print(((out + err).strip()).decode('ascii', errors='ignore'))
 
-    sleep(10)
+    def closed():
+        # The server is gone once its process exited and the port is free.
+        if server_proc and server_proc.poll() is None:
+            return False
+
+        if not kind.listens:
+            return True
 
+        state = conn.listening(port or default_iperf_port, protocol)
+        return state is False or (state is None and server_proc is not None)
 
-def run_tests(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes,
-              streams, timestamp, test_title, protocol, tcpwin, export_dir):
-    series_time = str(timedelta(seconds = 2 * len(p_sizes) * (runtime + 30) + 20))
-    tprint('\033[92mStarting ' + protocol + ' tests.\033[0m Expected run time: ' + series_time)
-    top_dir_name = timestamp + '_' + protocol + '_' + str(streams) + '_st'
-    common_filename = protocol + '_' + str(streams) + '_st_' + timestamp
-    print_unit = 'Buffer' if protocol == 'TCP' else 'Datagram'
-    raw_data_subdir="raw-data"
-    dir_prep(join(export_dir, top_dir_name), raw_data_subdir)
-    dir_time = join(export_dir, top_dir_name, raw_data_subdir, common_filename)
-    html_name = join(export_dir, top_dir_name, common_filename + ".html")
-    one2two_images = []
-    two2one_images = []
-    all_one2two_failed = False
-    all_two2one_failed = False
-    stop_server(cl1_conn, dir_time)
-    stop_server(cl2_conn, dir_time)
-    if cl1_conn.islocal() or cl2_conn.islocal():
-        localpart = True
+    if not wait_until(closed, server_stop_timeout, period = 0.5, wake = server_proc and server_proc.exited):
+        print('\033[93mThe server port did not close in time.\033[0m Continuing anyway.')
+
+
+def get_plot_renderer():
+    '''
+    The renderer of the plots (see NM_render.py). Falls back to gnuplot if the
+    configured backend is not available.
+    '''
+    opts = {'gnuplot_bin': gnuplot_bin, 'workers': post_workers, 'persistent': gnuplot_persistent}
+    try:
+        return get_renderer(plot_backend, **opts)
+    except ImportError as err:
+        print('\033[93mWARNING:\033[0m The ' + plot_backend + ' plot backend is not available (' +
+              str(err) + '). Using gnuplot.')
+        return get_renderer('gnuplot', **opts)
+
+
+# The renderer of the plots, created by main() once the configuration is loaded.
+renderer = None
+
+
+@phases.timed('plot')
+def plot_chart(gp_outname, *args, **kwargs):
+    '''
+    write_gp() and render the chart. The gnuplot script is written only if the
+    renderer needs it.
+    '''
+    chart = write_gp(gp_outname if renderer.needs_script else None, *args, **kwargs)
+    renderer.render(chart, dirname(gp_outname))
+
+
+def test_meta(protocol, streams, direction, tcpwin, names):
+    '''
+    The metadata of the tests, as stored with the binary results.
+    '''
+    return {
+            'measurement': kind.name, 'protocol': protocol, 'streams': streams, 'direction': direction,
+            'tcp_win_size': tcpwin, 'cl1_pretty_name': names[0], 'cl2_pretty_name': names[1]
+           }
+
+
+def print_live_interval(tracker, end, rate, reports):
+    # The rate that reached the server (also for the latency tests).
+    rate_str, rate_units, _ = get_size_units_factor(rate, rate = True)
+    tprint('Live: ' + tracker.name + ': ' + format(end - tracker.interval, 'g') + '-' + format(end, 'g') +
+           ' s: ' + rate_str + ' ' + rate_units + ' (' + str(reports) + ' streams)')
+
+
+def start_live(init_name, protocol, streams, path = None, offset = 0, source = None):
+    '''
+    Follow the server output of the test while it runs (see NM_live.py).
+    "path" is the output file of the server (default: that of the test), and
+    "offset" is where the output of the test starts in it. With "source" (the
+    server process), its output lines are parsed as they arrive instead.
+    '''
+    if not live_ingest or not kind.live:
+        return None
+
+    return LiveIperf(path or init_name + '_iperf.dat', protocol, streams, name = basename(init_name),
+                     latency = kind.live == 'latency',
+                     on_interval = print_live_interval if live_console else None,
+                     interval = report_interval, offset = offset).start(source)
+
+
+def local_pid(conn, proc):
+    '''
+    The process ID of the command "proc" of "conn", if it runs on this
+    machine (remote commands are local SSH processes).
+    '''
+    return proc.pid if proc is not None and conn.islocal() else None
+
+
+@phases.timed('sync_start')
+def start_together(sync, conn):
+    '''
+    The first phase of the start of the simultaneous clients (see
+    NM_fanout.StartSync): wait for the other pairs with the dispatch latency
+    of the client "conn". Returns the common start and the latency, or None
+    and None without "sync".
+    '''
+    if not sync:
+        return None, None
+
+    lead = conn.dispatch_latency()
+    return sync(lead or 0.0), lead
+
+
+@phases.timed('sync_end')
+def common_run(sync, pair_name, span, start_at):
+    '''
+    Report the run of the client (its wall-clock start and end, "span") to
+    the other simultaneous pairs. Returns the window (s from the start of
+    the test) in which all the clients ran, and the start skew (s) of the
+    client, or None and None without "sync".
+    '''
+    if not sync:
+        return None, None
+
+    window = sync.ended(pair_name, *span)
+    if window:
+        window = (window[0] - span[0], window[1] - span[0])
+
+    return window, (span[0] - start_at if start_at else None)
+
+
+def skip_round(sync, pair_name, released = False):
+    '''
+    Take part in the round of the simultaneous pairs without running a
+    client (the test is done already, or failed), to keep the rounds of all
+    the pairs aligned. "released": the common start was already received.
+    '''
+    if sync:
+        if not released:
+            sync()
+        sync.ended(pair_name, None, None)
+
+
+@phases.timed('process')
+def process_point(init_name, p, protocol, streams, repetitions, test_completed,
+                  localpart, direction, print_unit, tcpwin, names, live = None, window = None,
+                  skew = None, cpu_names = None, nics = None):
+    '''
+    Parse, export and plot the results of a single test. This runs in the
+    background, while the next test is already being measured. With "live",
+    the Iperf output was already parsed while the test was running.
+    "names" are the pretty names of the two clients. With "window" (s from
+    the start of the test), only the intervals within it are counted, and
+    "skew" is the start skew of the client (both of simultaneous tests).
+    "cpu_names" names the machines whose CPU was measured (see
+    TestSeries.cpu_names()), and "nics" are the test interfaces of the
+    clients (see TestSeries.nics()).
+    Returns the summary rows of the test (the Iperf row without the humanly
+    readable rate, and the mpstat row or None), the image name, the CPU rows
+    of the remote clients (by role), and the NIC row (or None).
+    The Iperf row ends with the number of intervals and the half width of
+    the confidence interval of the mean rate.
+    '''
+    size_name = get_round_size_name(p)
+    tprint('Parsing the ' + size_name + ' test results...')
+    if localpart and isfile(init_name + '_cpustat.npz'):
+        # The in-process CPU samples (see NM_cpustat.py), summed up to the report intervals.
+        cpu = CpuSampler.load(init_name + '_cpustat.npz')
+        mpstat_array, tot_mpstat_mean, tot_mpstat_stdev = cpu.result(report_interval, repetitions)
+        meta = test_meta(protocol, streams, direction, tcpwin, names)
+        export_data(cpu.detail(report_interval, repetitions), init_name + '_cpu_processed.dat', detail_header,
+                    kind = 'cpu_processed', size = p, **meta)
+        export_data(cores_table(*cpu.cores(report_interval, repetitions)), init_name + '_cpu_cores.dat',
+                    cores_header, kind = 'cpu_cores', size = p, **meta)
+    elif localpart:
+        mpstat_array, tot_mpstat_mean, tot_mpstat_stdev =\
+        get_mpstat_data_single(init_name + '_mpstat.dat', mpstat_interval(report_interval))
+
+    cpu_names = cpu_names or {}
+    cpu_files = []
+    if localpart:
+        mpstat_row = [ p, tot_mpstat_mean, tot_mpstat_stdev ]
+        export_single_data(mpstat_array, init_name + '_mpstat_processed.dat',
+                           kind = 'mpstat_processed', size = p, **test_meta(protocol, streams, direction, tcpwin, names))
+        cpu_files.append((basename(init_name + '_mpstat_processed.dat'), cpu_names.get('local')))
     else:
-        localpart = False
-
-    connlist = [
-                [cl1_conn, cl2_conn, 'one2two', cl2_test_ip, one2two_images, 'Plotting cl1 --> cl2 summary...'],
-                [cl2_conn, cl1_conn, 'two2one', cl1_test_ip, two2one_images, 'Plotting cl2 --> cl1 summary...']
-               ]
-    for c in connlist:
-        [client_conn, server_conn, direction, server_addr, image_list, plot_message] = c
-        tot_iperf_mean = -1.0
-        iperf_tot = []
-        mpstat_tot = []
-        for p in p_sizes:
-            size_name = format(p, '05d') + 'B'
-            init_name = dir_time + '_' + direction + '_' + size_name
+        mpstat_row = None
+
+    # The CPU and the interfaces of the remote clients (see start_telemetry()).
+    remote_rows = {}
+    for role in ('client', 'server'):
+        if not isfile(init_name + '_' + role + '_cpustat.npz'):
+            continue
+
+        samples = CpuSamples.load(init_name + '_' + role + '_cpustat.npz')
+        meta = dict(test_meta(protocol, streams, direction, tcpwin, names), role = role, size = p)
+        cpu_array, cpu_mean, cpu_stdev = samples.result(report_interval, repetitions)
+        export_single_data(cpu_array, init_name + '_' + role + '_cpu.dat', kind = 'remote_cpu_processed', **meta)
+        if samples.ifaces:
+            export_data(samples.net(report_interval, repetitions), init_name + '_' + role + '_net.dat',
+                        net_header + ' Ifaces: ' + ' '.join(str(n) + '=' + name for n, name in enumerate(samples.ifaces)),
+                        kind = 'net_processed', ifaces = samples.ifaces, **meta)
+        remote_rows[role] = [ p, cpu_mean, cpu_stdev ]
+        cpu_files.append((basename(init_name + '_' + role + '_cpu.dat'), cpu_names.get(role)))
+
+    if live:
+        (iperf_array, tot_iperf_mean, tot_iperf_stdev, server_fault) = live.result(repetitions)
+    else:
+        (iperf_array, tot_iperf_mean, tot_iperf_stdev, server_fault) =\
+        kind.parse(init_name + '_iperf.dat', protocol, streams, repetitions, report_interval, quiet_parsing)
+
+    trimmed = 0
+    if window:
+        # Only the common run of the simultaneous clients.
+        iperf_array, tot_iperf_mean, tot_iperf_stdev, trimmed = trim_to_window(iperf_array, window,
+                                                                                report_interval)
+        if trimmed:
+            tprint('Not counting ' + str(trimmed) + ' interval(s) of the ' + size_name +
+                   ' test outside the common run of the simultaneous clients.')
+
+    if server_fault == 'too_few':
+        print('\033[93mWARNING:\033[0m The server received fewer connections than expected'
+              ' in the ' + size_name + ' test.')
+    elif server_fault == 'too_many':
+        print('\033[93mWARNING:\033[0m The server received more connections than expected'
+              ' in the ' + size_name + ' test.')
+
+    nic_row = None
+    nic_file = None
+    nic_rates = {}
+    for role, samples_file, iface in nics or []:
+        # The rates that the interfaces counted (see NM_niccheck.py): sent by the client, received by the server.
+        if isfile(init_name + samples_file):
+            samples = CpuSamples.load(init_name + samples_file)
+            nic_rates[role] = payload_rates(samples, iface, 'tx' if role == 'client' else 'rx', protocol,
+                                            report_interval, repetitions)
+
+    if any(r is not None for r in nic_rates.values()):
+        nic_table, nic_means, nic_diffs = compare(iperf_array, nic_rates.get('client'), nic_rates.get('server'),
+                                                  report_interval)
+        export_data(nic_table, init_name + '_nic.dat', nic_header, kind = 'nic_processed', size = p,
+                    ifaces = dict((role, iface) for role, _, iface in nics),
+                    **test_meta(protocol, streams, direction, tcpwin, names))
+        flagged = diverged(nic_diffs, nic_tolerance)
+        if flagged:
+            print('\033[93mWARNING:\033[0m The interface counters differ from the Iperf rate in the ' +
+                  size_name + ' test: ' + describe(flagged) + '.')
+        nic_row = [ p, tot_iperf_mean ] + nic_means + nic_diffs
+        nic_file = basename(init_name + '_nic.dat')
+
+    # The precision of the mean rate: the confidence interval over the intervals.
+    _, ci, intervals = confidence_interval(iperf_array[:,1], adaptive_confidence)
+    export_single_data(iperf_array, init_name + '_iperf_processed.dat', kind.column, kind.extra_columns,
+                       kind = 'iperf_processed', size = p, completed = test_completed, server_fault = server_fault,
+                       mean = tot_iperf_mean, stdev = tot_iperf_stdev, intervals = intervals, ci = ci,
+                       confidence = adaptive_confidence, start_skew = skew, trimmed = trimmed,
+                       **test_meta(protocol, streams, direction, tcpwin, names))
+    tprint('Plotting the ' + size_name + ' test...')
+    plot_chart(init_name + '.plt', basename(init_name + '_iperf_processed.dat'),
+              cpu_files, basename(init_name + '.png'),
+              tot_iperf_mean, protocol, streams, print_unit, names[0],
+              names[1], plot_type = 'singlesize', direction = direction,
+              finished = test_completed, server_fault = server_fault,
+              packet_size = p, tcpwin = tcpwin, nic_dat_file = nic_file)
+    iperf_row = [ yes_and_no(test_completed, server_fault), p, tot_iperf_mean, tot_iperf_stdev,
+                  intervals, ci ]
+    return iperf_row, mpstat_row, basename(init_name + '.png'), remote_rows, nic_row
+
+
+class TestSeries(object):
+    '''
+    The tests of one protocol and number of streams between a pair of clients,
+    in both directions: the result directory, the background processing of
+    the tests, and the summaries and the html report once all of them are
+    done. The arguments are those of run_tests().
+    '''
+    def __init__(self, cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes,
+                 streams, timestamp, test_title, protocol, tcpwin, export_dir,
+                 pair_name = '', names = None):
+        self.p_sizes = p_sizes
+        self.streams = streams
+        self.test_title = test_title
+        self.protocol = protocol
+        self.tcpwin = tcpwin
+        self.export_dir = export_dir
+        self.pair_name = pair_name
+        self.names = names or (cl1_pretty_name, cl2_pretty_name)
+        top_dir_name = (pair_name + '_' if pair_name else '') + timestamp + '_' + protocol + '_' + str(streams) + '_st'
+        self.common_filename = protocol + '_' + str(streams) + '_st_' + timestamp
+        self.print_unit = 'Buffer' if protocol == 'TCP' else 'Datagram'
+        self.raw_data_subdir = 'raw-data'
+        dir_prep(join(export_dir, top_dir_name), self.raw_data_subdir)
+        self.dir_time = join(export_dir, top_dir_name, self.raw_data_subdir, self.common_filename)
+        self.html_name = join(export_dir, top_dir_name, self.common_filename + '.html')
+        self.localpart = cl1_conn.islocal() or cl2_conn.islocal()
+        # The parsing and plotting of every test overlaps with the next measurement.
+        self.post = PostProcessor(post_workers)
+        self.connlist = [
+                         [cl1_conn, cl2_conn, 'one2two', cl2_test_ip, cl1_test_ip, [],
+                          'Plotting cl1 --> cl2 summary...', []],
+                         [cl2_conn, cl1_conn, 'two2one', cl1_test_ip, cl2_test_ip, [],
+                          'Plotting cl2 --> cl1 summary...', []]
+                        ]
+        # The number of tests that did not report back yet.
+        self.pending = 2 * len(p_sizes)
+        # The start skews of the simultaneous tests.
+        self.skews = []
+
+    def direction(self, direction):
+        '''
+        The client connection, server connection, server address and client
+        address of "direction".
+        '''
+        for c in self.connlist:
+            if c[2] == direction:
+                return c[0], c[1], c[3], c[4]
+
+    def cpu_names(self, direction):
+        '''
+        The names of the machines whose CPU is measured in "direction": the
+        local one, and the client and the server side.
+        '''
+        client_conn, server_conn, _, _ = self.direction(direction)
+        sender, receiver = self.names if direction == 'one2two' else self.names[::-1]
+        names = {'client': sender, 'server': receiver}
+        if client_conn.islocal():
+            names['local'] = sender
+        elif server_conn.islocal():
+            names['local'] = receiver
+
+        return names
+
+    def nics(self, direction):
+        '''
+        The test interfaces of the clients in "direction", whose counters
+        are checked against the Iperf rates: (role, samples file suffix,
+        interface) for every client that has its interfaces sampled.
+        '''
+        if not nic_check or not kind.wire_rate:
+            return []
+
+        client_conn, server_conn, server_addr, client_addr = self.direction(direction)
+        nics = []
+        for role, conn, addr in (('client', client_conn, client_addr), ('server', server_conn, server_addr)):
+            if conn.conn_type == 'local':
+                samples_file = '_cpustat.npz'
+            elif remote_telemetry and conn.conn_type in ('ssh', 'netns'):
+                samples_file = '_' + role + '_cpustat.npz'
+            else:
+                continue
+
+            iface = conn.interface(addr)
+            if iface:
+                nics.append((role, samples_file, iface))
+
+        return nics
+
+    def init_name(self, direction, p):
+        return self.dir_time + '_' + direction + '_' + format(p, '05d') + 'B'
+
+    def _points(self, direction):
+        return [c[7] for c in self.connlist if c[2] == direction][0]
+
+    def key(self, direction, p):
+        return point_key(self.pair_name, self.protocol, self.streams, direction, p)
+
+    def resume_point(self, direction, p):
+        '''
+        If the test was already done (in the journal of an interrupted run),
+        process it again from its output files, and return True.
+        '''
+        done = journal.done(self.key(direction, p)) if journal is not None else None
+        if done is None:
+            return False
+
+        tprint('The ' + get_round_size_name(p) + ' ' + direction + ' test is already done.')
+        self.add_point(direction, p, done['repetitions'], done['completed'], window = done.get('window'),
+                       skew = done.get('start_skew'), resumed = True)
+        return True
+
+    def add_point(self, direction, p, repetitions, test_completed, live = None, window = None, skew = None,
+                  resumed = False):
+        '''
+        Hand the finished test over to the background processing, and record
+        it in the journal. "window" and "skew" are those of common_run().
+        '''
+        self.pending -= 1
+        if skew is not None:
+            self.skews.append(skew)
+        if journal is not None and not resumed:
+            journal.record(self.key(direction, p), repetitions = repetitions, completed = bool(test_completed),
+                           window = window, start_skew = skew)
+
+        self._points(direction).append((p, self.post.submit(process_point, self.init_name(direction, p), p,
+                                                            self.protocol, self.streams, repetitions,
+                                                            test_completed, self.localpart, direction,
+                                                            self.print_unit, self.tcpwin, self.names, live,
+                                                            window, skew, self.cpu_names(direction),
+                                                            self.nics(direction))))
+
+    def add_failure(self, direction, p):
+        '''
+        The measurement itself failed (already reported).
+        '''
+        self.pending -= 1
+        self._points(direction).append((p, None))
+
+    @phases.timed('finish')
+    def finish(self):
+        '''
+        Wait for the processing of all the tests, and write the summaries and
+        the html report.
+        '''
+        protocol, streams, tcpwin, names = self.protocol, self.streams, self.tcpwin, self.names
+        print_unit, dir_time, raw_data_subdir = self.print_unit, self.dir_time, self.raw_data_subdir
+        all_one2two_failed = False
+        all_two2one_failed = False
+        # The tests whose NIC counters differ from the Iperf rates.
+        nic_flagged = []
+        print('Waiting for the results processing to finish...')
+        with phases('drain'):
+            self.post.drain()
+        for c in self.connlist:
+            [client_conn, server_conn, direction, server_addr, client_addr, image_list, plot_message, points] = c
             iperf_sumname = dir_time + '_' + direction + '_iperf_summary'
             mpstat_sumname = dir_time + '_' + direction + '_mpstat_summary'
             combined_sumname = dir_time + '_' + direction + '_summary'
+            tot_iperf_mean = -1.0
+            iperf_tot = []
+            mpstat_tot = []
+            nic_tot = []
+            remote_tot = OrderedDict()
+            for p, point in points:
+                try:
+                    if point is None:
+                        # The measurement itself failed (already reported).
+                        raise ValueError
+                    iperf_row, mpstat_row, image, remote_rows, nic_row = point.result()
+                except ValueError as err:
+                    if err.args:
+                        tprint('\033[91mERROR:\033[0m ' + err.args[0] + ' Skipping test...')
+                    image_list.append(get_round_size_name(p, gap = True))
+                    iperf_tot.append([ -1, p, 0, 0, 0, 0, 0 ])
+                    continue
+
+                tot_iperf_mean = iperf_row[2]
+                # Get the "humanly readable" rate and its units.
+                # This is just to put in the output data file, not for any calculations.
+                # The units will be constant, and will be fixed after the first measurement.
+                try:
+                    hr_net_rate = tot_iperf_mean / float(rate_factor)
+                except:
+                    _, rate_units, rate_factor = get_value_units_factor(tot_iperf_mean)
+                    hr_net_rate = tot_iperf_mean / float(rate_factor)
+
+                if mpstat_row:
+                    mpstat_tot.append(mpstat_row)
+                for role, row in remote_rows.items():
+                    remote_tot.setdefault(role, []).append(row)
+                if nic_row:
+                    nic_tot.append(nic_row)
+                    flagged = diverged(nic_row[4:], nic_tolerance)
+                    if flagged:
+                        nic_flagged.append(direction + ' ' + get_round_size_name(p) + ' (' + describe(flagged) + ')')
+                image_list.append(join(raw_data_subdir, image))
+                iperf_tot.append(iperf_row[:4] + [ hr_net_rate ] + iperf_row[4:])
+
+            if tot_iperf_mean > 0.0:
+                print(plot_message)
+                meta = test_meta(protocol, streams, direction, tcpwin, names)
+                units = kind.base_units()
+                export_data(iperf_tot, iperf_sumname + '.dat',
+                            'TestOK ' + print_unit + 'Size(B) ' + kind.short + '(' + units + ') Stdev(' + units + ') ' +
+                            kind.short + '(' + rate_units + ') Intervals CI' + format(adaptive_confidence * 100, 'g') +
+                            '(' + units + ')',
+                            kind = 'iperf_summary', rate_units = rate_units, confidence = adaptive_confidence, **meta)
+
+                cpu_names = self.cpu_names(direction)
+                cpu_files = []
+                if self.localpart:
+                    export_data(mpstat_tot, mpstat_sumname + '.dat', print_unit + 'Size(B) Frac Stdev',
+                                kind = 'mpstat_summary', **meta)
+                    cpu_files.append((basename(mpstat_sumname + '.dat'), cpu_names.get('local')))
+
+                for role, rows in remote_tot.items():
+                    cpu_sumname = dir_time + '_' + direction + '_' + role + '_cpu_summary.dat'
+                    export_data(rows, cpu_sumname, print_unit + 'Size(B) Frac Stdev', kind = 'remote_cpu_summary',
+                                role = role, **meta)
+                    cpu_files.append((basename(cpu_sumname), cpu_names[role]))
+
+                nic_sumname = None
+                if nic_tot:
+                    nic_sumname = basename(dir_time + '_' + direction + '_nic_summary.dat')
+                    export_data(nic_tot, dir_time + '_' + direction + '_nic_summary.dat',
+                                print_unit + 'Size(B) Iperf(b/s) Sender(b/s) Receiver(b/s) SenderDiff ReceiverDiff',
+                                kind = 'nic_summary', tolerance = nic_tolerance, **meta)
+
+                non_failed_BW = [l[2] for l in iperf_tot if l[2]]
+                tot_iperf_mean = sum(non_failed_BW)/len(non_failed_BW)
+                plot_chart(combined_sumname + '.plt', basename(iperf_sumname + '.dat'),
+                          cpu_files, basename(combined_sumname + '.png'),
+                          tot_iperf_mean, protocol, streams, print_unit, names[0],
+                          names[1], plot_type = 'multisize', direction = direction,
+                          server_fault = np.array(iperf_tot)[:,0], packet_size = np.mean(self.p_sizes),
+                          tcpwin = tcpwin, nic_dat_file = nic_sumname)
+            elif direction == 'one2two':
+                all_one2two_failed = True
+            else:
+                all_two2one_failed = True
+
+        notes = []
+        if self.skews:
+            notes.append('Simultaneous tests. Start skew of the clients: ' + skew_summary(self.skews) +
+                         '. The intervals outside the common run of all the clients are not counted.')
+        if nic_flagged:
+            notes.append('The interface counters differ from the Iperf rates by more than ' +
+                         format(nic_tolerance * 100, 'g') + '% in: ' + ', '.join(nic_flagged) + '.')
+        note = '<br>\n'.join(notes) or None
+
+        print('Exporting html...')
+        gen_html(self.test_title,
+                 join(raw_data_subdir, self.common_filename + '_one2two_summary.png'),
+                 join(raw_data_subdir, self.common_filename + '_two2one_summary.png'),
+                 self.connlist[0][5], self.connlist[1][5], self.html_name, protocol, streams,
+                 all_one2two_failed, all_two2one_failed, print_unit, self.localpart,
+                 names[0], names[1], tcpwin, note)
+        if result_index:
+            # Add the new summaries to the results catalog (see NM_index.py).
+            with catalog_lock, phases('catalog'):
+                catalog([self.export_dir], join(self.export_dir, result_index))
+
+
+def run_tests(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes,
+              streams, timestamp, test_title, protocol, tcpwin, export_dir,
+              pair_name = '', port = None, names = None, sync = None):
+    '''
+    Test one pair of clients in both directions, for all the sizes, with a
+    new server for every test. With several pairs, "pair_name" prefixes the
+    result directory, "port" is the Iperf port of the pair, "names" are the
+    pretty names of the clients (default: cl1_pretty_name and
+    cl2_pretty_name), and "sync" is the start of the simultaneous pairs
+    (see NM_fanout.StartSync).
+    '''
+    overhead = overhead_tracker(join(export_dir, overhead_store))
+    restarts = overhead_tracker(join(export_dir, restart_store))
+    series_time = str(timedelta(seconds = int(overhead.estimate(runtime, 2 * len(p_sizes)))))
+    tprint('\033[92mStarting ' + protocol + ' ' + kind.name + ' tests' + (' of ' + pair_name if pair_name else '') +
+           '.\033[0m Expected run time: ' + series_time)
+    series = TestSeries(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes, streams, timestamp,
+                        test_title, protocol, tcpwin, export_dir, pair_name, names)
+    dir_time = series.dir_time
+    stop_server(cl1_conn, dir_time, port = port, peer = cl2_test_ip)
+    stop_server(cl2_conn, dir_time, port = port, peer = cl1_test_ip)
+    for direction in directions:
+        client_conn, server_conn, server_addr, client_addr = series.direction(direction)
+        for p in p_sizes:
+            if series.resume_point(direction, p):
+                skip_round(sync, pair_name)
+                continue
+
+            init_name = series.init_name(direction, p)
             print('++++++++++++++++++++++++++++++++++++++++++++++++++')
+            point_start = monotonic()
+            live = None
+            released = False
             try:
-                run_server(protocol, init_name, dir_time, server_conn, tcpwin)
-                test_completed, repetitions = run_client(server_addr, runtime, p, streams,
-                                                         init_name, dir_time, protocol,
-                                                         client_conn, localpart, tcpwin)
-                stop_server(server_conn, dir_time)
-                print('Parsing results...')
-                if localpart:
-                    mpstat_array, tot_mpstat_mean, tot_mpstat_stdev = get_mpstat_data_single(init_name + '_mpstat.dat')
-                    mpstat_tot.append([ p, tot_mpstat_mean, tot_mpstat_stdev ])
-                    export_single_data(mpstat_array, init_name + '_mpstat_processed.dat')
-                    mpstat_single_file = basename(init_name + '_mpstat_processed.dat')
-                else:
-                    mpstat_single_file = None
+                server_proc = run_server(protocol, init_name, dir_time, server_conn, tcpwin, port, client_addr)
+                server_ready = monotonic()
+                live = start_live(init_name, protocol, streams, source = server_proc)
+                # Release the clients of all the simultaneous pairs together.
+                start_at, lead = start_together(sync, client_conn)
+                released = True
+                test_completed, repetitions, span = run_client(server_addr, runtime, p, streams,
+                                                               init_name, dir_time, protocol,
+                                                               client_conn, series.localpart, tcpwin, live, port,
+                                                               start_at = start_at, lead = lead,
+                                                               server_conn = server_conn, server_proc = server_proc)
+                window, skew = common_run(sync, pair_name, span, start_at)
+                client_done = monotonic()
+                stop_server(server_conn, dir_time, server_proc, port, protocol, client_addr)
+                if live:
+                    live.stop()
+                overhead.record(monotonic() - point_start, runtime)
+                # What a server restart costs (see NM_planner.py).
+                restarts.record(server_ready - point_start + monotonic() - client_done, 0)
+            except ValueError as err:
+                if live:
+                    live.stop()
+                tprint('\033[91mERROR:\033[0m ' + err.args[0] + ' Skipping test...')
+                skip_round(sync, pair_name, released)
+                series.add_failure(direction, p)
+                print('==================================================')
+                continue
+
+            series.add_point(direction, p, repetitions, test_completed, live, window, skew)
+            print('==================================================')
+
+    series.finish()
 
-                (iperf_array, tot_iperf_mean, tot_iperf_stdev, server_fault) =\
-                get_iperf_data_single(init_name + '_iperf.dat', protocol, streams, repetitions)
-                if server_fault == 'too_few':
-                    print('\033[93mWARNING:\033[0m The server received fewer connections than expected.')
-                elif server_fault == 'too_many':
-                    print('\033[93mWARNING:\033[0m The server received more connections than expected.')
 
+class SharedServer(object):
+    '''
+    A long-lived server for a group of planned tests (see NM_planner.py). The
+    tests are served back to back and write to one output file, "log_name" +
+    "_iperf.dat". Every test gets its own part of it, in the usual
+    "_iperf.dat" file of the test. If the server dies, it is started again
+    (with a new output file).
+    '''
+    def __init__(self, conn, protocol, tcpwin, port, peer_addr, log_name, dir_time):
+        self.conn = conn
+        self.protocol = protocol
+        self.tcpwin = tcpwin
+        self.port = port
+        self.peer_addr = peer_addr
+        self.log_name = log_name
+        self.dir_time = dir_time
+        self.proc = None
+        self.starts = 0
+        self.start_cost = 0.0
+
+    def start(self):
+        start = monotonic()
+        if self.starts:
+            # Whatever is left of the server that stopped.
+            stop_server(self.conn, self.dir_time, port = self.port)
+        # Do not overwrite the output of an earlier server (e.g. of a resumed run).
+        name = self.log_name
+        while isfile(name + '_iperf.dat'):
+            self.starts += 1
+            name = self.log_name + '_' + str(self.starts)
+
+        self.proc = run_server(self.protocol, name, self.dir_time, self.conn, self.tcpwin, self.port,
+                               self.peer_addr)
+        self.path = name + '_iperf.dat'
+        self.starts += 1
+        self.start_cost = monotonic() - start
+
+    def begin(self):
+        '''
+        Get ready for the next test. Returns where its output starts.
+        '''
+        if self.proc is None or self.proc.poll() is not None:
+            if self.proc is not None:
+                print('\033[93mWARNING:\033[0m The ' + self.protocol + ' server on ' + self.conn.getname() +
+                      ' stopped. Starting it again.')
+            self.start()
+
+        return getsize(self.path) if isfile(self.path) else 0
+
+    def end(self, offset, init_name):
+        '''
+        Copy the output of the test that began at "offset" to its own file
+        (once run_client() let the server flush its last reports).
+        '''
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        with open(init_name + '_iperf.dat', 'wb') as out:
+            out.write(data)
+
+    def stop(self):
+        if self.proc is not None:
+            stop_server(self.conn, self.dir_time, self.proc, self.port, self.protocol)
+            self.proc = None
+
+
+def run_planned(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes,
+                stream_list, proto_list, timestamp, test_title, tcpwin, export_dir,
+                pair_name = '', port = None, names = None, sync = None):
+    '''
+    All the tests of one pair of clients, as planned by NM_planner.py: the
+    tests that can share a server run back to back on one long-lived server.
+    The results are the same files and reports as those of run_tests().
+    '''
+    overhead = overhead_tracker(join(export_dir, overhead_store))
+    restarts = overhead_tracker(join(export_dir, restart_store))
+    matrix = build_matrix(proto_list, stream_list, p_sizes)
+    groups = plan_runs(matrix, tcpwin, port)
+    tprint('\033[92mStarting the planned ' + kind.name + ' tests' + (' of ' + pair_name if pair_name else '') +
+           '.\033[0m Expected run time: ' +
+           str(timedelta(seconds = int(overhead.estimate(runtime, len(matrix), len(groups) * restarts.overhead())))))
+    print_plan(groups, len(matrix), restarts.overhead(),
+               {'one2two': cl2_conn.getname(), 'two2one': cl1_conn.getname()})
+    series = OrderedDict()
+    for planned in matrix:
+        key = (planned.protocol, planned.streams)
+        if key not in series:
+            series[key] = TestSeries(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime, p_sizes,
+                                     planned.streams, timestamp, test_title, planned.protocol, tcpwin,
+                                     export_dir, pair_name, names)
+
+    first = next(iter(series.values()))
+    stop_server(cl1_conn, first.dir_time, port = port, peer = cl2_test_ip)
+    stop_server(cl2_conn, first.dir_time, port = port, peer = cl1_test_ip)
+    for group in groups:
+        owner = series[(group.protocol, group.runs[0].streams)]
+        client_conn, server_conn, server_addr, client_addr = owner.direction(group.direction)
+        server = SharedServer(server_conn, group.protocol, tcpwin, port, client_addr,
+                              owner.dir_time + '_' + group.direction + '_server', owner.dir_time)
+        for planned in group.runs:
+            test = series[(planned.protocol, planned.streams)]
+            if test.resume_point(planned.direction, planned.size):
+                skip_round(sync, pair_name)
+                continue
+
+            init_name = test.init_name(planned.direction, planned.size)
+            print('++++++++++++++++++++++++++++++++++++++++++++++++++')
+            point_start = monotonic()
+            live = None
+            released = False
+            try:
+                offset = server.begin()
+                live = start_live(init_name, planned.protocol, planned.streams, server.path, offset, server.proc)
+                # Release the clients of all the simultaneous pairs together.
+                start_at, lead = start_together(sync, client_conn)
+                released = True
+                test_completed, repetitions, span = run_client(server_addr, runtime, planned.size, planned.streams,
+                                                               init_name, test.dir_time, planned.protocol,
+                                                               client_conn, test.localpart, tcpwin, live, port,
+                                                               server.path, start_at, lead, server_conn, server.proc)
+                window, skew = common_run(sync, pair_name, span, start_at)
+                server.end(offset, init_name)
+                if live:
+                    live.stop()
+                overhead.record(monotonic() - point_start, runtime)
             except ValueError as err:
+                if live:
+                    live.stop()
                 tprint('\033[91mERROR:\033[0m ' + err.args[0] + ' Skipping test...')
-                image_list.append(get_round_size_name(p, gap = True))
-                iperf_tot.append([ -1, p, 0, 0, 0 ])
+                skip_round(sync, pair_name, released)
+                test.add_failure(planned.direction, planned.size)
                 print('==================================================')
                 continue
 
-            # Get the "humanly readable" rate and its units.
-            # This is just to put in the output data file, not for any calculations.
-            # The units will be constant, and will be fixed after the first measurement.
-            try:
-                hr_net_rate = tot_iperf_mean / float(rate_factor)
-            except:
-                _, rate_units, rate_factor = get_size_units_factor(tot_iperf_mean, rate=True)
-                hr_net_rate = tot_iperf_mean / float(rate_factor)
-
-            export_single_data(iperf_array, init_name + '_iperf_processed.dat')
-            write_gp(init_name + '.plt', basename(init_name + '_iperf_processed.dat'),
-                     mpstat_single_file, basename(init_name + '.png'),
-                     tot_iperf_mean, protocol, streams, print_unit, cl1_pretty_name,
-                     cl2_pretty_name, plot_type = 'singlesize', direction = direction,
-                     finished = test_completed, server_fault = server_fault,
-                     packet_size = p, tcpwin = tcpwin)
-            print('Plotting...')
-            pr = Popen([gnuplot_bin, basename(init_name + '.plt')],
-                       cwd = dirname(dir_time))
-            pr.wait()
-            image_list.append(join(raw_data_subdir, basename(init_name + '.png')))
-            iperf_tot.append([ yes_and_no(test_completed, server_fault), p,
-                              tot_iperf_mean, tot_iperf_stdev, hr_net_rate ])
+            test.add_point(planned.direction, planned.size, repetitions, test_completed, live, window, skew)
             print('==================================================')
 
-        if tot_iperf_mean > 0.0:
-            print(plot_message)
-            np.savetxt(iperf_sumname + '.dat', iperf_tot, fmt='%g',
-                       header= ('TestOK ' + print_unit +
-                                'Size(B) BW(b/s) Stdev(b/s) BW(' +
-                                rate_units + ')'))
-
-            if localpart:
-                np.savetxt(mpstat_sumname + '.dat', mpstat_tot, fmt = '%g',
-                           header = print_unit + 'Size(B) Frac Stdev')
-                mpstat_ser_file = basename(mpstat_sumname + '.dat')
-            else:
-                mpstat_ser_file = None
-
-            non_failed_BW = [l[2] for l in iperf_tot if l[2]]
-            tot_iperf_mean = sum(non_failed_BW)/len(non_failed_BW)
-            write_gp(combined_sumname + '.plt', basename(iperf_sumname + '.dat'),
-                     mpstat_ser_file, basename(combined_sumname + '.png'),
-                     tot_iperf_mean, protocol, streams, print_unit, cl1_pretty_name,
-                     cl2_pretty_name, plot_type = 'multisize', direction = direction,
-                     server_fault = np.array(iperf_tot)[:,0], packet_size = np.mean(p_sizes),
-                     tcpwin = tcpwin)
-            pr = Popen([gnuplot_bin, basename(combined_sumname + '.plt')], cwd=dirname(dir_time))
-            pr.wait()
-        elif direction == 'one2two':
-            all_one2two_failed = True
-        else:
-            all_two2one_failed = True
-
-    print('Exporting html...')
-    gen_html(test_title,
-             join(raw_data_subdir, common_filename + '_one2two_summary.png'),
-             join(raw_data_subdir, common_filename + '_two2one_summary.png'),
-             one2two_images, two2one_images, html_name, protocol, streams,
-             all_one2two_failed, all_two2one_failed, print_unit, localpart,
-             cl1_pretty_name, cl2_pretty_name, tcpwin)
+        if server.starts:
+            stop_start = monotonic()
+            server.stop()
+            restarts.record(server.start_cost + monotonic() - stop_start, 0)
+        # Report every series as soon as all of its tests are done.
+        for key in list(series):
+            if series[key].pending == 0:
+                series.pop(key).finish()
 
 
 class Multitest(object):
     def __init__(self, cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip, runtime,
-                 p_sizes, timestamp, test_title, tcpwin, export_dir):
+                 p_sizes, timestamp, test_title, tcpwin, export_dir,
+                 pair_name = '', port = None, names = None, sync = None):
         self.cl1_conn    = cl1_conn
         self.cl2_conn    = cl2_conn
         self.cl1_test_ip = cl1_test_ip
@@ -913,46 +1874,177 @@ class Multitest(object):
         self.test_title  = test_title
         self.tcpwin      = tcpwin
         self.export_dir  = export_dir
+        self.pair_name   = pair_name
+        self.port        = port
+        self.names       = names
+        self.sync        = sync
 
     def run_tests_for_protocols(self, streams, proto_list):
         for p in proto_list:
             run_tests(self.cl1_conn, self.cl2_conn, self.cl1_test_ip,
                       self.cl2_test_ip, self.runtime, self.p_sizes, streams,
                       self.timestamp, self.test_title, p, self.tcpwin,
-                      self.export_dir)
+                      self.export_dir, self.pair_name, self.port, self.names,
+                      self.sync)
 
     def run_tests_for_streams(self, stream_list, proto_list):
         for s in stream_list:
-            if str(s).isdigit():
-                self.run_tests_for_protocols(s, proto_list)
-            else:
+            if not str(s).isdigit():
                 print('\033[91mERROR:\033[0m Can not test for ' + s +
                       ' streams. Please verify that the number of streams'
                       ' is a positive integer.')
                 sys.exit(1)
 
+        if shared_servers and kind.listens:
+            run_planned(self.cl1_conn, self.cl2_conn, self.cl1_test_ip,
+                        self.cl2_test_ip, self.runtime, self.p_sizes, stream_list,
+                        proto_list, self.timestamp, self.test_title, self.tcpwin,
+                        self.export_dir, self.pair_name, self.port, self.names,
+                        self.sync)
+        else:
+            for s in stream_list:
+                self.run_tests_for_protocols(s, proto_list)
+
+
+def run_pair(pair, sync):
+    '''
+    All the tests of one client pair (a Pair of NM_fanout.py).
+    '''
+    cl_a, cl_b = pair.cl_a, pair.cl_b
+    # The native engine (see NM_engine.py) runs instead of Iperf on both clients.
+    engine = engine_command.split() if traffic_engine == 'native' else None
+    cl_a_conn = Connect(cl_a.access_method, cl_a.conn_ip, cl_a.name, engine or cl_a.iperf, cl_a.ssh_port,
+                        cl_a.creds, ssh_multiplex)
+    cl_b_conn = Connect(cl_b.access_method, cl_b.conn_ip, cl_b.name, engine or cl_b.iperf, cl_b.ssh_port,
+                        cl_b.creds, ssh_multiplex)
+    # Only the simultaneous pairs need their own ports.
+    port = pair.port if sync else None
+    testinsts = Multitest(cl_a_conn, cl_b_conn, cl_a.test_ip, cl_b.test_ip,
+                          run_duration, test_range, rundate, title,
+                          tcp_win_size, export_dir, pair.name, port,
+                          (cl_a.pretty_name, cl_b.pretty_name), sync)
+    testinsts.run_tests_for_streams(streams, protocols)
+    # Shut down the clients if needed.
+    # IF ONE OF THE CLIENTS IS LOCAL, IT WILL NOT SHUT DOWN.
+    if shutdown:
+        cl_a_conn.shutdown()
+        cl_b_conn.shutdown()
+
+
+def load_config(name):
+    '''
+    Use the parameters of the configuration module "name" (e.g. one of the
+    NetMeter*Config.py files). What it does not set keeps the value of
+    NetMeterConfig.py.
+    '''
+    global kind
+    config = import_module(name)
+    globals().update((k, v) for k, v in vars(config).items()
+                     if not k.startswith('_') and not isinstance(v, ModuleType))
+    kind = get_kind(measurement_kind)
+
+
+def main(args = None, config = None, measure = None, pairs_topology = None, pairs = None, warnings = True):
+    '''
+    Run the tests. "config", "measure", "pairs_topology" and "pairs" are the
+    defaults of the --config, --kind, --topology and --pairs options, and
+    "warnings" = False that of --no-plot-warnings.
+    '''
+    global kind, journal, rundate, renderer, client_pairs, plot_warnings
+    parser = argparse.ArgumentParser(description = 'Network performance tests between client pairs.')
+    parser.add_argument('--config', default = config,
+                        help = 'the configuration module (default: NetMeterConfig)')
+    parser.add_argument('--kind', default = measure,
+                        help = 'what to measure: ' + ', '.join(sorted(kinds)) + ' (default: measurement_kind)')
+    parser.add_argument('--topology', default = pairs_topology,
+                        help = 'which pairs to test: ' + ', '.join(sorted(topologies)) + ' (default: topology)')
+    parser.add_argument('--pairs', default = pairs,
+                        help = 'test only these client_pairs (comma-separated names; default: all of them)')
+    parser.add_argument('--no-plot-warnings', dest = 'warnings', action = 'store_false', default = warnings,
+                        help = 'no warning labels on the plots (as plot_warnings = False)')
+    parser.add_argument('--resume', action = 'store_true',
+                        help = 'continue the interrupted campaign in export_dir, skipping the finished tests')
+    args = parser.parse_args(args)
+    try:
+        if args.config:
+            load_config(args.config)
+
+        if args.kind:
+            kind = get_kind(args.kind)
+
+        if args.pairs:
+            names = args.pairs.split(',')
+            unknown = [n for n in names if n not in [p[0] for p in client_pairs]]
+            if unknown:
+                raise ValueError('Unknown client pair(s): ' + ', '.join(unknown))
+            client_pairs = [p for p in client_pairs if p[0] in names]
+
+        if not args.warnings:
+            plot_warnings = False
+
+        layout = get_topology(args.topology or topology)
+        if traffic_engine not in ('iperf', 'native'):
+            raise ValueError('Unknown traffic engine: ' + str(traffic_engine) + ' (use one of: iperf, native)')
+        if traffic_engine == 'native' and not kind.native_engine:
+            raise ValueError('The native engine does not measure ' + kind.name + ' (use traffic_engine = \'iperf\')')
+    except (ImportError, ValueError) as err:
+        print('\033[91mERROR:\033[0m ' + str(err))
+        sys.exit(1)
+
+    if renderer is not None:
+        renderer.close()
+    renderer = get_plot_renderer()
+
+    # The journal of the finished tests (see NM_journal.py)
+    journal_path = join(export_dir, journal_store)
+    if args.resume:
+        try:
+            journal = Journal.load(journal_path)
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            print('\033[91mERROR:\033[0m There is no campaign to resume in ' + export_dir + ' (' + str(err) + ').')
+            sys.exit(1)
+
+        rundate = journal.campaign['rundate']
+        if journal.campaign.get('kind') != kind.name or journal.campaign.get('topology') != layout.name:
+            print('\033[93mWARNING:\033[0m The campaign was started as ' + str(journal.campaign.get('kind')) +
+                  ' tests with the ' + str(journal.campaign.get('topology')) + ' topology.')
+        tprint('\033[92mResuming the campaign of ' + rundate + '.\033[0m ' + str(len(journal)) +
+               ' test(s) are already done.')
+    else:
+        makedirs(export_dir, exist_ok = True)
+        journal = Journal(journal_path, {'rundate': rundate, 'kind': kind.name, 'topology': layout.name,
+                                         'title': title})
+        journal.save()
 
-if __name__ == "__main__":
     # Interrupt handling
     signal.signal(signal.SIGINT, interrupt_exit)
-    # Getting connections
-    cl1_conn = Connect(access_method_cl1, cl1_conn_ip, 'cl1', cl1_iperf, ssh_port_cl1, creds_cl1)
-    cl2_conn = Connect(access_method_cl2, cl2_conn_ip, 'cl2', cl2_iperf, ssh_port_cl2, creds_cl2)
+    pairs = layout.pairs(globals())
+    parallel = max_parallel_pairs if layout.simultaneous else 1
     # Write message
-    if (len(protocols) > 1) or (len(streams) > 1):
-        total_time = str(timedelta(seconds = (2 * len(test_range) * (run_duration + 32) + 20) *
-                         len(protocols) * len(streams)))
+    rounds = 2 * len(test_range) * len(protocols) * len(streams) * -(-len(pairs) // (parallel or len(pairs)))
+    if rounds > 2 * len(test_range):
+        overhead = overhead_tracker(join(export_dir, overhead_store))
+        total_time = str(timedelta(seconds = int(overhead.estimate(run_duration, rounds))))
+        if len(pairs) > 1:
+            tprint('\033[92mStarting ' + layout.name + ' tests for ' + str(len(pairs)) + ' pair(s): ' +
+                   ', '.join(p.name for p in pairs) + '.\033[0m')
         tprint('\033[92mStarting tests for protocols: ' + ', '.join(protocols) + '.\033[0m')
         tprint('\033[92mUsing ' + ','.join(str(s) for s in streams) + ' stream(s).\033[0m')
         tprint('\033[92mExpected total run time: \033[0m' + '\033[91m' + total_time + '\033[0m')
 
+    # Serve the state of the running tests (see NM_live.py)
+    if not live_ingest and (live_status_port or live_abort_after or adaptive_run):
+        tprint('\033[93mWARNING:\033[0m live_status_port, live_abort_after and adaptive_run need live_ingest, '
+               'which is not set: they are ignored.')
+    if live_ingest and live_status_port:
+        StatusServer(live_status_port)
+        tprint('Live status: http://127.0.0.1:' + str(live_status_port) + '/')
+
     # Run tests
-    testinsts = Multitest(cl1_conn, cl2_conn, cl1_test_ip, cl2_test_ip,
-                          run_duration, test_range, rundate, title,
-                          tcp_win_size, export_dir)
-    testinsts.run_tests_for_streams(streams, protocols)
-    # Shut down the clients if needed.
-    # IF ONE OF THE CLIENTS IS LOCAL, IT WILL NOT SHUT DOWN.
-    if shutdown:
-        cl1_conn.shutdown()
-        cl2_conn.shutdown()
+    failed = layout.run(pairs, run_pair, parallel)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,10 +32,33 @@ cl2_test_ip = '192.168.67.6'
 cl1_iperf = r'iperf'
 cl2_iperf = r'iperf'
 
+# What generates the traffic: 'iperf' (the cl*_iperf executables) or 'native' (the Python
+# engine of NM_engine.py, throughput tests only). The native engine needs Python 3 on the
+# clients, and NM_engine.py copied to them (see engine_command). [str]
+# Example: 'native'
+traffic_engine = 'iperf'
+
+# The command that runs the native engine on the clients (relative paths are relative to
+# the home directory of the ssh clients, and to the working directory locally). [str]
+# Example: 'python3 /opt/NetMeter/NM_engine.py'
+engine_command = 'python3 NM_engine.py'
+
 # Path to the gnuplot executable on the local machine. [str]
 # Example: 'gnuplot'
 gnuplot_bin = 'gnuplot'
 
+# Keep gnuplot running and feed it all the plot scripts, instead of starting a new
+# gnuplot for every plot. [boolean]
+gnuplot_persistent = False
+
+# How the plots are drawn: 'gnuplot' (from the generated gnuplot scripts), or
+# 'matplotlib' (in-process, no scripts; needs matplotlib, see NM_render.py). [str]
+plot_backend = 'gnuplot'
+
+# Put a red warning label on the plots of the tests that did not finish, or that got
+# too few or too many connections. [boolean]
+plot_warnings = True
+
 # A list of packet sizes to test (preferably as powers of 2). [iterable]
 # Example: [2**x for x in range(5,17)]  (For sizes of 32B to 64KB)
 test_range = [2**x for x in range(5,6)]
@@ -44,6 +67,27 @@ test_range = [2**x for x in range(5,6)]
 # Example: 300
 run_duration = 30
 
+# The Iperf report interval, in seconds: the time resolution of the results. Down to 0.1
+# for the short-term dynamics of fast-fading links (mpstat still samples every full
+# second at least). [number]
+# Example: 0.5
+report_interval = 10
+
+# Do not print what was parsed from the latency (-e) outputs. Set to False to check
+# the parsing of field outputs (the latency scripts). [boolean]
+quiet_parsing = True
+
+# What is measured (see NM_kinds.py): 'throughput' (the Iperf rates), 'latency' (the
+# latencies of the enhanced Iperf 2 UDP output, -e) or 'ping' (ICMP round trip times;
+# the cl*_iperf paths are then those of ping). [str]
+# Example: 'latency'
+measurement_kind = 'throughput'
+
+# Which clients are tested: 'pair' (cl1 and cl2), 'sequential' (the client_pairs, one
+# after another) or 'simultaneous' (the client_pairs at the same time). [str]
+# Example: 'simultaneous'
+topology = 'pair'
+
 # The desired numbers of streams. [iterable]
 # Example: [1, 4]
 streams = [1]
@@ -54,15 +98,96 @@ streams = [1]
 # if PANDABOARD is being used, only TCP is ok.
 protocols = [ 'UDP']
 
+# The number of background workers that parse and plot the results of finished tests,
+# while the next test is already running. Set to 0 to process every test right after
+# it finishes, before the next one starts. [int]
+# Example: 2
+post_workers = 0
+
+# Plan all the tests of a pair up front, and run the tests that can share a server
+# (same direction, protocol and TCP window) back to back on one long-lived Iperf
+# server, instead of restarting the server for every test (see NM_planner.py). [boolean]
+shared_servers = False
+
+# Also save every result in binary form (.npy with a .json metadata file, see
+# NM_store.py), next to the gnuplot text files. Much faster to reload. [boolean]
+binary_results = False
+
+# The name of the results catalog (an SQLite database in the export directory, see
+# NM_index.py), which is updated after every test series. None to disable. [string or None]
+# Example: 'NetMeter_index.sqlite'
+result_index = None
+
+# Follow the server output while every test runs (see NM_live.py). The results are
+# then parsed as they arrive, and are ready as soon as the test ends. [boolean]
+live_ingest = False
+
+# Print the total rate of every interval while the tests run (with live_ingest). [boolean]
+live_console = False
+
+# Serve the state of the running test as JSON on this local port (with live_ingest).
+# None to disable. [int or None]
+# Example: 8080
+live_status_port = None
+
+# Abort a test if one of its streams sends no interval report for this long (s, with
+# live_ingest). Should be longer than report_interval. None to never abort. [number or None]
+# Example: 35
+live_abort_after = None
+
+# Adaptive run length (with live_ingest): stop every test once the confidence interval
+# of its mean rate is narrow enough, instead of always running for run_duration (which
+# is then the maximum). [boolean]
+adaptive_run = False
+
+# The adaptive mode stops a test when the half width of the confidence interval of the
+# mean rate is within this fraction of the mean. [float]
+# Example: 0.02
+adaptive_tolerance = 0.05
+
+# The confidence level of the intervals (also recorded in the summaries). [float]
+adaptive_confidence = 0.95
+
+# The adaptive mode never stops a test before this many complete report intervals. [int]
+adaptive_min_intervals = 3
+
+# How the CPU load of the local machine is measured (when it is one of the clients):
+# 'proc' (sampled in-process from /proc/stat, Linux only, see NM_cpustat.py) or
+# 'mpstat' (an mpstat process, whole seconds only). [str]
+cpu_sampler = 'mpstat'
+
+# The sampling period of the 'proc' CPU sampler, in seconds. The samples are summed
+# up to the report intervals. [number]
+# Example: 0.05
+cpu_sample_period = 0.1
+
+# Sample the CPU and the interface counters (/proc/net/dev) of the remote (ssh, Linux)
+# clients during the tests, once per report interval, over their ssh connection (see
+# NM_cpustat.py). Their CPU is then plotted and summarized as that of the local
+# machine. [boolean]
+# (The 'netns' clients are sampled the same way, inside their namespace.)
+remote_telemetry = False
+
+# Check the Iperf rates against the interface counters of the clients (throughput tests,
+# the counters of the local machine with cpu_sampler = 'proc', and of the ssh clients with
+# remote_telemetry). The test interfaces are found by the test IPs (see NM_niccheck.py). [boolean]
+# (The 'netns' clients are checked as the ssh clients.)
+nic_check = False
+
+# Flag the tests where the NIC rates differ from the Iperf rate by more than this fraction. [float]
+# Example: 0.05
+nic_tolerance = 0.1
+
 # The desired TCP window size. [str or None].
 # Set to None for default. Example: '1M'.
 tcp_win_size = None
 
 # Remote access method path: 'ssh' (for Linux), 'winexe' (for Windows),
-# or 'local' (to run on one of the clients). [str]
+# 'local' (to run on one of the clients), or 'netns' (a network namespace of the local
+# machine, named by clN_conn_ip, e.g. the test bed of NM_netns.py; run as root). [str]
 # Note: for ssh access, an ssh key is required! The key needs to be unencrypted.
 # If not present, it will be generated (if using OpenSSH).
-# Examples: 'ssh' or 'winexe' or '/home/user/bin/winexe' or 'local'
+# Examples: 'ssh' or 'winexe' or '/home/user/bin/winexe' or 'local' or 'netns'
 access_method_cl1 = 'ssh'
 access_method_cl2 = 'ssh'
 
@@ -71,6 +196,11 @@ access_method_cl2 = 'ssh'
 ssh_port_cl1 = '22'
 ssh_port_cl2 = '22'
 
+# Keep one persistent (multiplexed) SSH connection per client, and send all the commands
+# through it, instead of connecting anew for every command? (needed only for ssh access) [bool]
+# Example: True
+ssh_multiplex = True
+
 # A path to the credentials file for remote access. [str]
 # This file should contain two or three lines:
 #    username=<USERNAME> (for Windows clients it should be "Administrator", for Linux clients
@@ -93,6 +223,27 @@ title = 'Test Results (5 min per run)'
 cl1_pretty_name = 'LAPTOP-UE-0'
 cl2_pretty_name = 'LAPTOP-UE-5'
 
+# The client pairs of the 'sequential' and 'simultaneous' topologies. Every pair is
+# (name, N, M), where N and M are the numbers of the clients (the N in the clN_*
+# parameters above). The name prefixes the result directories of the pair. [iterable]
+# Example: [('pc0TOpc1', 1, 2), ('pc0TOpc2', 1, 3)]
+client_pairs = []
+
+# The Iperf port of the first simultaneous pair. Every next pair uses the next port. [int]
+# Example: 5001
+base_iperf_port = 5001
+
+# The maximal number of pairs that are tested at the same time. The pairs are tested
+# in groups of this size. Set to None to test all the pairs at once. [int or None]
+# Example: 10
+max_parallel_pairs = None
+
+# Let Iperf itself start the simultaneous clients at their common start instant
+# (--txstart-time, Iperf 2.0.14+, with the clocks of the clients synchronized, e.g.
+# by NTP). Otherwise every client is dispatched ahead of the instant by its own
+# dispatch latency. [boolean]
+iperf_txstart = False
+
 # Shut down the the clients when all tests are over?
 # This is useful when doing long/overnight tests. [bool]
 # ATTENTION: It will NOT shut down the local machine, even if it is one of the clients!
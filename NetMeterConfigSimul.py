@@ -52,6 +52,23 @@ test_range = [2**x for x in range(5,6)]
 # Example: 300
 run_duration = 1800
 
+# The Iperf report interval, in seconds: the time resolution of the results. Down to 0.1
+# for the short-term dynamics of fast-fading links (mpstat still samples every full
+# second at least). [number]
+# Example: 0.5
+report_interval = 10
+
+# What is measured (see NM_kinds.py): 'throughput' (the Iperf rates), 'latency' (the
+# latencies of the enhanced Iperf 2 UDP output, -e) or 'ping' (ICMP round trip times;
+# the cl*_iperf paths are then those of ping). [str]
+# Example: 'latency'
+measurement_kind = 'throughput'
+
+# Which clients are tested: 'pair' (cl1 and cl2), 'sequential' (the client_pairs, one
+# after another) or 'simultaneous' (the client_pairs at the same time). [str]
+# Example: 'simultaneous'
+topology = 'simultaneous'
+
 # The desired numbers of streams. [iterable]
 # Example: [1, 4]
 streams = [1, 4]
@@ -117,12 +134,21 @@ cl4_pretty_name = 'LAPTOP-UE-3'
 cl5_pretty_name = 'LAPTOP-UE-4'
 cl6_pretty_name = 'LAPTOP-UE-5'
 
-# the port for each paralell bearer connection with IPER
-port_iperf_t1 = 5001
-port_iperf_t2 = 5002
-port_iperf_t3 = 5003
-port_iperf_t4 = 5004
-port_iperf_t5 = 5005
+# The client pairs to test simultaneously. Every pair is (name, N, M), where N and M
+# are the numbers of the clients (the N in the clN_* parameters above). Any number of
+# pairs can be listed, as long as the clN_* parameters exist for all the clients used. [iterable]
+# Example: [('pc0TOpc1', 1, 2), ('pc0TOpc2', 1, 3)]
+client_pairs = [('pc0TOpc1', 1, 2), ('pc0TOpc2', 1, 3), ('pc0TOpc3', 1, 4),
+                ('pc0TOpc4', 1, 5), ('pc0TOpc5', 1, 6)]
+
+# The Iperf port of the first pair. Every next pair uses the next port. [int]
+# Example: 5001
+base_iperf_port = 5001
+
+# The maximal number of pairs that are tested at the same time. The pairs are tested
+# in groups of this size. Set to None to test all the pairs at once. [int or None]
+# Example: 10
+max_parallel_pairs = None
 
 # Shut down the the clients when all tests are over?
 # This is useful when doing long/overnight tests. [bool]
@@ -54,6 +54,27 @@ test_range = [2**x for x in range(5,6)]
 #run_duration = 10800
 run_duration = 30
 
+# The Iperf report interval, in seconds: the time resolution of the results. Down to 0.1
+# for the short-term dynamics of fast-fading links (mpstat still samples every full
+# second at least). [number]
+# Example: 0.5
+report_interval = 10
+
+# Do not print what was parsed from the latency (-e) outputs. Set to False to check
+# the parsing of field outputs (the latency scripts). [boolean]
+quiet_parsing = True
+
+# What is measured (see NM_kinds.py): 'throughput' (the Iperf rates), 'latency' (the
+# latencies of the enhanced Iperf 2 UDP output, -e) or 'ping' (ICMP round trip times;
+# the cl*_iperf paths are then those of ping). [str]
+# Example: 'latency'
+measurement_kind = 'latency'
+
+# Which clients are tested: 'pair' (cl1 and cl2), 'sequential' (the client_pairs, one
+# after another) or 'simultaneous' (the client_pairs at the same time). [str]
+# Example: 'simultaneous'
+topology = 'sequential'
+
 # The desired numbers of streams. [iterable]
 # Example: [1, 4]
 #streams = [1, 8]
@@ -120,6 +141,13 @@ cl4_pretty_name = 'LAPTOP-UE-8'
 cl5_pretty_name = 'LAPTOP-UE-9'
 cl6_pretty_name = 'LAPTOP-UE-10'
 
+# The client pairs to test. Every pair is (name, N, M), where N and M are the numbers
+# of the clients (the N in the clN_* parameters above). The name prefixes the result
+# directories of the pair. [iterable]
+# Example: [('pc0TOpc1', 1, 2), ('pc0TOpc2', 1, 3)]
+client_pairs = [('pc0TOpc6', 1, 2), ('pc0TOpc7', 1, 3), ('pc0TOpc8', 1, 4),
+                ('pc0TOpc9', 1, 5), ('pc0TOpc10', 1, 6)]
+
 # Shut down the the clients when all tests are over?
 # This is useful when doing long/overnight tests. [bool]
 # ATTENTION: It will NOT shut down the local machine, even if it is one of the clients!
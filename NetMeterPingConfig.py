@@ -44,6 +44,22 @@ test_range = [2**x for x in range(5,6)]
 # Example: 300
 run_duration = 60
 
+# The interval between the pings, and of the results, in seconds (at least 0.2 without
+# root privileges on the server). [number]
+# Example: 0.2
+report_interval = 1
+
+# What is measured (see NM_kinds.py): 'throughput' (the Iperf rates), 'latency' (the
+# latencies of the enhanced Iperf 2 UDP output, -e) or 'ping' (ICMP round trip times;
+# the cl*_iperf paths are then those of ping). [str]
+# Example: 'latency'
+measurement_kind = 'ping'
+
+# Which clients are tested: 'pair' (cl1 and cl2), 'sequential' (the client_pairs, one
+# after another) or 'simultaneous' (the client_pairs at the same time). [str]
+# Example: 'simultaneous'
+topology = 'pair'
+
 # The desired numbers of streams. [iterable]
 # Example: [1, 4]
 streams = [1]
@@ -0,0 +1 @@
+../NM_runstats.py
\ No newline at end of file
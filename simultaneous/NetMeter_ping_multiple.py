@@ -20,6 +20,8 @@ from os import makedirs
 from os.path import isdir, isfile, join
 from ntpath import dirname, basename
 
+from NM_runstats import prefix_std
+
 # Import configuration
 from NetMeterPingMultipleConfig import *
 
@@ -511,23 +513,10 @@ def get_iperf_data_single(iperf_out, protocol, streams, repetitions):
     print(info)
     print(len(info))
     #info_out=info
-    info_out = [0] * len(info) 
-    for i in range(len(info)):
-      info_temp = info[0:i]
-    #  print(info_temp.std())
-      std_value = info_temp.std()
-     # print('data type 1')
-     # print(type(std_value))
-      info_out[i] = info_temp.std()
-     # info_out[i] = info[i]
-     # print('data type 2')
-     # print(type(info[i]))
-     # hola = std_value
-     # info_out[i] = hola
-    #  print(info[0:i].std())
+    # Standard deviation of all the samples before each one (in linear time)
+    info_out = prefix_std(info)
 
     print('INFO IMPORTANTE')
-    info_out[0]= 0
     print(info_out)
 
     #iperf_stdev = info.std() * ( np.std(iperf_data[:,:,1], axis=0) +1)